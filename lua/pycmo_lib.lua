@@ -5,260 +5,778 @@ function move_unit_to(side, unit_name, latitude, longitude)
 end
 
 function ScenarioHasEnded(ended)
-    local scenario = VP_GetScenario()
+    local scenario = GetScenario()
     WriteData(tostring(ended), scenario.Title .. '_scen_has_ended.inst')
 end
 
--- Functions to emulate ScenEdit_ExportScenarioToXML()
-function ScenEdit_ExportScenarioToXML()
-    local scenario_xml = "<?xml version='1.0' encoding='utf-8'?><Scenario>"
+-- Engine queries
+-- The exports fetch each engine object once: the Get* functions memoize what the engine API returns until the end of
+-- the outermost export, which RunExport wraps around every export entry point (see the end of this file). Outside of an
+-- export, they query the engine every time. Setting PycmoCountApiCalls to true makes every export count its calls to
+-- each engine API function, keep the counts in PycmoLastApiCalls and write them to <title>_api_calls.inst, one
+-- "<function> <calls>" line per function after a line with the name of the export.
+PycmoCountApiCalls = PycmoCountApiCalls or false
+PycmoExportCache = nil
+PycmoApiCalls = {}
+PycmoLastApiCalls = PycmoLastApiCalls or {}
+
+function RunExport(name, export, ...)
+    if PycmoExportCache ~= nil then -- nested in another export, which owns the cache
+        return export(...)
+    end
 
-    local scenario = VP_GetScenario()
+    PycmoExportCache = {scores = {}, contacts = {}, units = {}, loadouts = {}}
+    PycmoApiCalls = {}
+    local ok, result = pcall(export, ...)
+    PycmoExportCache = nil
+    if not ok then
+        error(result, 0)
+    end
 
-    scenario_xml = scenario_xml .. WrapInXML(scenario.Title, 'Title')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.FileName, 'FileName')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.CurrentTimeNum, 'Time')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.StartTimeNum, 'StartTime')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.StartTimeNum, 'ZeroHour')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.DurationNum, 'Duration')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.SaveVersion, 'SaveVersion')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.CampaignScore, 'CampaignScore')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.HasStarted, 'HasStarted')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.Status, 'Status')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.TimeCompression, 'TimeCompression')
-    scenario_xml = scenario_xml .. WrapInXML(scenario.GameStatus, 'GameStatus')
+    if PycmoCountApiCalls then
+        PycmoLastApiCalls = PycmoApiCalls
+        PycmoApiCalls = {}
+        WriteApiCallReport(name, PycmoLastApiCalls)
+    end
+    return result
+end
 
-    scenario_xml = scenario_xml .. WrapInXML(ExportSidesToXML(), 'Sides')
-    scenario_xml = scenario_xml .. WrapInXML(ExportUnitsToXML(), 'ActiveUnits')
+-- Returns a function that runs `export` with RunExport
+function WithExportCache(name, export)
+    return function(...) return RunExport(name, export, ...) end
+end
 
-    scenario_xml = scenario_xml .. '</Scenario>'
+function CallEngine(name, api_function, ...)
+    if PycmoCountApiCalls then
+        PycmoApiCalls[name] = (PycmoApiCalls[name] or 0) + 1
+    end
+    return api_function(...)
+end
 
-    WriteData(scenario_xml, scenario.Title .. '.inst')
+local function GetCached(kind, key, name, api_function, ...)
+    local cache = PycmoExportCache
+    if cache == nil then
+        return CallEngine(name, api_function, ...)
+    end
+    local value = cache[kind][key]
+    if value == nil then
+        value = CallEngine(name, api_function, ...)
+        cache[kind][key] = value
+    end
+    return value
 end
 
-function ExportSidesToXML()
-    local sides_xml = ""
+function GetScenario()
+    local cache = PycmoExportCache
+    if cache == nil then return CallEngine('VP_GetScenario', VP_GetScenario) end
+    if cache.scenario == nil then cache.scenario = CallEngine('VP_GetScenario', VP_GetScenario) end
+    return cache.scenario
+end
 
-    local sides = VP_GetSides()
+function GetSides()
+    local cache = PycmoExportCache
+    if cache == nil then return CallEngine('VP_GetSides', VP_GetSides) end
+    if cache.sides == nil then cache.sides = CallEngine('VP_GetSides', VP_GetSides) end
+    return cache.sides
+end
 
-    for side_idx = 1, #sides do
-        local side = sides[side_idx]
+function GetScore(side_name)
+    return GetCached('scores', side_name, 'ScenEdit_GetScore', ScenEdit_GetScore, side_name)
+end
+
+function GetContacts(side_name)
+    return GetCached('contacts', side_name, 'ScenEdit_GetContacts', ScenEdit_GetContacts, side_name)
+end
+
+function GetUnit(guid)
+    return GetCached('units', guid, 'ScenEdit_GetUnit', ScenEdit_GetUnit, {guid = guid})
+end
 
-        sides_xml = sides_xml .. "<Side>"
+function GetLoadout(unitname)
+    return GetCached('loadouts', unitname, 'ScenEdit_GetLoadout', ScenEdit_GetLoadout, {unitname = unitname})
+end
 
-        sides_xml = sides_xml .. WrapInXML(side.guid, 'ID')
-        sides_xml = sides_xml .. WrapInXML(side.name, 'Name')
-        sides_xml = sides_xml .. WrapInXML(ScenEdit_GetScore(side.name), 'TotalScore')
-        sides_xml = sides_xml .. WrapInXML('', 'Missions')
-        sides_xml = sides_xml .. WrapInXML('', 'Prof')
-        sides_xml = sides_xml .. WrapInXML('', 'Doctrine')
-        sides_xml = sides_xml .. ExportContactsToXML(side.name)
+function WriteApiCallReport(name, api_calls)
+    local functions = {}
+    for function_name in pairs(api_calls) do functions[#functions + 1] = function_name end
+    table.sort(functions)
 
-        sides_xml = sides_xml .. "</Side>"
+    local lines = {name}
+    for function_idx = 1, #functions do
+        lines[#lines + 1] = functions[function_idx] .. ' ' .. api_calls[functions[function_idx]]
     end
+    WriteData(table.concat(lines, '\n'), GetScenario().Title .. '_api_calls.inst')
+end
 
-    return sides_xml
+-- Functions to emulate ScenEdit_ExportScenarioToXML()
+-- The Append*XML functions append the pieces of the document to a buffer table that is joined once with table.concat,
+-- so exporting takes time linear in the size of the document instead of copying the document on every append. The
+-- Export*ToXML functions return the same pieces as strings.
+-- The exports take an optional side name or list of side names. All sides are still listed, but only the units and
+-- contacts of those sides are exported, so the other sides' units are not queried at all. The index of a unit within
+-- its type (XML_ID) then counts the exported units only.
+function ScenEdit_ExportScenarioToXML(side_names)
+    local buffer = {"<?xml version='1.0' encoding='utf-8'?><Scenario>"}
+
+    local scenario = GetScenario()
+
+    AppendScenarioXML(buffer, scenario)
+
+    buffer[#buffer + 1] = '<Sides>'
+    AppendSidesXML(buffer, side_names)
+    buffer[#buffer + 1] = '</Sides><ActiveUnits>'
+    AppendUnitsXML(buffer, side_names)
+    buffer[#buffer + 1] = '</ActiveUnits></Scenario>'
+
+    WriteData(table.concat(buffer), scenario.Title .. '.inst')
 end
 
-function ExportContactsToXML(side_name)
-    local contacts_xml = ""
+function AppendScenarioXML(buffer, scenario)
+    AppendXML(buffer, scenario.Title, 'Title')
+    AppendXML(buffer, scenario.FileName, 'FileName')
+    AppendXML(buffer, scenario.CurrentTimeNum, 'Time')
+    AppendXML(buffer, scenario.StartTimeNum, 'StartTime')
+    AppendXML(buffer, scenario.StartTimeNum, 'ZeroHour')
+    AppendXML(buffer, scenario.DurationNum, 'Duration')
+    AppendXML(buffer, scenario.SaveVersion, 'SaveVersion')
+    AppendXML(buffer, scenario.CampaignScore, 'CampaignScore')
+    AppendXML(buffer, scenario.HasStarted, 'HasStarted')
+    AppendXML(buffer, scenario.Status, 'Status')
+    AppendXML(buffer, scenario.TimeCompression, 'TimeCompression')
+    AppendXML(buffer, scenario.GameStatus, 'GameStatus')
+end
 
-    local contacts = ScenEdit_GetContacts(side_name)
+-- Returns the set of the given side names, which are a side name or a list of them, or nil to select every side
+function GetSideSelection(side_names)
+    if side_names == nil then return nil end
+    if type(side_names) == 'string' then side_names = {side_names} end
 
-    for contact_idx = 1, #contacts do
-        local contact = contacts[contact_idx]
-        contacts_xml = contacts_xml .. ExportContactToXML(contact)
+    local selection = {}
+    for side_idx = 1, #side_names do
+        selection[side_names[side_idx]] = true
+    end
+    return selection
+end
+
+function AppendSidesXML(buffer, side_names)
+    local sides = GetSides()
+    local selection = GetSideSelection(side_names)
+
+    for side_idx = 1, #sides do
+        local side = sides[side_idx]
+
+        buffer[#buffer + 1] = "<Side>"
+
+        AppendXML(buffer, side.guid, 'ID')
+        AppendXML(buffer, side.name, 'Name')
+        AppendXML(buffer, GetScore(side.name), 'TotalScore')
+        AppendXML(buffer, '', 'Missions')
+        AppendXML(buffer, '', 'Prof')
+        AppendXML(buffer, '', 'Doctrine')
+        if selection == nil or selection[side.name] then
+            AppendContactsXML(buffer, side.name)
+        end
+
+        buffer[#buffer + 1] = "</Side>"
     end
-    
-    return WrapInXML(contacts_xml, "Contacts")
 end
 
-function ExportContactToXML(contact)
-    local contact_xml = ""
+function AppendContactsXML(buffer, side_name)
+    local contacts = GetContacts(side_name)
 
-    contact_xml = contact_xml .. WrapInXML(contact.guid, "ID")
-    contact_xml = contact_xml .. WrapInXML(contact.name, "Name")
-    contact_xml = contact_xml .. WrapInXML(contact.type, "Type")
-    if contact.altitude ~= nil then contact_xml = contact_xml .. WrapInXML(contact.altitude, "CA") end
-    if contact.speed ~= nil then contact_xml = contact_xml .. WrapInXML(contact.speed, "CS") end
-    if contact.latitude ~= nil then contact_xml = contact_xml .. WrapInXML(contact.latitude, "Lat") end
-    if contact.longitude ~= nil then contact_xml = contact_xml .. WrapInXML(contact.longitude, "Lon") end
-    
-    return WrapInXML(contact_xml, "Contact")
+    buffer[#buffer + 1] = "<Contacts>"
+    for contact_idx = 1, #contacts do
+        AppendContactXML(buffer, contacts[contact_idx])
+    end
+    buffer[#buffer + 1] = "</Contacts>"
 end
 
-function ExportUnitsToXML()
-    local units_xml = ""
+function AppendContactXML(buffer, contact)
+    buffer[#buffer + 1] = "<Contact>"
+    AppendXML(buffer, contact.guid, "ID")
+    AppendXML(buffer, contact.name, "Name")
+    AppendXML(buffer, contact.type, "Type")
+    if contact.altitude ~= nil then AppendXML(buffer, contact.altitude, "CA") end
+    if contact.speed ~= nil then AppendXML(buffer, contact.speed, "CS") end
+    if contact.latitude ~= nil then AppendXML(buffer, contact.latitude, "Lat") end
+    if contact.longitude ~= nil then AppendXML(buffer, contact.longitude, "Lon") end
+    buffer[#buffer + 1] = "</Contact>"
+end
 
-    local sides = VP_GetSides()
+function AppendUnitsXML(buffer, side_names)
+    local sides = GetSides()
+    local selection = GetSideSelection(side_names)
 
     for side_idx = 1, #sides do
         local side = sides[side_idx]
         local side_units = side.units
 
-        for side_unit_idx = 1, #side_units do
-            local side_unit = side_units[side_unit_idx]
-            units_xml = units_xml .. ExportUnitToXML(side_unit.guid)
+        if selection == nil or selection[side.name] then
+            for side_unit_idx = 1, #side_units do
+                local side_unit = side_units[side_unit_idx]
+                AppendUnitXML(buffer, side_unit.guid)
+            end
         end
     end
-
-    return units_xml
 end
 
-function ExportUnitToXML(guid)
-    local unit_xml = ""
-
-    local unit = ScenEdit_GetUnit({guid = guid})
+function AppendUnitXML(buffer, guid)
+    local unit = GetUnit(guid)
 
     if unit.type == 'Facility' then -- there is a limit to the length of the comment that we can export
-        return ''
-    end
-
-    unit_xml = unit_xml .. WrapInXML(unit.guid, 'ID')
-    unit_xml = unit_xml .. WrapInXML(unit.dbid, 'DBID')
-    unit_xml = unit_xml .. WrapInXML(unit.name, 'Name')
-    unit_xml = unit_xml .. WrapInXML(unit.side, 'Side')
-    unit_xml = unit_xml .. WrapInXML(unit.classname, 'ClassName')
-    unit_xml = unit_xml .. WrapInXML(unit.proficiency, 'Proficiency')
-    unit_xml = unit_xml .. WrapInXML(unit.latitude, 'Lat')
-    unit_xml = unit_xml .. WrapInXML(unit.longitude, 'Lon')
-    unit_xml = unit_xml .. WrapInXML(unit.altitude, 'CA')
-    unit_xml = unit_xml .. WrapInXML(unit.heading, 'CH')
-    unit_xml = unit_xml .. WrapInXML(unit.speed, 'CS')
-    unit_xml = unit_xml .. WrapInXML(unit.throttle, 'Thr')
-    unit_xml = unit_xml .. WrapInXML(unit.fuelstate, 'FuelState')
-    unit_xml = unit_xml .. WrapInXML(unit.weaponstate, 'WeaponState')
+        return
+    end
+
+    AppendUnitElementXML(buffer, unit)
+end
+
+function AppendUnitElementXML(buffer, unit)
+    buffer[#buffer + 1] = '<' .. unit.type .. '>'
+    AppendXML(buffer, unit.guid, 'ID')
+    AppendXML(buffer, unit.dbid, 'DBID')
+    AppendXML(buffer, unit.name, 'Name')
+    AppendXML(buffer, unit.side, 'Side')
+    AppendXML(buffer, unit.classname, 'ClassName')
+    AppendXML(buffer, unit.proficiency, 'Proficiency')
+    AppendXML(buffer, unit.latitude, 'Lat')
+    AppendXML(buffer, unit.longitude, 'Lon')
+    AppendXML(buffer, unit.altitude, 'CA')
+    AppendXML(buffer, unit.heading, 'CH')
+    AppendXML(buffer, unit.speed, 'CS')
+    AppendXML(buffer, unit.throttle, 'Thr')
+    AppendXML(buffer, unit.fuelstate, 'FuelState')
+    AppendXML(buffer, unit.weaponstate, 'WeaponState')
     if unit.loadoutdbid ~= nil then
-        unit_xml = unit_xml .. WrapInXML(ExportUnitLoadoutToXML(unit.name), 'Loadout')
+        buffer[#buffer + 1] = '<Loadout>'
+        AppendUnitLoadoutXML(buffer, unit.name)
+        buffer[#buffer + 1] = '</Loadout>'
     end
     if unit.mounts ~= nil then
-        unit_xml = unit_xml .. ExportUnitMountsToXML(unit)
+        AppendUnitMountsXML(buffer, unit)
     end
     if unit.fuel ~= nil then
-        unit_xml = unit_xml .. ExportUnitFuelsToXML(unit)
+        AppendUnitFuelsXML(buffer, unit)
     end
-    -- unit_xml = unit_xml .. WrapInXML('', 'Doctrine')
-    -- unit_xml = unit_xml .. WrapInXML('', 'Sensors')
-    -- unit_xml = unit_xml .. WrapInXML('', 'Comms')
-    -- unit_xml = unit_xml .. WrapInXML('', 'Propulsion')
-    
-    return WrapInXML(unit_xml, unit.type)
+    -- AppendXML(buffer, '', 'Doctrine')
+    -- AppendXML(buffer, '', 'Sensors')
+    -- AppendXML(buffer, '', 'Comms')
+    -- AppendXML(buffer, '', 'Propulsion')
+    buffer[#buffer + 1] = '</' .. unit.type .. '>'
 end
 
-function ExportUnitFuelsToXML(unit)
-    local fuels_xml = ""
+function AppendUnitFuelsXML(buffer, unit)
+    local fuel_start = #buffer + 1
 
-    local unit_fuels = unit.fuel
-
-    for fuel_type, fuel in pairs(unit_fuels) do
-        fuels_xml = fuels_xml .. ExportFuelToXML(fuel)
+    buffer[fuel_start] = "<Fuel>"
+    for fuel_type, fuel in pairs(unit.fuel) do
+        AppendFuelXML(buffer, fuel)
     end
 
-    if fuels_xml ~= "" then
-        return WrapInXML(fuels_xml, "Fuel")
+    if #buffer > fuel_start then
+        buffer[#buffer + 1] = "</Fuel>"
     else
-        return fuels_xml
+        buffer[fuel_start] = nil -- no Fuel element without fuel records
+    end
+end
+
+function AppendFuelXML(buffer, fuel)
+    buffer[#buffer + 1] = "<FuelRec>"
+    AppendXML(buffer, fuel.type, "FT")
+    AppendXML(buffer, fuel.current, "CQ")
+    AppendXML(buffer, fuel.max, "MQ")
+    buffer[#buffer + 1] = "</FuelRec>"
+end
+
+function AppendUnitLoadoutXML(buffer, unitname)
+    local unit_loadout = GetLoadout(unitname)
+
+    buffer[#buffer + 1] = "<Loadout>"
+    AppendXML(buffer, unit_loadout.dbid, 'ID')
+    AppendXML(buffer, unit_loadout.dbid, 'DBID')
+    AppendXML(buffer, unit_loadout.name, 'Name')
+    buffer[#buffer + 1] = "<Weaps>"
+    AppendUnitLoadoutWeaponsXML(buffer, unitname)
+    buffer[#buffer + 1] = "</Weaps></Loadout>"
+end
+
+function AppendUnitLoadoutWeaponsXML(buffer, unitname)
+    local loadout_weapons = GetLoadout(unitname).weapons
+
+    for weapon_idx = 1, #loadout_weapons do
+        AppendWeaponXML(buffer, loadout_weapons[weapon_idx])
+    end
+end
+
+function AppendUnitMountsXML(buffer, unit)
+    local unit_mounts = unit.mounts
+
+    if #unit_mounts == 0 then return end
+
+    buffer[#buffer + 1] = "<Mounts>"
+    for mount_idx = 1, #unit_mounts do
+        AppendMountXML(buffer, unit_mounts[mount_idx])
+    end
+    buffer[#buffer + 1] = "</Mounts>"
+end
+
+function AppendMountXML(buffer, mount)
+    buffer[#buffer + 1] = "<Mount>"
+    AppendXML(buffer, mount.mount_guid, 'ID')
+    AppendXML(buffer, mount.mount_dbid, 'DBID')
+    AppendXML(buffer, mount.mount_name, 'Name')
+    AppendXML(buffer, mount.mount_status, 'MountStatus')
+    if mount.mount_weapons ~= nil then
+        buffer[#buffer + 1] = "<MW>"
+        AppendUnitMountWeaponsXML(buffer, mount.mount_weapons)
+        buffer[#buffer + 1] = "</MW>"
     end
-    
+    buffer[#buffer + 1] = "</Mount>"
 end
 
-function ExportFuelToXML(fuel)
-    local fuel_xml = ''
+function AppendUnitMountWeaponsXML(buffer, mount_weapons)
+    for weapon_idx = 1, #mount_weapons do
+        AppendWeaponXML(buffer, mount_weapons[weapon_idx])
+    end
+end
 
-    fuel_xml = fuel_xml .. WrapInXML(fuel.type, "FT")
-    fuel_xml = fuel_xml .. WrapInXML(fuel.current, "CQ")
-    fuel_xml = fuel_xml .. WrapInXML(fuel.max, "MQ")
+function AppendWeaponXML(buffer, weapon)
+    buffer[#buffer + 1] = "<WRec>"
+    AppendXML(buffer, weapon.wpn_guid, 'ID')
+    AppendXML(buffer, weapon.wpn_dbid, 'WeapID')
+    if weapon.wpn_current ~= nil then AppendXML(buffer, weapon.wpn_current, 'CL') end
+    if weapon.wpn_maxcap ~= nil then AppendXML(buffer, weapon.wpn_maxcap, 'ML') end
+    buffer[#buffer + 1] = "</WRec>"
+end
 
-    return WrapInXML(fuel_xml, "FuelRec")
+function AppendXML(buffer, data, tag)
+    buffer[#buffer + 1] = '<' .. tag .. '>' .. tostring(data) .. '</' .. tag .. '>'
 end
 
-function ExportUnitLoadoutToXML(unitname)
-    local loadout_xml = ""
+-- Runs an Append*XML function on an empty buffer and returns what it appended as one string
+function BufferToString(append, ...)
+    local buffer = {}
+    append(buffer, ...)
+    return table.concat(buffer)
+end
 
-    local unit_loadout = ScenEdit_GetLoadout({unitname = unitname})
+function ExportSidesToXML(side_names) return BufferToString(AppendSidesXML, side_names) end
+function ExportContactsToXML(side_name) return BufferToString(AppendContactsXML, side_name) end
+function ExportContactToXML(contact) return BufferToString(AppendContactXML, contact) end
+function ExportUnitsToXML(side_names) return BufferToString(AppendUnitsXML, side_names) end
+function ExportUnitToXML(guid) return BufferToString(AppendUnitXML, guid) end
+function ExportUnitFuelsToXML(unit) return BufferToString(AppendUnitFuelsXML, unit) end
+function ExportFuelToXML(fuel) return BufferToString(AppendFuelXML, fuel) end
+function ExportUnitLoadoutToXML(unitname) return BufferToString(AppendUnitLoadoutXML, unitname) end
+function ExportUnitLoadoutWeaponsToXML(unitname) return BufferToString(AppendUnitLoadoutWeaponsXML, unitname) end
+function ExportUnitMountsToXML(unit) return BufferToString(AppendUnitMountsXML, unit) end
+function ExportMountToXML(mount) return BufferToString(AppendMountXML, mount) end
+function ExportUnitMountWeaponsToXML(mount_weapons) return BufferToString(AppendUnitMountWeaponsXML, mount_weapons) end
+function ExportWeaponToXML(weapon) return BufferToString(AppendWeaponXML, weapon) end
 
-    loadout_xml = loadout_xml .. WrapInXML(unit_loadout.dbid, 'ID')
-    loadout_xml = loadout_xml .. WrapInXML(unit_loadout.dbid, 'DBID')
-    loadout_xml = loadout_xml .. WrapInXML(unit_loadout.name, 'Name')
-    loadout_xml = loadout_xml .. WrapInXML(ExportUnitLoadoutWeaponsToXML(unitname), 'Weaps')
+function WrapInXML(data, tag)
+    return '<' .. tag .. '>' .. tostring(data) .. '</' .. tag .. '>'
+end
 
-    return WrapInXML(loadout_xml, "Loadout")
+-- Compact export
+-- ScenEdit_ExportScenarioToCompact() writes the observation as one line of '|'-separated fields per record instead of
+-- XML elements, which makes it several times smaller, so Facilities fit in the comment of ScenEdit_ExportInst as well.
+-- The first field of a record is its kind and the other fields come in a fixed order:
+--   pycmo-compact|<version>                      the header
+--   S|Title|Time|StartTime|ZeroHour|Duration     the scenario
+--   D|ID|Name|TotalScore                         a side
+--   C|ID|Name|CA|CS|Lat|Lon                      a contact of the last side
+--   U|Type|ID|DBID|Name|Side|Lat|Lon|CA|CH|CS    a unit
+--   F|FT|CQ|MQ                                   a fuel record of the last unit
+--   L|ID|DBID|Name                               the loadout of the last unit
+--   M|ID|DBID|Name                               a mount of the last unit
+--   W|ID|WeapID|CL|ML                            a weapon of the last loadout or mount
+-- Fields without a value are empty. Backslashes, '|' and line breaks in values are escaped as '\\', '\p', '\n' and '\r'.
+-- Like the XML export, it can be restricted to the units and contacts of some sides. pycmo.lib.compact_parser decodes
+-- the exports.
+PYCMO_COMPACT_VERSION = 1
+
+local COMPACT_ESCAPES = {['\\'] = '\\\\', ['|'] = '\\p', ['\n'] = '\\n', ['\r'] = '\\r'}
+
+function ScenEdit_ExportScenarioToCompact(side_names)
+    local buffer = {'pycmo-compact|' .. PYCMO_COMPACT_VERSION}
+
+    local scenario = GetScenario()
+
+    buffer[#buffer + 1] = '\nS'
+    AppendCompact(buffer, scenario.Title)
+    AppendCompact(buffer, scenario.CurrentTimeNum)
+    AppendCompact(buffer, scenario.StartTimeNum)
+    AppendCompact(buffer, scenario.StartTimeNum)
+    AppendCompact(buffer, scenario.DurationNum)
+
+    AppendSidesCompact(buffer, side_names)
+    AppendUnitsCompact(buffer, side_names)
+
+    WriteData(table.concat(buffer), scenario.Title .. '.inst')
 end
 
-function ExportUnitLoadoutWeaponsToXML(unitname)
-    local weapons_xml = ""
+function AppendSidesCompact(buffer, side_names)
+    local sides = GetSides()
+    local selection = GetSideSelection(side_names)
 
-    local loadout_weapons = ScenEdit_GetLoadout({unitname = unitname}).weapons
+    for side_idx = 1, #sides do
+        local side = sides[side_idx]
 
-    if #loadout_weapons == 0 then return '' end
+        buffer[#buffer + 1] = '\nD'
+        AppendCompact(buffer, side.guid)
+        AppendCompact(buffer, side.name)
+        AppendCompact(buffer, GetScore(side.name))
 
-    for weapon_idx = 1, #loadout_weapons do
-        local loadout_weapon = loadout_weapons[weapon_idx]
-        weapons_xml = weapons_xml .. ExportWeaponToXML(loadout_weapon)
+        local contacts = {}
+        if selection == nil or selection[side.name] then
+            contacts = GetContacts(side.name)
+        end
+        for contact_idx = 1, #contacts do
+            AppendContactCompact(buffer, contacts[contact_idx])
+        end
     end
+end
 
-    return weapons_xml
+function AppendContactCompact(buffer, contact)
+    buffer[#buffer + 1] = '\nC'
+    AppendCompact(buffer, contact.guid)
+    AppendCompact(buffer, contact.name)
+    AppendCompact(buffer, contact.altitude)
+    AppendCompact(buffer, contact.speed)
+    AppendCompact(buffer, contact.latitude)
+    AppendCompact(buffer, contact.longitude)
 end
 
-function ExportUnitMountsToXML(unit)
-    local mounts_xml = ""
+function AppendUnitsCompact(buffer, side_names)
+    local sides = GetSides()
+    local selection = GetSideSelection(side_names)
 
-    local unit_mounts = unit.mounts
+    for side_idx = 1, #sides do
+        local side_units = sides[side_idx].units
 
-    if #unit_mounts == 0 then return '' end
+        if selection == nil or selection[sides[side_idx].name] then
+            for side_unit_idx = 1, #side_units do
+                AppendUnitCompact(buffer, side_units[side_unit_idx].guid)
+            end
+        end
+    end
+end
 
-    for mount_idx = 1, #unit_mounts do
-        local unit_mount = unit_mounts[mount_idx]
-        mounts_xml = mounts_xml .. ExportMountToXML(unit_mount)
+function AppendUnitCompact(buffer, guid)
+    local unit = GetUnit(guid)
+
+    buffer[#buffer + 1] = '\nU'
+    AppendCompact(buffer, unit.type)
+    AppendCompact(buffer, unit.guid)
+    AppendCompact(buffer, unit.dbid)
+    AppendCompact(buffer, unit.name)
+    AppendCompact(buffer, unit.side)
+    AppendCompact(buffer, unit.latitude)
+    AppendCompact(buffer, unit.longitude)
+    AppendCompact(buffer, unit.altitude)
+    AppendCompact(buffer, unit.heading)
+    AppendCompact(buffer, unit.speed)
+    if unit.fuel ~= nil then
+        for fuel_type, fuel in pairs(unit.fuel) do
+            buffer[#buffer + 1] = '\nF'
+            AppendCompact(buffer, fuel.type)
+            AppendCompact(buffer, fuel.current)
+            AppendCompact(buffer, fuel.max)
+        end
+    end
+    if unit.loadoutdbid ~= nil then
+        local unit_loadout = GetLoadout(unit.name)
+        buffer[#buffer + 1] = '\nL'
+        AppendCompact(buffer, unit_loadout.dbid)
+        AppendCompact(buffer, unit_loadout.dbid)
+        AppendCompact(buffer, unit_loadout.name)
+        AppendWeaponsCompact(buffer, unit_loadout.weapons)
     end
+    if unit.mounts ~= nil then
+        local unit_mounts = unit.mounts
+        for mount_idx = 1, #unit_mounts do
+            local mount = unit_mounts[mount_idx]
+            buffer[#buffer + 1] = '\nM'
+            AppendCompact(buffer, mount.mount_guid)
+            AppendCompact(buffer, mount.mount_dbid)
+            AppendCompact(buffer, mount.mount_name)
+            AppendWeaponsCompact(buffer, mount.mount_weapons)
+        end
+    end
+end
+
+function AppendWeaponsCompact(buffer, weapons)
+    if weapons == nil then return end
 
-    return WrapInXML(mounts_xml, "Mounts")
+    for weapon_idx = 1, #weapons do
+        local weapon = weapons[weapon_idx]
+        buffer[#buffer + 1] = '\nW'
+        AppendCompact(buffer, weapon.wpn_guid)
+        AppendCompact(buffer, weapon.wpn_dbid)
+        AppendCompact(buffer, weapon.wpn_current)
+        AppendCompact(buffer, weapon.wpn_maxcap)
+    end
+end
+
+function AppendCompact(buffer, data)
+    if data == nil then
+        buffer[#buffer + 1] = '|'
+    elseif type(data) == 'string' then
+        buffer[#buffer + 1] = '|' .. data:gsub('[\\|\n\r]', COMPACT_ESCAPES)
+    else
+        buffer[#buffer + 1] = '|' .. tostring(data)
+    end
 end
 
-function ExportMountToXML(mount)
-    local mount_xml = ""
+-- Sharded export
+-- ScenEdit_ExportScenarioToShards() splits the XML export across <title>_shard<n>.inst files of at most
+-- `max_shard_length` characters each, so that no unit has to be left out to fit in the comment of ScenEdit_ExportInst,
+-- Facilities included. Each shard is a Scenario document of its own, which starts with the ID of the export: the first
+-- shard holds the scenario fields and the sides whatever their length, and every shard holds a run of units. <title>_manifest.inst, which
+-- holds the ID of the export and the number of shards, is written after the shards, so a reader can tell a complete set
+-- of shards from one that is being overwritten. Like the XML export, it can be restricted to the units and contacts of
+-- some sides. pycmo.lib.sharded_features reads the shards.
+PycmoShardExport = PycmoShardExport or {session = (tostring({}):gsub('^table: ', '')), sequence = 0}
+
+function ScenEdit_ExportScenarioToShards(max_shard_length, side_names)
+    local state = PycmoShardExport
+    max_shard_length = max_shard_length or 200000
+
+    local scenario = GetScenario()
+    local sides = GetSides()
+    local selection = GetSideSelection(side_names)
+
+    state.sequence = state.sequence + 1
+    local export_id = tostring(scenario.CurrentTimeNum) .. '-' .. state.sequence .. '-' .. state.session
+    local shard_start = "<?xml version='1.0' encoding='utf-8'?><Scenario>" .. WrapInXML(export_id, 'Export')
+    local shard_end = '</ActiveUnits></Scenario>'
+    local shard_count = 0
+
+    local buffer = {shard_start}
+    AppendScenarioXML(buffer, scenario)
+    buffer[#buffer + 1] = '<Sides>'
+    AppendSidesXML(buffer, side_names)
+    buffer[#buffer + 1] = '</Sides><ActiveUnits>'
+    buffer = {table.concat(buffer)}
+    local length = #buffer[1]
+    local has_units = false
 
-    mount_xml = mount_xml .. WrapInXML(mount.mount_guid, 'ID')
-    mount_xml = mount_xml .. WrapInXML(mount.mount_dbid, 'DBID')
-    mount_xml = mount_xml .. WrapInXML(mount.mount_name, 'Name')
-    mount_xml = mount_xml .. WrapInXML(mount.mount_status, 'MountStatus')
-    if mount.mount_weapons ~= nil then mount_xml = mount_xml .. WrapInXML(ExportUnitMountWeaponsToXML(mount.mount_weapons), 'MW') end
+    for side_idx = 1, #sides do
+        local side_units = sides[side_idx].units
+
+        if selection == nil or selection[sides[side_idx].name] then
+            for side_unit_idx = 1, #side_units do
+                local unit_xml = BufferToString(AppendUnitElementXML, GetUnit(side_units[side_unit_idx].guid))
+                if has_units and length + #unit_xml + #shard_end > max_shard_length then
+                    buffer[#buffer + 1] = shard_end
+                    shard_count = shard_count + 1
+                    WriteData(table.concat(buffer), scenario.Title .. '_shard' .. shard_count .. '.inst')
+                    buffer = {shard_start, '<ActiveUnits>'}
+                    length = #shard_start + #'<ActiveUnits>'
+                end
+                buffer[#buffer + 1] = unit_xml
+                length = length + #unit_xml
+                has_units = true
+            end
+        end
+    end
+    buffer[#buffer + 1] = shard_end
+    shard_count = shard_count + 1
+    WriteData(table.concat(buffer), scenario.Title .. '_shard' .. shard_count .. '.inst')
 
-    return WrapInXML(mount_xml, "Mount")
+    WriteData('<Manifest>' .. WrapInXML(export_id, 'Export') .. WrapInXML(shard_count, 'Shards') .. '</Manifest>', scenario.Title .. '_manifest.inst')
 end
 
-function ExportUnitMountWeaponsToXML(mount_weapons)
-    local weapons_xml = ""
+-- Delta export
+-- ScenEdit_ExportScenarioDeltaToXML() writes a keyframe, which is a full export, every `keyframe_interval` exports. In
+-- between, it only writes the units and contacts that were added, changed or removed since the last keyframe, so a
+-- reader that skips exports only needs the keyframe. Keyframes are also written to <title>_keyframe.inst for readers
+-- that missed one. The last keyframe is kept in PycmoDeltaExport, which survives running this file again; if it is
+-- lost, the next export is a keyframe. pycmo.lib.delta_features decodes the exports.
+PycmoDeltaExport = PycmoDeltaExport or {session = (tostring({}):gsub('^table: ', '')), sequence = 0, keyframe = nil}
 
-    if #mount_weapons == 0 then return '' end
+function ScenEdit_ExportScenarioDeltaToXML(keyframe_interval)
+    local state = PycmoDeltaExport
+    keyframe_interval = keyframe_interval or 10
 
-    for weapon_idx = 1, #mount_weapons do
-        local mount_weapon = mount_weapons[weapon_idx]
-        weapons_xml = weapons_xml .. ExportWeaponToXML(mount_weapon)
+    local scenario = GetScenario()
+    local sides = GetSides()
+
+    local units, unit_order = CollectUnitsXML(sides)
+    local contacts = {}
+    local contact_orders = {}
+    for side_idx = 1, #sides do
+        local side_name = sides[side_idx].name
+        contacts[side_name], contact_orders[side_name] = CollectContactsXML(side_name)
+    end
+
+    state.sequence = state.sequence + 1
+    local is_keyframe = state.keyframe == nil or state.sequence - state.keyframe.sequence >= keyframe_interval
+    local keyframe = state.keyframe
+    if is_keyframe then
+        state.keyframe = {
+            id = tostring(scenario.CurrentTimeNum) .. '-' .. state.sequence .. '-' .. state.session,
+            sequence = state.sequence,
+            units = units,
+            unit_order = unit_order,
+            contacts = contacts,
+            contact_orders = contact_orders,
+        }
+        keyframe = nil -- everything is exported
+    end
+
+    local buffer = {"<?xml version='1.0' encoding='utf-8'?><Scenario><Delta>"}
+    AppendXML(buffer, state.keyframe.id, 'Keyframe')
+    AppendXML(buffer, state.sequence, 'Sequence')
+    AppendXML(buffer, is_keyframe, 'IsKeyframe')
+    buffer[#buffer + 1] = '</Delta>'
+
+    AppendScenarioXML(buffer, scenario)
+
+    buffer[#buffer + 1] = '<Sides>'
+    for side_idx = 1, #sides do
+        local side = sides[side_idx]
+        local keyframe_contacts = keyframe and (keyframe.contacts[side.name] or {})
+        local keyframe_contact_order = keyframe and (keyframe.contact_orders[side.name] or {})
+
+        buffer[#buffer + 1] = "<Side>"
+
+        AppendXML(buffer, side.guid, 'ID')
+        AppendXML(buffer, side.name, 'Name')
+        AppendXML(buffer, GetScore(side.name), 'TotalScore')
+        AppendXML(buffer, '', 'Missions')
+        AppendXML(buffer, '', 'Prof')
+        AppendXML(buffer, '', 'Doctrine')
+        buffer[#buffer + 1] = "<Contacts>"
+        AppendChangedXML(buffer, contacts[side.name], contact_orders[side.name], keyframe_contacts)
+        buffer[#buffer + 1] = "</Contacts>"
+        if keyframe ~= nil then
+            AppendRemovedXML(buffer, contacts[side.name], keyframe_contact_order, 'RemovedContacts')
+            AppendOrderXML(buffer, contacts[side.name], contact_orders[side.name], keyframe_contacts, keyframe_contact_order, 'ContactOrder')
+        end
+
+        buffer[#buffer + 1] = "</Side>"
+    end
+    buffer[#buffer + 1] = '</Sides><ActiveUnits>'
+    AppendChangedXML(buffer, units, unit_order, keyframe and keyframe.units)
+    buffer[#buffer + 1] = '</ActiveUnits>'
+    if keyframe ~= nil then
+        AppendRemovedXML(buffer, units, keyframe.unit_order, 'RemovedUnits')
+        AppendOrderXML(buffer, units, unit_order, keyframe.units, keyframe.unit_order, 'UnitOrder')
     end
+    buffer[#buffer + 1] = '</Scenario>'
 
-    return weapons_xml
+    local scenario_xml = table.concat(buffer)
+    WriteData(scenario_xml, scenario.Title .. '.inst')
+    if is_keyframe then
+        WriteData(scenario_xml, scenario.Title .. '_keyframe.inst')
+    end
 end
 
-function ExportWeaponToXML(weapon)
-    local weapon_xml = ""
-    
-    weapon_xml = weapon_xml .. WrapInXML(weapon.wpn_guid, 'ID')
-    weapon_xml = weapon_xml .. WrapInXML(weapon.wpn_dbid, 'WeapID')
-    if weapon.wpn_current ~= nil then weapon_xml = weapon_xml .. WrapInXML(weapon.wpn_current, 'CL') end
-    if weapon.wpn_maxcap ~= nil then  weapon_xml = weapon_xml .. WrapInXML(weapon.wpn_maxcap, 'ML') end
- 
-    return WrapInXML(weapon_xml, "WRec")
- end
+-- Returns the xml of each unit keyed by GUID, and the GUIDs in export order
+function CollectUnitsXML(sides)
+    local units = {}
+    local order = {}
 
-function WrapInXML(data, tag)
-    return '<' .. tag .. '>' .. tostring(data) .. '</' .. tag .. '>'
+    for side_idx = 1, #sides do
+        local side_units = sides[side_idx].units
+
+        for side_unit_idx = 1, #side_units do
+            local guid = side_units[side_unit_idx].guid
+            local unit_xml = BufferToString(AppendUnitXML, guid)
+            if unit_xml ~= '' then
+                units[guid] = unit_xml
+                order[#order + 1] = guid
+            end
+        end
+    end
+
+    return units, order
+end
+
+-- Returns the xml of each contact of a side keyed by GUID, and the GUIDs in export order
+function CollectContactsXML(side_name)
+    local contacts = {}
+    local order = {}
+
+    local side_contacts = GetContacts(side_name)
+
+    for contact_idx = 1, #side_contacts do
+        local contact = side_contacts[contact_idx]
+        contacts[contact.guid] = BufferToString(AppendContactXML, contact)
+        order[#order + 1] = contact.guid
+    end
+
+    return contacts, order
+end
+
+-- Appends the entities whose xml differs from the keyframe, or every entity if there is no keyframe
+function AppendChangedXML(buffer, entities, order, keyframe_entities)
+    for entity_idx = 1, #order do
+        local entity_xml = entities[order[entity_idx]]
+        if keyframe_entities == nil or keyframe_entities[order[entity_idx]] ~= entity_xml then
+            buffer[#buffer + 1] = entity_xml
+        end
+    end
+end
+
+-- Appends the GUIDs of the keyframe entities that are gone, if any
+function AppendRemovedXML(buffer, entities, keyframe_order, tag)
+    local removed_start = #buffer + 1
+
+    buffer[removed_start] = '<' .. tag .. '>'
+    for entity_idx = 1, #keyframe_order do
+        if entities[keyframe_order[entity_idx]] == nil then
+            AppendXML(buffer, keyframe_order[entity_idx], 'ID')
+        end
+    end
+
+    if #buffer > removed_start then
+        buffer[#buffer + 1] = '</' .. tag .. '>'
+    else
+        buffer[removed_start] = nil
+    end
+end
+
+-- Appends the GUIDs of all entities in order, unless they are in the order of the keyframe followed by the new entities
+function AppendOrderXML(buffer, entities, order, keyframe_entities, keyframe_order, tag)
+    local expected_order = {}
+    for entity_idx = 1, #keyframe_order do
+        if entities[keyframe_order[entity_idx]] ~= nil then
+            expected_order[#expected_order + 1] = keyframe_order[entity_idx]
+        end
+    end
+    for entity_idx = 1, #order do
+        if keyframe_entities[order[entity_idx]] == nil then
+            expected_order[#expected_order + 1] = order[entity_idx]
+        end
+    end
+
+    local same_order = #expected_order == #order
+    for entity_idx = 1, #order do
+        if not same_order then break end
+        same_order = expected_order[entity_idx] == order[entity_idx]
+    end
+    if same_order then return end
+
+    buffer[#buffer + 1] = '<' .. tag .. '>'
+    for entity_idx = 1, #order do
+        AppendXML(buffer, order[entity_idx], 'ID')
+    end
+    buffer[#buffer + 1] = '</' .. tag .. '>'
 end
 
 function WriteData(data, filename)
     -- must have a valid side for ScenEdit_ExportInst to work
-    local sides = VP_GetSides() -- use random side to export data because we do not care about what side we use
-    ScenEdit_ExportInst(sides[1].name, {}, {filename = filename, comment = data})
+    local sides = GetSides() -- use random side to export data because we do not care about what side we use
+    CallEngine('ScenEdit_ExportInst', ScenEdit_ExportInst, sides[1].name, {}, {filename = filename, comment = data})
+end
+
+-- Frames the response to a command sent over the TCP socket with its length in bytes, so that pycmo.lib.protocol.Client
+-- with framing="length" reads all of it, however long it is
+function FrameResponse(data)
+    data = tostring(data)
+    return #data .. '\n' .. data
 end
 
 function teardown_and_end_scenario(export_observation_event_name, end_scenario)
@@ -276,4 +794,11 @@ function teardown_and_end_scenario(export_observation_event_name, end_scenario)
     if end_scenario == true then
         ScenEdit_EndScenario()
     end
-end
\ No newline at end of file
+end
+
+-- Every export fetches each engine object once
+ScenEdit_ExportScenarioToXML = WithExportCache('ScenEdit_ExportScenarioToXML', ScenEdit_ExportScenarioToXML)
+ScenEdit_ExportScenarioToCompact = WithExportCache('ScenEdit_ExportScenarioToCompact', ScenEdit_ExportScenarioToCompact)
+ScenEdit_ExportScenarioToShards = WithExportCache('ScenEdit_ExportScenarioToShards', ScenEdit_ExportScenarioToShards)
+ScenEdit_ExportScenarioDeltaToXML = WithExportCache('ScenEdit_ExportScenarioDeltaToXML', ScenEdit_ExportScenarioDeltaToXML)
+BufferToString = WithExportCache('BufferToString', BufferToString) -- the Export*ToXML functions
@@ -42,28 +42,25 @@ class RuleBasedAgent():
     def get_action(self, observation, VALID_FUNCTIONS):
         if scenario_id[self.scenario] == 10: # wooden leg
             try:
-                # launch F-15s
-                for unit in observation.units:
-                    if unit.ID == self.f15s[self.current_f15]:
-                        if not self.f15_status[unit.ID][0]:
-                            action = VALID_FUNCTIONS[1].corresponding_def(self.player_side, unit.Name, 'true')
-                            self.f15_status[unit.ID][0] = True
-                            return action
+                unit = observation.get_unit_by_id(self.f15s[self.current_f15])
+                if unit:
+                    # launch F-15s
+                    if not self.f15_status[unit.ID][0]:
+                        action = VALID_FUNCTIONS[1].corresponding_def(self.player_side, unit.Name, 'true')
+                        self.f15_status[unit.ID][0] = True
+                        return action
 
-                # strike targets
-                for unit in observation.units:
-                    if unit.ID == self.f15s[self.current_f15]:
-                        if self.f15_status[unit.ID][0] and not self.f15_status[unit.ID][1]:
-                            for contact in observation.contacts:
-                                if contact.Name.split(" ")[0] == "[Target]" and contact.Name not in self.targets_assigned_f15.keys():
-                                    action = VALID_FUNCTIONS[4].corresponding_def(unit.ID, contact.ID)
-                                    self.f15_status[unit.ID][1] = True
-                                    self.targets_assigned_f15[contact.Name] = unit.ID
-                                    return action
-                
-                # check if striked
-                for unit in observation.units:
-                    if unit.ID == self.f15s[self.current_f15] and self.f15_status[unit.ID][1]:
+                    # strike targets
+                    if self.f15_status[unit.ID][0] and not self.f15_status[unit.ID][1]:
+                        for contact in observation.contacts:
+                            if contact.Name.split(" ")[0] == "[Target]" and contact.Name not in self.targets_assigned_f15.keys():
+                                action = VALID_FUNCTIONS[4].corresponding_def(unit.ID, contact.ID)
+                                self.f15_status[unit.ID][1] = True
+                                self.targets_assigned_f15[contact.Name] = unit.ID
+                                return action
+                    
+                    # check if striked
+                    if self.f15_status[unit.ID][1]:
                         for mount in unit.Mounts:
                             for unit_weapon in mount.Weapons:
                                 if unit_weapon.QuantRemaining < unit_weapon.MaxQuant:
@@ -8,12 +8,20 @@ import collections, enum
 import os
 from time import sleep
 import logging
+from concurrent.futures import Executor
 
 from pycmo.lib.actions import AvailableFunctions
-from pycmo.lib.features import Features, FeaturesFromSteam
+from pycmo.lib.features import Features, FeaturesFromSteam, LazyFeatures, LazyFeaturesFromSteam, Projection, get_projection
+from pycmo.lib.incremental_features import IncrementalFeaturesFromSteam, UnitCache
+from pycmo.lib.delta_features import DeltaFeaturesFromSteam, DeltaState, KeyframeMismatchError, get_keyframe_path
+from pycmo.lib.sharded_features import ShardedFeaturesFromSteam, read_shards, get_manifest_path
+from pycmo.lib.observation_cache import ObservationCache
+from pycmo.lib.file_watcher import create_file_watcher
 from pycmo.lib.protocol import Client, SteamClient, SteamClientProps
 from pycmo.configs.config import get_config
-from pycmo.lib.tools import cmo_steam_observation_file_to_xml
+from pycmo.lib.tools import cmo_steam_observation_to_xml, cmo_steam_observation_to_xml_buffer, open_cmo_steam_observation_xml
+
+SOCKET_OBSERVATION_FALLBACK = "pycmo-observation-file" # the response of an export that was written to a step file instead
 
 class TimeStep(
     collections.namedtuple(
@@ -71,7 +79,7 @@ class CPEEnv():
     """
     A wrapper that extracts observations from and sends actions to Command: Professional Edition.
     """
-    def __init__(self, step_dest: str, step_size: list, player_side: str, scen_ended_path: str) -> None:
+    def __init__(self, step_dest: str, step_size: list, player_side: str, scen_ended_path: str, parser: str = "xmltodict", lazy_features: bool = False, projection: dict[str, list[str]] | Projection | None = None, batch_commands: bool = False, client: Client | None = None, observation_transport: str = "file", max_socket_observation_size: int = 16000000, min_poll_interval: float = 0.005, max_poll_interval: float = 0.1) -> None:
         """
         Description:
             Initializes the environment for one session.
@@ -81,12 +89,28 @@ class CPEEnv():
             step_size: a list containing the step size in the format ["h", "m", "s"].
             player_side: the string identifying the player's side. Side should exist in the game.
             scen_ended_path: the path to the text file that records whether a scenario has ended or not.
+            parser: the parser backend used to build observations, either "xmltodict" or "stream".
+            lazy_features: whether to return LazyFeatures, which only extract the parts of the observation that are read.
+            projection: the fields to decode for each entity type, see `get_projection`. Decodes everything if None.
+            batch_commands: whether to send the commands of each step in batches (see `Client.send_batch`), so that the action and the command that runs the game take a single round trip, and so does each check of whether the scenario ended with its poll for the observation.
+            client: a connected client to send the commands with, e.g. a Lease from a ConnectionPool. If None, connects to the game on localhost:7777. Must use "length" framing to batch commands.
+            observation_transport: how the game returns observations, either "file" (written to a step file in step_dest) or "socket" (returned in the response to the command that exports them, which needs batch_commands).
+            max_socket_observation_size: the size in bytes above which the "socket" transport writes the observation to a step file instead.
+            min_poll_interval: the time in seconds that `step` waits for before it first polls for the observation.
+            max_poll_interval: the longest time in seconds that `step` waits for between polls. The wait doubles from min_poll_interval while the game runs the step.
 
         Returns:
             None
         """
-        self.client = Client() # initialize a client to send data to the game
-        self.client.connect() # connect the client to the game
+        if observation_transport not in ("file", "socket"):
+            raise ValueError(f"Unknown observation transport '{observation_transport}', expected 'file' or 'socket'.")
+        if observation_transport == "socket" and not batch_commands:
+            raise ValueError("The socket observation transport needs batch_commands, which frames the responses of the game.")
+        self.batch_commands = batch_commands # whether commands are sent in batches, which needs framed responses
+        if client is None:
+            client = Client(framing="length" if batch_commands else None) # initialize a client to send data to the game
+            client.connect() # connect the client to the game
+        self.client = client
         self.player_side = player_side # the player's side, this is used to identify units that the player can actually control
         self.step_dest = step_dest # the path to the folder containing the xml steps files. These steps files are used to generate observations.
         self.scen_ended = scen_ended_path # the path to the text file recording whether or not the scenario has ended. "hacky" way to determine when a scenario ends because the current Lua command for this check is buggy in-game.
@@ -94,6 +118,14 @@ class CPEEnv():
         self.h = step_size[0]
         self.m = step_size[1]
         self.s = step_size[2]
+        self.parser = parser # the parser backend used to build observations, either "xmltodict" or "stream"
+        self.features_class = LazyFeatures if lazy_features else Features # LazyFeatures only extract the parts of the observation that are read
+        self.socket_features_class = LazyFeaturesFromSteam if lazy_features else FeaturesFromSteam # for the observations returned in responses
+        self.projection = get_projection(projection) # the fields to decode for each entity type
+        self.observation_transport = observation_transport
+        self.max_socket_observation_size = max_socket_observation_size
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
 
     def reset(self) -> TimeStep:
         """
@@ -123,27 +155,42 @@ class CPEEnv():
         Returns:
             (TimeStep) named tuple containing step_id, step_type, reward, observation. 
         """
-        # send the agent's action
-        if action != None:
-            self.client.send(action)
+        dur_in_secs = (int(self.h) * 3600) + (int(self.m) * 60) + int(self.s)
+        step_file_name = str(step_id) + '.xml'
+        if self.observation_transport == "socket":
+            poll = "--script \nlocal now = ScenEdit_CurrentTime() \nlocal elapsed = now - {} \nif elapsed >= {} then \n{} \nend".format(cur_time, dur_in_secs, self.get_socket_export_script(step_id))
+        else:
+            poll = "--script \nlocal now = ScenEdit_CurrentTime() \nlocal elapsed = now - {} \nif elapsed >= {} then \nfile = io.open('{}', 'w') \nio.output(file) \ntheXML = ScenEdit_ExportScenarioToXML()\nio.write(theXML) \nio.close(file) \nend".format(cur_time, dur_in_secs, self.step_dest + str(step_id) + '.xml')
 
-        # step the environment forwards
-        self.client.send("\nVP_RunForTimeAndHalt({Time='" + str(self.h) + ":" + str(self.m) + ":" + str(self.s) + "'})")
+        # send the agent's action and step the environment forwards
+        # the game only runs the step once the script that runs it has returned, so a poll cannot go with it
+        commands = [action] if action != None else []
+        commands.append("\nVP_RunForTimeAndHalt({Time='" + str(self.h) + ":" + str(self.m) + ":" + str(self.s) + "'})")
+        self.send_commands(commands, decode=False)
 
         # get the corresponding observation and reward
-        # continuously poll the game until the correct time step duration has passed
-        paused = False
-        dur_in_secs = (int(self.h) * 3600) + (int(self.m) * 60) + int(self.s)
-        step_file_name = str(step_id) + '.xml'
-        while not (paused or self.check_game_ended()):
-            data = "--script \nlocal now = ScenEdit_CurrentTime() \nlocal elapsed = now - {} \nif elapsed >= {} then \nfile = io.open('{}', 'w') \nio.output(file) \ntheXML = ScenEdit_ExportScenarioToXML()\nio.write(theXML) \nio.close(file) \nend".format(cur_time, dur_in_secs, self.step_dest + str(step_id) + '.xml')            
-            self.client.send(data)
-            if step_file_name in os.listdir(self.step_dest): # the game has been progressed and the new step information has been saved
-                paused = True
-                observation = Features(os.path.join(self.step_dest, step_file_name), self.player_side)
+        # poll the game until the correct time step duration has passed, waiting for longer and longer in between
+        poll_interval = self.min_poll_interval
+        while True:
+            sleep(poll_interval) # give the game a chance to catch up
+            poll_interval = min(poll_interval * 2, self.max_poll_interval)
+            if self.batch_commands: # check whether the scenario ended and poll in one round trip
+                poll_response = self.send_commands([self.get_game_ended_script(), poll], decode=False)[1]
+                if self.read_game_ended():
+                    break
+            elif self.check_game_ended():
+                break
+            else:
+                poll_response = self.send_commands([poll], decode=False)[0]
+            if self.observation_transport == "socket":
+                observation = self.read_socket_observation(step_id, poll_response)
+            elif step_file_name in os.listdir(self.step_dest):
+                observation = self.features_class(os.path.join(self.step_dest, step_file_name), self.player_side, parser=self.parser, projection=self.projection)
+            else:
+                observation = None
+            if observation is not None: # the game has been progressed and the new step information has been saved
                 reward = observation.side_.TotalScore
                 return TimeStep(step_id, StepType(1), reward, observation)
-            sleep(0.1) # else, sleep for 0.1 second to give the game a chance to catch up
         # if the game has ended, then save the timestep information with a different step type
         observation = self.get_obs(step_id)
         reward = observation.side_.TotalScore
@@ -160,10 +207,66 @@ class CPEEnv():
         Returns:
             (Features) named tuple containing the game observations at the current time index.
         """
+        if self.observation_transport == "socket":
+            response = self.send_commands(["--script \n" + self.get_socket_export_script(step_id)], decode=False)[0]
+            return self.read_socket_observation(step_id, response)
         data = "--script \nfile = io.open('{}', 'w')".format(self.step_dest + str(step_id) + '.xml')
         data += "\nio.output(file) \ntheXML = ScenEdit_ExportScenarioToXML() \nio.write(theXML) \nio.close(file)"
-        self.client.send(data)
-        return Features(os.path.join(self.step_dest, str(step_id) + ".xml"), self.player_side)     
+        self.send_commands([data])
+        return self.features_class(os.path.join(self.step_dest, str(step_id) + ".xml"), self.player_side, parser=self.parser, projection=self.projection)
+
+    def get_socket_export_script(self, step_id:int) -> str:
+        """
+        Description:
+            Returns the Lua statements that export the scenario to xml and return it in the response, or, if it is
+            larger than max_socket_observation_size, write it to the step file and return SOCKET_OBSERVATION_FALLBACK.
+
+        Keyword Arguments:
+            step_id: the index of the step, which names the step file.
+
+        Returns:
+            (str) the Lua statements.
+        """
+        script = "local theXML = ScenEdit_ExportScenarioToXML() \nif #theXML <= {} then \nreturn theXML \nend".format(self.max_socket_observation_size)
+        script += " \nlocal file = io.open('{}', 'w') \nfile:write(theXML) \nfile:close() \nreturn '{}'".format(self.step_dest + str(step_id) + '.xml', SOCKET_OBSERVATION_FALLBACK)
+        return script
+
+    def read_socket_observation(self, step_id:int, response:bytes) -> Features | None:
+        """
+        Description:
+            Parse the observation returned in the response to a socket export, straight from the bytes received, or
+            from the step file if the game wrote it there instead.
+
+        Keyword Arguments:
+            step_id: the index of the step.
+            response: the response to the export.
+
+        Returns:
+            (Features | None) the observation, or None if the response is empty because the game has not finished the step yet.
+        """
+        if response == b"":
+            return None
+        if response == SOCKET_OBSERVATION_FALLBACK.encode():
+            return self.features_class(os.path.join(self.step_dest, str(step_id) + ".xml"), self.player_side, parser=self.parser, projection=self.projection)
+        if not response.lstrip().startswith(b"<"):
+            raise ValueError(f"The game failed to export the observation: {response[:200].decode(errors='replace')}")
+        return self.socket_features_class(response, self.player_side, parser=self.parser, projection=self.projection)
+
+    def send_commands(self, commands:list[str], decode:bool=True) -> list[str] | list[bytes]:
+        """
+        Description:
+            Send commands to the game, in a single batch if the environment batches commands, or one after the other.
+
+        Keyword Arguments:
+            commands: the Lua commands to send.
+            decode: whether to decode the responses to batches (see `Client.send_batch`).
+
+        Returns:
+            (list[str] | list[bytes]) the response to each command.
+        """
+        if self.batch_commands:
+            return self.client.send_batch(commands, decode=decode)
+        return [self.client.send(command) for command in commands]
 
     def reset_connection(self) -> bool:
         """
@@ -191,12 +294,35 @@ class CPEEnv():
         Returns:
             (bool) whether the game has ended
         """
-        data = "--script \nlocal scen = VP_GetScenario() \nif scen.CurrentTimeNum - scen.StartTimeNum >= scen.DurationNum then \nfile = io.open('{}', 'w') \nio.output(file) \nio.write('True') \nio.close(file) \nend".format(self.scen_ended)
-        self.client.send(data)
-        f = open(self.scen_ended, 'r')
-        if f.readline() == 'True':
-            return True
-        return False
+        self.send_commands([self.get_game_ended_script()])
+        return self.read_game_ended()
+
+    def get_game_ended_script(self) -> str:
+        """
+        Description:
+            Returns the Lua script that records in the scenario has ended file whether the scenario has ended.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (str) the Lua script.
+        """
+        return "--script \nlocal scen = VP_GetScenario() \nif scen.CurrentTimeNum - scen.StartTimeNum >= scen.DurationNum then \nfile = io.open('{}', 'w') \nio.output(file) \nio.write('True') \nio.close(file) \nend".format(self.scen_ended)
+
+    def read_game_ended(self) -> bool:
+        """
+        Description:
+            Read whether the scenario has ended from the scenario has ended file, once the game has run the script from `get_game_ended_script`.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (bool) whether the game has ended
+        """
+        with open(self.scen_ended, 'r') as f:
+            return f.readline() == 'True'
     
     def action_spec(self, observation:Features) -> AvailableFunctions:
         """
@@ -235,7 +361,24 @@ class CMOEnv():
                  action_path: str,
                  scen_ended_path: str,
                  pycmo_lua_lib_path: str | None = None,
-                 max_resets: int = 20):
+                 max_resets: int = 20,
+                 parser: str = "xmltodict",
+                 lazy_features: bool = False,
+                 incremental_features: bool = False,
+                 observation_cache_size: int = 8,
+                 projection: dict[str, list[str]] | Projection | None = None,
+                 delta_observations: bool = False,
+                 sharded_observations: bool = False,
+                 shard_executor: Executor | None = None,
+                 file_watcher: str | None = None):
+        if lazy_features and incremental_features:
+            raise ValueError("Cannot use both lazy and incremental features.")
+        if delta_observations and (lazy_features or incremental_features):
+            raise ValueError("Cannot use delta observations with lazy or incremental features.")
+        if parser == "compact" and (incremental_features or delta_observations):
+            raise ValueError("Cannot use the compact parser with incremental features or delta observations.")
+        if sharded_observations and (lazy_features or incremental_features or delta_observations):
+            raise ValueError("Cannot use sharded observations with lazy or incremental features or delta observations.")
         self.client = SteamClient(props=steam_client_props) # initialize a client to send data to the game
         if not self.client.connect(): # connect the client to the game
             raise FileNotFoundError("No running instance of Command to connect to.")
@@ -250,6 +393,21 @@ class CMOEnv():
             pycmo_lua_lib_path = os.path.join(config['pycmo_path'], 'lua', 'pycmo_lib.lua')
         self.pycmo_lua_lib_path = pycmo_lua_lib_path # the path to the pycmo_lib.lua file
         self.max_resets = max_resets
+        self.parser = parser # the parser backend used to build observations, either "xmltodict", "stream" or "compact" (for ScenEdit_ExportScenarioToCompact)
+        self.features_class = LazyFeaturesFromSteam if lazy_features else FeaturesFromSteam # LazyFeaturesFromSteam only extract the parts of the observation that are read
+        self.projection = get_projection(projection) # the fields to decode for each entity type
+        self.unit_cache = UnitCache() if incremental_features else None # the units of the previous observation, reused while their xml does not change
+        self.delta_state = DeltaState() if delta_observations else None # the last keyframe of the observations exported by ScenEdit_ExportScenarioDeltaToXML
+        self.sharded_observations = sharded_observations # whether observations are exported by ScenEdit_ExportScenarioToShards
+        self.shard_executor = shard_executor # the executor that parses the shards of an observation in parallel, if any
+        self.observation_cache = ObservationCache(max_size=observation_cache_size) if observation_cache_size > 0 else None # parsed observations, reused while the observation file does not change
+        self.scen_ended_cache = ObservationCache(max_size=1) # the parsed contents of the scenario ended file
+        # wakes the waits in step and get_obs when the game has written the observation or the scenario ended file, which
+        # are still checked every so often because the game also signals by opening popups. If None (the default), the
+        # waits only pause for the popup checks, as on Windows, where only the polling watcher is available and it
+        # notices the files later than the popup checks do.
+        watched_paths = [self.observation_path, self.scen_ended] + ([get_manifest_path(self.observation_path)] if sharded_observations else [])
+        self.file_watcher = create_file_watcher(watched_paths, file_watcher) if file_watcher is not None else None
 
         self.current_observation = None
         self.step_id = 0
@@ -299,7 +457,8 @@ class CMOEnv():
         # make sure the game is paused when step is called
         while self.step_id > 0 \
             and not self.client.window_exists(window_name=self.client.scenario_paused_popup_name) \
-                and not self.check_game_ended(): ...
+                and not self.check_game_ended():
+            self.wait_for_files(timeout=self.client.props.check_window_delay_scenario_paused_popup) # no file signals the popup
 
         # send the agent's action
         if action != None: 
@@ -319,6 +478,7 @@ class CMOEnv():
                 return TimeStep(self.step_id, StepType(2), reward, observation)
             elif self.client.window_exists(window_name=self.client.scenario_paused_popup_name):
                 break
+            self.wait_for_files(timeout=self.client.props.check_window_delay_scenario_paused_popup) # no file signals the popup
         
         new_observation = self.get_obs()
         if new_observation.meta.Time == self.current_observation.meta.Time:
@@ -342,25 +502,62 @@ class CMOEnv():
         max_get_obs_retries = 10
         while True:
             try:
-                obs = FeaturesFromSteam(cmo_steam_observation_file_to_xml(self.observation_path), self.player_side) 
-                return obs
-            except TypeError:
+                if self.sharded_observations and self.shards_are_newer():
+                    manifest, shards = read_shards(self.observation_path)
+                    return ShardedFeaturesFromSteam(shards, self.player_side, projection=self.projection, executor=self.shard_executor)
+                if self.observation_cache is not None:
+                    return self.observation_cache.get(self.observation_path, lambda contents: self.features_from_xml(cmo_steam_observation_to_xml_buffer(contents)))
+                with open_cmo_steam_observation_xml(self.observation_path) as observation_xml:
+                    return self.features_from_xml(observation_xml)
+            except (TypeError, FileNotFoundError, KeyframeMismatchError):
                 get_obs_retries += 1
                 if get_obs_retries > max_get_obs_retries:
                     raise TimeoutError("CMOEnv unable to get observation.")
+                self.wait_for_files() # until the game has finished writing the observation
+
+    def wait_for_files(self, timeout:float | None=None) -> None:
+        # sleep until the game writes a watched file, for at most the timeout or else the backoff interval of the watcher
+        if self.file_watcher is not None:
+            self.file_watcher.wait(timeout=timeout)
+
+    def shards_are_newer(self) -> bool:
+        # the observations exported in one piece, e.g. when the scenario loads or ends, are read if they are newer than the shards
+        try:
+            manifest_time = os.stat(get_manifest_path(self.observation_path)).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        try:
+            return manifest_time >= os.stat(self.observation_path).st_mtime_ns
+        except FileNotFoundError:
+            return True
+
+    def features_from_xml(self, xml:str | memoryview | None) -> FeaturesFromSteam:
+        if self.delta_state is not None:
+            try:
+                return DeltaFeaturesFromSteam(xml, self.player_side, delta_state=self.delta_state, projection=self.projection)
+            except KeyframeMismatchError:
+                # the keyframe of this observation was overwritten before it was read, so catch up from the keyframe file
+                with open_cmo_steam_observation_xml(get_keyframe_path(self.observation_path)) as keyframe_xml:
+                    DeltaFeaturesFromSteam(keyframe_xml, self.player_side, delta_state=self.delta_state, projection=self.projection)
+                return DeltaFeaturesFromSteam(xml, self.player_side, delta_state=self.delta_state, projection=self.projection)
+        if self.unit_cache is not None:
+            obs = IncrementalFeaturesFromSteam(xml, self.player_side, unit_cache=self.unit_cache, projection=self.projection)
+            self.logger.debug(f"Decoded units with {obs.decode_stats.hits} hits, {obs.decode_stats.partial_hits} partial hits and {obs.decode_stats.misses} misses.")
+            return obs
+        return self.features_class(xml, self.player_side, parser=self.parser, projection=self.projection)
     
     def action_spec(self, observation:Features | FeaturesFromSteam) -> AvailableFunctions:    
         return AvailableFunctions(observation)
 
     def check_game_ended(self) -> bool:
         try:
-            scenario_ended = cmo_steam_observation_file_to_xml(self.scen_ended)
-            if scenario_ended == "true" \
-                or self.client.window_exists(window_name=self.client.scenario_end_popup_name):
-                return True
-            return False
+            scenario_ended = self.scen_ended_cache.get(self.scen_ended, cmo_steam_observation_to_xml)
         except FileNotFoundError:
-            raise FileNotFoundError(f"Cannot find {self.scen_ended}")
+            scenario_ended = None # read as not ended, like a missing file always was
+        if scenario_ended == "true" \
+            or self.client.window_exists(window_name=self.client.scenario_end_popup_name):
+            return True
+        return False
         
     def end_game(self) -> TimeStep:
         self.logger.info(f"Ending game after {self.step_id} steps.")
@@ -368,3 +565,7 @@ class CMOEnv():
         export_observation_event_name = 'Export observation'
         action = f"ScenEdit_RunScript('{pycmo_lua_lib_path}', true)\nteardown_and_end_scenario('{export_observation_event_name}', true)"
         return self.step(action)
+
+    def close(self) -> None:
+        if self.file_watcher is not None:
+            self.file_watcher.close()
@@ -6,6 +6,7 @@ import numpy as np
 from pycmo.lib.features import FeaturesFromSteam
 from pycmo.env.cmo_env import CMOEnv, StepType
 from pycmo.lib.protocol import SteamClientProps
+from pycmo.lib.spaces import get_entity_observation, get_default_observation
 
 class BasePycmoGymEnv(gym.Env):
     metadata = {"render_modes": [None]}
@@ -59,6 +60,7 @@ class BasePycmoGymEnv(gym.Env):
 
     def close(self) -> None:
         self.cmo_env.end_game()
+        self.cmo_env.close()
 
 class FloridistanPycmoGymEnv(BasePycmoGymEnv):
     def __init__(
@@ -87,35 +89,29 @@ class FloridistanPycmoGymEnv(BasePycmoGymEnv):
 
         self.observation_space = observation_space
         self.action_space = action_space
+        self.last_entity_observations = {} # the last observation of each entity, by name
+
+    def reset(self, seed:int=None, options:dict=None) -> Tuple[dict, dict]:
+        self.last_entity_observations = {} # the entities of the new scenario have not been observed yet
+        return super().reset(seed=seed, options=options)
+
+    def _get_entity_obs(self, name:str, entity) -> dict:
+        # an entity that is missing from the observation, e.g. because it was destroyed or the contact was lost, keeps
+        # its last observation, or a default one that fits the observation space if it was never observed
+        if entity:
+            self.last_entity_observations[name] = get_entity_observation(entity, self.observation_space[name])
+        elif name not in self.last_entity_observations:
+            self.last_entity_observations[name] = get_default_observation(self.observation_space[name])
+        return self.last_entity_observations[name]
 
     def _get_obs(self, observation:FeaturesFromSteam) -> dict:
         _observation = {}
 
         unit_name = "Thunder #1"
-        for unit in observation.units:
-            if unit.Name == unit_name:
-                break
-        _observation[unit_name] = {}
-
-        for key in self.observation_space[unit_name].keys():
-            obs_value = getattr(unit, key)
-            if isinstance(obs_value, float):
-                _observation[unit_name][key] = np.array((obs_value,), dtype=np.float64)
-            else:
-                _observation[unit_name][key] = obs_value        
+        _observation[unit_name] = self._get_entity_obs(unit_name, observation.get_unit_by_name(unit_name))
 
         contact_name = "BTR-82V"
-        for contact in observation.contacts:
-            if contact.Name == contact_name:
-                break
-        _observation[contact_name] = {}
-
-        for key in self.observation_space[contact_name].keys():
-            obs_value = getattr(contact, key)
-            if isinstance(obs_value, float):
-                _observation[contact_name][key] = np.array((obs_value,), dtype=np.float64)
-            else:
-                _observation[contact_name][key] = obs_value
+        _observation[contact_name] = self._get_entity_obs(contact_name, observation.get_contact_by_name(contact_name))
         
         return _observation        
     
@@ -94,7 +94,7 @@ class AvailableFunctions():
     if unit.Mounts:
       for mount in unit.Mounts:
         mount_ids.append(mount.DBID)
-        for weapon in mount.Weapons:
+        for weapon in mount.Weapons or []: # None if weapons are not projected
           weapon_ids.append(weapon.WeaponID)
           weapon_qtys.append(weapon.QuantRemaining)
     return mount_ids, weapon_ids, weapon_qtys
@@ -106,7 +106,7 @@ class AvailableFunctions():
     loadout = unit.Loadout
     if loadout:
       loadout_id = loadout.DBID
-      for weapon in loadout.Weapons:
+      for weapon in loadout.Weapons or []:
         weapon_ids.append(weapon.WeaponID)
         weapon_qtys.append(weapon.QuantRemaining)
     return loadout_id, weapon_ids, weapon_qtys
@@ -0,0 +1,243 @@
+# Purpose: Decode the compact observations written by ScenEdit_ExportScenarioToCompact into the records that Features reads.
+
+# imports
+import re
+
+from pycmo.lib.stream_parser import ScenarioRecords, SCENARIO_SCHEMA
+
+COMPACT_HEADER = "pycmo-compact"
+COMPACT_VERSION = "1"
+
+# The fields of each kind of record, in the order in which pycmo_lib.lua writes them after the kind of the record. They
+# are named after the XML elements that they replace, and units start with their type. Fields without a value are left
+# out of the records, like the elements that the XML export leaves out.
+SCENARIO_FIELDS = ("Title", "Time", "StartTime", "ZeroHour", "Duration")
+SIDE_FIELDS = ("ID", "Name", "TotalScore")
+CONTACT_FIELDS = ("ID", "Name", "CA", "CS", "Lat", "Lon")
+UNIT_FIELDS = ("#type", "ID", "DBID", "Name", "Side", "Lat", "Lon", "CA", "CH", "CS")
+FUEL_FIELDS = ("FT", "CQ", "MQ")
+LOADOUT_FIELDS = ("ID", "DBID", "Name")
+MOUNT_FIELDS = ("ID", "DBID", "Name")
+WEAPON_FIELDS = ("ID", "WeapID", "CL", "ML")
+
+COMPACT_ESCAPE = re.compile(r"\\(.)")
+COMPACT_ESCAPES = {"\\": "\\", "p": "|", "n": "\n", "r": "\r"}
+
+class CompactFormatError(ValueError):
+    """
+    Raised when a compact observation is malformed or was written by an unsupported version of pycmo_lib.lua.
+    """
+
+def is_compact_observation(observation:str | bytes | memoryview) -> bool:
+    """
+    Description:
+        Check whether an observation was written by ScenEdit_ExportScenarioToCompact rather than as XML.
+
+    Keyword Arguments:
+        observation: the observation.
+
+    Returns:
+        (bool) True if the observation is in the compact format.
+    """
+    if isinstance(observation, str):
+        return observation.startswith(COMPACT_HEADER)
+    return bytes(observation[:len(COMPACT_HEADER)]) == COMPACT_HEADER.encode()
+
+def unescape_compact_value(match:re.Match) -> str:
+    try:
+        return COMPACT_ESCAPES[match.group(1)]
+    except KeyError:
+        raise CompactFormatError(f"Invalid escape {match.group(0)!r}.")
+
+def get_columns(fields:tuple[str, ...], schema:dict | None) -> list[tuple[int, str]]:
+    # the (position, name) of the fields to keep, the kind of the record being at position 0
+    if not isinstance(schema, dict):
+        return []
+    return [(position, field) for position, field in enumerate(fields, start=1) if field in schema]
+
+def add_child(record:dict, tag:str, value) -> None:
+    # same layout as xmltodict: repeated elements become a list
+    if tag in record:
+        existing = record[tag]
+        if isinstance(existing, list):
+            existing.append(value)
+        else:
+            record[tag] = [existing, value]
+    else:
+        record[tag] = value
+
+class CompactParser(object):
+    """
+    Parses a compact observation line by line into the same records as ScenarioStreamParser.
+    """
+    def __init__(self, sides:list[str] | None = None, schema:dict = SCENARIO_SCHEMA) -> None:
+        """
+        Description:
+            Initialize a parser.
+
+        Keyword Arguments:
+            sides: the names of the sides to keep units and contacts for. Keeps every side if None.
+            schema: the schema of the Scenario element, e.g. one built by `get_scenario_schema`. Fields that are not in the schema are not decoded.
+
+        Returns:
+            None
+        """
+        self.sides = set(sides) if sides is not None else None
+        self.schema = schema
+        side_schema = schema["Sides"]["Side"]
+        contact_schema = side_schema.get("Contacts", {}).get("Contact")
+        unit_schema = schema.get("ActiveUnits", {}).get("*")
+        unit_schema = unit_schema if isinstance(unit_schema, dict) else {}
+        loadout_schema = unit_schema.get("Loadout", {}).get("Loadout")
+        mount_schema = unit_schema.get("Mounts", {}).get("Mount")
+        self.keep_contacts = contact_schema is not None
+        self.keep_units = "ActiveUnits" in schema
+        self.keep_fuel = "Fuel" in unit_schema
+        self.keep_loadout = loadout_schema is not None
+        self.keep_mounts = mount_schema is not None
+        self.keep_loadout_weapons = self.keep_loadout and "Weaps" in loadout_schema
+        self.keep_mount_weapons = self.keep_mounts and "MW" in mount_schema
+        self.scenario_columns = get_columns(SCENARIO_FIELDS, schema)
+        self.side_columns = get_columns(SIDE_FIELDS, side_schema)
+        self.contact_columns = get_columns(CONTACT_FIELDS, contact_schema)
+        self.unit_columns = get_columns(UNIT_FIELDS, unit_schema)
+        self.fuel_columns = get_columns(FUEL_FIELDS, unit_schema.get("Fuel", {}).get("FuelRec"))
+        self.loadout_columns = get_columns(LOADOUT_FIELDS, loadout_schema)
+        self.mount_columns = get_columns(MOUNT_FIELDS, mount_schema)
+        self.loadout_weapon_columns = get_columns(WEAPON_FIELDS, loadout_schema.get("Weaps", {}).get("WRec")) if self.keep_loadout_weapons else []
+        self.mount_weapon_columns = get_columns(WEAPON_FIELDS, mount_schema.get("MW", {}).get("WRec")) if self.keep_mount_weapons else []
+
+    def parse_file(self, path:str) -> ScenarioRecords:
+        """
+        Description:
+            Parse a compact observation file.
+
+        Keyword Arguments:
+            path: the path to the file.
+
+        Returns:
+            (ScenarioRecords) the records of the scenario.
+        """
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return self.parse_string(f.read())
+
+    def parse_string(self, observation:str | bytes | memoryview) -> ScenarioRecords:
+        """
+        Description:
+            Parse a compact observation held in memory.
+
+        Keyword Arguments:
+            observation: the observation, e.g. the memoryview given by `open_cmo_steam_observation_xml`.
+
+        Returns:
+            (ScenarioRecords) the records of the scenario.
+        """
+        if not isinstance(observation, str):
+            observation = str(observation, "utf-8")
+        lines = observation.split("\n")
+        header = lines[0].split("|")
+        if header[0] != COMPACT_HEADER:
+            raise CompactFormatError("The observation is not in the compact format.")
+        if len(header) != 2 or header[1] != COMPACT_VERSION:
+            raise CompactFormatError(f"Unsupported compact format version {lines[0]!r}.")
+
+        records = ScenarioRecords()
+        scenario = {}
+        sides = []
+        units = records.units
+        unit_counts = {}
+        keep_all_sides = self.sides is None
+        kept_sides = self.sides
+        contact_columns = self.contact_columns
+        unit_columns = self.unit_columns
+        fuel_columns = self.fuel_columns
+        loadout_columns = self.loadout_columns
+        mount_columns = self.mount_columns
+        loadout_weapon_columns = self.loadout_weapon_columns
+        mount_weapon_columns = self.mount_weapon_columns
+        contacts = None # the contacts of the last side, if they are kept
+        unit = None # the last unit, if it is kept
+        weapons = None # the record holding the weapons of the last loadout or mount, and its key in the record
+        weapon_columns = None
+        escaped = "\\" in observation
+
+        for line_idx in range(1, len(lines)):
+            fields = lines[line_idx].split("|")
+            if escaped and "\\" in lines[line_idx]:
+                fields = [COMPACT_ESCAPE.sub(unescape_compact_value, field) if "\\" in field else field for field in fields]
+            kind = fields[0]
+            try:
+                if kind == "W":
+                    if weapons is not None:
+                        record, key = weapons
+                        container = record.get(key)
+                        if container is None:
+                            container = record[key] = {}
+                        add_child(container, "WRec", {field: value for position, field in weapon_columns if (value := fields[position])})
+                elif kind == "U":
+                    unit_type = fields[1]
+                    if unit_type in unit_counts:
+                        unit_counts[unit_type] += 1
+                    else:
+                        unit_counts[unit_type] = 0
+                        if self.keep_units:
+                            units[unit_type] = []
+                    unit = None
+                    weapons = None
+                    side_name = fields[5] or None
+                    if self.keep_units and (keep_all_sides or side_name in kept_sides):
+                        unit = {field: value for position, field in unit_columns if (value := fields[position])}
+                        units[unit_type].append((unit_counts[unit_type], unit))
+                elif kind == "M":
+                    weapons = None
+                    if unit is not None and self.keep_mounts:
+                        mount = {field: value for position, field in mount_columns if (value := fields[position])}
+                        mounts = unit.get("Mounts")
+                        if mounts is None:
+                            mounts = unit["Mounts"] = {}
+                        add_child(mounts, "Mount", mount)
+                        if self.keep_mount_weapons:
+                            weapons = (mount, "MW")
+                            weapon_columns = mount_weapon_columns
+                elif kind == "L":
+                    weapons = None
+                    if unit is not None and self.keep_loadout:
+                        loadout = {field: value for position, field in loadout_columns if (value := fields[position])}
+                        unit["Loadout"] = {"Loadout": loadout}
+                        if self.keep_loadout_weapons:
+                            loadout["Weaps"] = None
+                            weapons = (loadout, "Weaps")
+                            weapon_columns = loadout_weapon_columns
+                elif kind == "F":
+                    if unit is not None and self.keep_fuel:
+                        fuel = unit.get("Fuel")
+                        if fuel is None:
+                            fuel = unit["Fuel"] = {}
+                        add_child(fuel, "FuelRec", {field: value for position, field in fuel_columns if (value := fields[position])})
+                elif kind == "C":
+                    if contacts is not None:
+                        contacts.append({field: value for position, field in contact_columns if (value := fields[position])})
+                elif kind == "D":
+                    side = {field: value for position, field in self.side_columns if (value := fields[position])}
+                    side_name = fields[2] or None
+                    contacts = None
+                    if self.keep_contacts and (keep_all_sides or side_name is None or side_name in kept_sides):
+                        contacts = []
+                        side["Contacts"] = contacts
+                    sides.append(side)
+                elif kind == "S":
+                    scenario.update((field, value) for position, field in self.scenario_columns if (value := fields[position]))
+                elif kind:
+                    raise CompactFormatError(f"Unknown record {kind!r} on line {line_idx + 1}.")
+            except IndexError:
+                raise CompactFormatError(f"Truncated record on line {line_idx + 1}.")
+
+        for side in sides:
+            side_contacts = side.pop("Contacts", None)
+            if side_contacts: # sides without contacts get no Contacts element, so that Features reads them as having none
+                side["Contacts"] = {"Contact": side_contacts if len(side_contacts) > 1 else side_contacts[0]}
+        if sides:
+            scenario["Sides"] = {"Side": sides if len(sides) > 1 else sides[0]}
+        records.scen_dic = {"Scenario": scenario}
+        records.has_active_units = self.keep_units
+        return records
@@ -0,0 +1,436 @@
+# Purpose: Share a fleet of instances of Command (CPE or CommandCLI servers) between environments, with health checks, leases, reconnection and per-instance statistics.
+
+# imports
+import logging
+import threading
+from dataclasses import dataclass, replace
+from time import monotonic, perf_counter
+from typing import Callable, NamedTuple
+
+from pycmo.lib.protocol import Client, FramingError
+
+HEALTH_CHECK_COMMAND = "return 'ok'"
+
+class Endpoint(NamedTuple):
+    host: str
+    port: int
+
+@dataclass
+class EndpointStats:
+    commands: int = 0 # the number of commands sent, counting each command of a batch and each health check
+    errors: int = 0 # the number of sends and health checks that failed
+    reconnects: int = 0 # the number of successful reconnections
+    leases: int = 0 # the number of times the endpoint was leased
+    total_latency_s: float = 0.0 # the total round trip time of the sends
+    max_latency_s: float = 0.0
+    last_latency_s: float | None = None
+    sends: int = 0 # the number of sends that succeeded, each of them a round trip
+    healthy: bool = False
+
+    @property
+    def mean_latency_s(self) -> float | None:
+        return self.total_latency_s / self.sends if self.sends else None
+
+def check_client_health(client:Client) -> bool:
+    """
+    Description:
+        The default health check of a ConnectionPool: send a command and check that the game answers it.
+
+    Keyword Arguments:
+        client: the connected client.
+
+    Returns:
+        (bool) whether the game answered. With "length" framing, the answer must be "ok".
+    """
+    if client.framing == "length":
+        return client.send_batch([HEALTH_CHECK_COMMAND]) == ["ok"]
+    client.send(HEALTH_CHECK_COMMAND)
+    return True
+
+class PooledEndpoint():
+    # the state of an endpoint in the pool, guarded by the lock of the pool
+    def __init__(self, endpoint:Endpoint, client:Client) -> None:
+        self.endpoint = endpoint
+        self.client = client
+        self.stats = EndpointStats()
+        self.connected = False
+        self.has_connected = False # whether it was ever connected, so that later connections count as reconnections
+        self.leased = False
+        self.removed = False
+
+class Lease():
+    """
+    A connection to one instance of the game, lent by a ConnectionPool until it is released. It has the same `send`,
+    `send_batch`, `restart` and `end_connection` methods as the Client, so that it can be given to CPEEnv, and it
+    records the latency and errors of each send in the statistics of its endpoint. Ending the connection releases the
+    lease.
+    """
+    def __init__(self, pool:"ConnectionPool", pooled:PooledEndpoint) -> None:
+        self.pool = pool
+        self.pooled = pooled
+        self.endpoint = pooled.endpoint
+        self.framing = pooled.client.framing
+        self.failed = False # whether a send failed, in which case the endpoint is checked before it is leased again
+        self.released = False
+
+    def _call(self, command_count:int, send:Callable, *args):
+        if self.released:
+            raise ConnectionError("The lease was released.")
+        start = perf_counter()
+        try:
+            response = send(*args)
+        except (OSError, FramingError):
+            self.failed = True
+            self.pool._record_error(self.pooled)
+            raise
+        self.pool._record_send(self.pooled, command_count, perf_counter() - start)
+        return response
+
+    def send(self, data:str, encoding:str="UTF-8") -> str:
+        return self._call(1, self.pooled.client.send, data, encoding)
+
+    def send_batch(self, commands:list[str], encoding:str="UTF-8", decode:bool=True) -> list[str] | list[bytes]:
+        return self._call(len(commands), self.pooled.client.send_batch, commands, encoding, decode)
+
+    def restart(self) -> bool:
+        """
+        Description:
+            Reconnect to the same endpoint.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (bool) whether the endpoint is healthy after reconnecting.
+        """
+        self.failed = not self.pool._reconnect(self.pooled)
+        return not self.failed
+
+    def release(self) -> None:
+        """
+        Description:
+            Give the connection back to the pool. Does nothing if it was already released.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            None
+        """
+        if not self.released:
+            self.released = True
+            self.pool.release(self)
+
+    def end_connection(self) -> bool:
+        self.release()
+        return True
+
+    def __enter__(self) -> "Lease":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+class ConnectionPool():
+    """
+    Tracks a fleet of instances of the game, each of them listening on its own (host, port) endpoint, and lends their
+    connections to environments one at a time. Endpoints are health-checked when they are added, when a lease on them
+    fails and, if `start_health_checks` was called, periodically while they are not leased. An endpoint that fails its
+    health check is reconnected; if it cannot be reconnected, it is left out of the leases until a later health check
+    succeeds, or replaced by the endpoint that `replace_endpoint` returns.
+    """
+    def __init__(self,
+                 endpoints:list[tuple[str, int]],
+                 client_factory:Callable[[str, int], Client] = Client,
+                 health_check:Callable[[Client], bool] = check_client_health,
+                 replace_endpoint:Callable[[Endpoint], tuple[str, int] | None] | None = None,
+                 max_reconnects:int = 3) -> None:
+        """
+        Description:
+            Initializes the pool and connects to every endpoint.
+
+        Keyword Arguments:
+            endpoints: the (host, port) of each instance of the game.
+            client_factory: creates the client of an endpoint from its host and port, e.g. to choose the framing of the responses.
+            health_check: checks that the game answers on a connected client. A health check that raises an OSError or a FramingError fails.
+            replace_endpoint: returns the (host, port) of an instance that replaces an endpoint that cannot be reconnected, e.g. after starting a new CommandCLI server with Server, or None to keep the endpoint. Dead endpoints are kept if None.
+            max_reconnects: the number of times to try reconnecting to an endpoint before it is replaced or left out.
+
+        Returns:
+            None
+        """
+        self.client_factory = client_factory
+        self.health_check = health_check
+        self.replace_endpoint = replace_endpoint
+        self.max_reconnects = max_reconnects
+        self.logger = logging.getLogger(__name__)
+        self.condition = threading.Condition()
+        self.pooled = {} # the state of each endpoint, by endpoint
+        self.closed = False
+        self.health_check_thread = None
+        self.stop_health_checks = threading.Event()
+        for host, port in endpoints:
+            self.add_endpoint(host, port)
+
+    def add_endpoint(self, host:str, port:int) -> Endpoint:
+        """
+        Description:
+            Add an endpoint to the pool, connect to it and health-check it.
+
+        Keyword Arguments:
+            host: the IP host of the instance.
+            port: the port of the instance.
+
+        Returns:
+            (Endpoint) the endpoint.
+        """
+        return self._add_endpoint(host, port, replace_if_dead=True)
+
+    def _add_endpoint(self, host:str, port:int, replace_if_dead:bool) -> Endpoint:
+        endpoint = Endpoint(host, port)
+        pooled = PooledEndpoint(endpoint, self.client_factory(host, port))
+        with self.condition:
+            if endpoint in self.pooled:
+                raise ValueError(f"The endpoint {host}:{port} is already in the pool.")
+            self.pooled[endpoint] = pooled
+            pooled.leased = True # held until it is checked
+        self._recover(pooled, replace_if_dead)
+        return endpoint
+
+    def remove_endpoint(self, endpoint:tuple[str, int]) -> None:
+        """
+        Description:
+            Remove an endpoint from the pool. If it is leased, it is disconnected when the lease is released.
+
+        Keyword Arguments:
+            endpoint: the (host, port) of the endpoint.
+
+        Returns:
+            None
+        """
+        with self.condition:
+            pooled = self.pooled.pop(Endpoint(*endpoint))
+            pooled.removed = True
+            leased = pooled.leased
+        if not leased:
+            self._disconnect(pooled)
+
+    def acquire(self, timeout:float | None = None) -> Lease:
+        """
+        Description:
+            Lease the connection to a healthy instance that is not leased, waiting until one is released if they are all
+            leased. Instances with the lowest mean latency are leased first.
+
+        Keyword Arguments:
+            timeout: the number of seconds to wait for an instance. Waits forever if None.
+
+        Returns:
+            (Lease) the lease, to be released when the environment is done with the instance, e.g. with a `with` block.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise ConnectionError("The connection pool is closed.")
+                available = [pooled for pooled in self.pooled.values() if not pooled.leased and pooled.stats.healthy]
+                if available:
+                    pooled = min(available, key=lambda pooled: (pooled.stats.mean_latency_s or 0.0, pooled.stats.leases))
+                    pooled.leased = True
+                    pooled.stats.leases += 1
+                    return Lease(self, pooled)
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No healthy instance of Command was released within {timeout} seconds.")
+                self.condition.wait(remaining)
+
+    def release(self, lease:Lease) -> None:
+        """
+        Description:
+            Give a leased connection back to the pool. It is health-checked, and reconnected if needed, first if one of
+            its sends failed.
+
+        Keyword Arguments:
+            lease: the lease.
+
+        Returns:
+            None
+        """
+        lease.released = True
+        pooled = lease.pooled
+        if pooled.removed or self.closed:
+            self._disconnect(pooled)
+            return
+        if lease.failed:
+            self._recover(pooled)
+            return
+        with self.condition:
+            pooled.leased = False
+            self.condition.notify()
+
+    def check_health(self) -> dict[Endpoint, bool]:
+        """
+        Description:
+            Health-check every endpoint that is not leased, and reconnect, replace or leave out the ones that fail.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (dict[Endpoint, bool]) whether each endpoint that was checked is healthy, after reconnecting it if needed.
+        """
+        with self.condition:
+            to_check = [pooled for pooled in self.pooled.values() if not pooled.leased]
+            for pooled in to_check:
+                pooled.leased = True # held while it is checked
+        results = {}
+        for pooled in to_check:
+            if not (pooled.connected and self._check(pooled)):
+                self._recover(pooled)
+            else:
+                self._release_checked(pooled)
+            results[pooled.endpoint] = pooled.stats.healthy
+        return results
+
+    def start_health_checks(self, interval:float) -> None:
+        """
+        Description:
+            Health-check the endpoints that are not leased every `interval` seconds in a background thread, until the
+            pool is closed.
+
+        Keyword Arguments:
+            interval: the number of seconds between health checks.
+
+        Returns:
+            None
+        """
+        def run() -> None:
+            while not self.stop_health_checks.wait(interval):
+                self.check_health()
+        self.health_check_thread = threading.Thread(target=run, name="pycmo-pool-health-checks", daemon=True)
+        self.health_check_thread.start()
+
+    def stats(self) -> dict[Endpoint, EndpointStats]:
+        """
+        Description:
+            Return a copy of the statistics of every endpoint.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (dict[Endpoint, EndpointStats]) the statistics of each endpoint.
+        """
+        with self.condition:
+            return {endpoint: replace(pooled.stats) for endpoint, pooled in self.pooled.items()}
+
+    def close(self) -> None:
+        """
+        Description:
+            Stop the health checks and disconnect every endpoint that is not leased. Leased endpoints are disconnected
+            when they are released.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            None
+        """
+        self.stop_health_checks.set()
+        if self.health_check_thread is not None:
+            self.health_check_thread.join()
+        with self.condition:
+            self.closed = True
+            to_disconnect = [pooled for pooled in self.pooled.values() if not pooled.leased]
+            self.condition.notify_all()
+        for pooled in to_disconnect:
+            self._disconnect(pooled)
+
+    def __enter__(self) -> "ConnectionPool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _record_send(self, pooled:PooledEndpoint, command_count:int, latency:float) -> None:
+        with self.condition:
+            stats = pooled.stats
+            stats.commands += command_count
+            stats.sends += 1
+            stats.total_latency_s += latency
+            stats.max_latency_s = max(stats.max_latency_s, latency)
+            stats.last_latency_s = latency
+
+    def _record_error(self, pooled:PooledEndpoint) -> None:
+        with self.condition:
+            pooled.stats.errors += 1
+            pooled.stats.healthy = False
+
+    def _check(self, pooled:PooledEndpoint) -> bool:
+        # health-checks a connected endpoint held by the caller, counting the check as a command
+        start = perf_counter()
+        try:
+            healthy = self.health_check(pooled.client)
+        except (OSError, FramingError):
+            healthy = False
+        if healthy:
+            self._record_send(pooled, 1, perf_counter() - start)
+        else:
+            self._record_error(pooled)
+        return healthy
+
+    def _reconnect(self, pooled:PooledEndpoint) -> bool:
+        # reconnects an endpoint held by the caller up to max_reconnects times, and returns whether it is healthy
+        for attempt in range(self.max_reconnects):
+            try:
+                if pooled.connected:
+                    pooled.connected = False
+                    pooled.client.restart()
+                else:
+                    pooled.client.connect()
+                pooled.connected = True
+            except ConnectionError:
+                self.logger.debug(f"Failed to reconnect to {pooled.endpoint.host}:{pooled.endpoint.port} (attempt {attempt + 1} of {self.max_reconnects}).")
+                continue
+            if self._check(pooled):
+                with self.condition:
+                    if pooled.has_connected:
+                        pooled.stats.reconnects += 1
+                    pooled.stats.healthy = True
+                pooled.has_connected = True
+                return True
+        with self.condition:
+            pooled.stats.healthy = False
+        return False
+
+    def _recover(self, pooled:PooledEndpoint, replace_if_dead:bool = True) -> None:
+        # reconnects an endpoint held by the caller, replaces it if that fails, and releases it
+        if self._reconnect(pooled) or self.replace_endpoint is None or not replace_if_dead:
+            self._release_checked(pooled)
+            return
+        replacement = self.replace_endpoint(pooled.endpoint)
+        if replacement is None:
+            self._release_checked(pooled)
+            return
+        self.logger.info(f"Replacing {pooled.endpoint.host}:{pooled.endpoint.port} with {replacement[0]}:{replacement[1]}.")
+        with self.condition:
+            if self.pooled.get(pooled.endpoint) is pooled:
+                del self.pooled[pooled.endpoint]
+            pooled.removed = True
+        self._disconnect(pooled)
+        self._add_endpoint(*replacement, replace_if_dead=False) # a replacement that is dead too is left out rather than replaced in turn
+
+    def _release_checked(self, pooled:PooledEndpoint) -> None:
+        if pooled.removed or self.closed:
+            self._disconnect(pooled)
+            return
+        with self.condition:
+            pooled.leased = False
+            self.condition.notify_all()
+
+    def _disconnect(self, pooled:PooledEndpoint) -> None:
+        if pooled.connected:
+            pooled.connected = False
+            try:
+                pooled.client.end_connection()
+            except ConnectionError:
+                pass
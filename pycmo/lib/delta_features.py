@@ -0,0 +1,227 @@
+# Purpose: Decode the observations written by ScenEdit_ExportScenarioDeltaToXML, which only hold the units and contacts that changed since the last keyframe.
+
+# imports
+import os
+from functools import lru_cache
+
+from pycmo.lib.features import FeaturesFromSteam, Unit, Projection, get_projection
+from pycmo.lib.stream_parser import ScenarioStreamParser, ScenarioRecords, get_scenario_schema
+
+class KeyframeMismatchError(ValueError):
+    """
+    Raised when a delta observation was exported against a keyframe that was not decoded.
+    """
+
+def get_keyframe_path(observation_path:str) -> str:
+    """
+    Description:
+        Return the path of the file that holds the last keyframe exported next to an observation file.
+
+    Keyword Arguments:
+        observation_path: the path to the observation file, e.g. "Steam demo.inst".
+
+    Returns:
+        (str) the path to the keyframe file, e.g. "Steam demo_keyframe.inst".
+    """
+    root, extension = os.path.splitext(observation_path)
+    return root + "_keyframe" + extension
+
+@lru_cache(maxsize=None)
+def get_delta_schema(projection:Projection) -> dict:
+    """
+    Description:
+        Extend the scenario schema of a projection with the elements of delta observations. Unit and contact IDs are always kept to match entities with the keyframe.
+
+    Keyword Arguments:
+        projection: the Projection listing the fields to decode for each entity type.
+
+    Returns:
+        (dict) the scenario schema.
+    """
+    schema = dict(get_scenario_schema(projection))
+    schema["Delta"] = {"Keyframe": None, "Sequence": None, "IsKeyframe": None}
+    schema["RemovedUnits"] = {"ID": None}
+    schema["UnitOrder"] = {"ID": None}
+    if "ActiveUnits" in schema:
+        schema["ActiveUnits"] = {"*": dict(schema["ActiveUnits"]["*"], ID=None)}
+    side_schema = dict(schema["Sides"]["Side"])
+    side_schema["RemovedContacts"] = {"ID": None}
+    side_schema["ContactOrder"] = {"ID": None}
+    if "Contacts" in side_schema:
+        side_schema["Contacts"] = {"Contact": dict(side_schema["Contacts"]["Contact"], ID=None)}
+    schema["Sides"] = {"Side": side_schema}
+    return schema
+
+def as_list(value:list | dict | str | None) -> list:
+    # xmltodict layout: repeated elements are lists, single elements are not, and empty elements are None
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def get_ids(container:dict | str | None) -> list[str]:
+    return as_list(container["ID"]) if isinstance(container, dict) else []
+
+def get_entity_id(record:dict | str | None) -> str | None:
+    return record.get("ID") if isinstance(record, dict) else None
+
+class DeltaStreamParser(ScenarioStreamParser):
+    """
+    Keeps the units of every side, as well as the order in which they appear. The index of a unit within its type
+    counts the units of every side, so it can only be recomputed from all of them.
+    """
+    def _create_parser(self, encoding:str | None = None):
+        parser = super()._create_parser(encoding)
+        self._records.unit_sequence = [] # (unit type, unit record) tuples in document order
+        return parser
+
+    def _keep_unit(self, side_name:str | None) -> bool:
+        return True
+
+    def _end_unit(self, unit_type:str, unit:dict | str | None) -> None:
+        super()._end_unit(unit_type, unit)
+        self._records.unit_sequence.append((unit_type, unit))
+
+class DeltaState(object):
+    """
+    Holds the last keyframe that was decoded, against which delta observations are applied, and the units decoded
+    from it.
+    """
+    def __init__(self) -> None:
+        self.keyframe_id = None
+        self.units = {} # unit ID -> (unit type, unit record) for the units of every side, in keyframe order
+        self.contacts = {} # contact ID -> contact record for the contacts of the player's side, in keyframe order
+        self.decoded_units = {} # unit ID -> (unit record, decoded unit)
+
+    def clear(self) -> None:
+        self.keyframe_id = None
+        self.units = {}
+        self.contacts = {}
+        self.decoded_units = {}
+
+    def set_keyframe(self, keyframe_id:str, records:ScenarioRecords, player_side:str) -> None:
+        """
+        Description:
+            Replace the keyframe with a keyframe observation.
+
+        Keyword Arguments:
+            keyframe_id: the ID of the keyframe.
+            records: the records parsed from the keyframe.
+            player_side: the side of the player.
+
+        Returns:
+            None
+        """
+        self.keyframe_id = keyframe_id
+        self.units = {get_entity_id(unit): (unit_type, unit) for unit_type, unit in records.unit_sequence}
+        side = get_side(records.scen_dic, player_side)
+        contacts = as_list(side["Contacts"]["Contact"]) if side is not None and isinstance(side.get("Contacts"), dict) else []
+        self.contacts = {get_entity_id(contact): contact for contact in contacts}
+        self.decoded_units = {}
+
+    def apply(self, records:ScenarioRecords, player_side:str) -> ScenarioRecords:
+        """
+        Description:
+            Apply a delta observation to the keyframe.
+
+        Keyword Arguments:
+            records: the records parsed from the delta observation.
+            player_side: the side of the player.
+
+        Returns:
+            (ScenarioRecords) the records of the whole observation, as parsed from a full export.
+        """
+        scenario = records.scen_dic["Scenario"]
+        changed_units = {get_entity_id(unit): (unit_type, unit) for unit_type, unit in records.unit_sequence}
+        removed_unit_ids = set(get_ids(scenario.pop("RemovedUnits", None)))
+        unit_ids = get_order(self.units, changed_units, removed_unit_ids, get_ids(scenario.pop("UnitOrder", None)))
+
+        merged = ScenarioRecords()
+        merged.scen_dic = records.scen_dic
+        merged.has_active_units = records.has_active_units
+        for unit_id in unit_ids:
+            unit_type, unit = changed_units.get(unit_id) or self.units[unit_id]
+            units_of_type = merged.units.setdefault(unit_type, [])
+            units_of_type.append((len(units_of_type), unit))
+
+        side = get_side(records.scen_dic, player_side)
+        if side is not None:
+            contacts = as_list(side["Contacts"]["Contact"]) if isinstance(side.get("Contacts"), dict) else []
+            changed_contacts = {get_entity_id(contact): contact for contact in contacts}
+            removed_contact_ids = set(get_ids(side.pop("RemovedContacts", None)))
+            contact_ids = get_order(self.contacts, changed_contacts, removed_contact_ids, get_ids(side.pop("ContactOrder", None)))
+            contacts = [changed_contacts.get(contact_id) or self.contacts[contact_id] for contact_id in contact_ids]
+            side["Contacts"] = {"Contact": contacts} if contacts else None
+        return merged
+
+def get_side(scen_dic:dict, side_name:str) -> dict | None:
+    try:
+        sides = as_list(scen_dic["Scenario"]["Sides"]["Side"])
+    except (KeyError, TypeError):
+        return None
+    for side in sides:
+        if isinstance(side, dict) and side.get("Name") == side_name:
+            return side
+    return None
+
+def get_order(keyframe_entities:dict, changed_entities:dict, removed_ids:set[str], order:list[str]) -> list[str]:
+    # the exported order if there is one, otherwise the keyframe order followed by the new entities
+    if order:
+        return [entity_id for entity_id in order if entity_id in changed_entities or entity_id in keyframe_entities]
+    entity_ids = [entity_id for entity_id in keyframe_entities if entity_id not in removed_ids]
+    entity_ids += [entity_id for entity_id in changed_entities if entity_id not in keyframe_entities]
+    return entity_ids
+
+class DeltaFeaturesFromSteam(FeaturesFromSteam):
+    """
+    FeaturesFromSteam for the observations written by ScenEdit_ExportScenarioDeltaToXML. Keyframes replace the
+    keyframe held in `delta_state`, and delta observations are applied to it, so that only the units and contacts that
+    changed since the keyframe are parsed. Units that did not change since the keyframe are not decoded again.
+    Observations written by ScenEdit_ExportScenarioToXML are decoded as is. Always uses the "stream" parser backend.
+    """
+    def __init__(self, xml:str, player_side:str, delta_state:DeltaState, projection:dict[str, list[str]] | Projection | None = None) -> None:
+        """
+        Description:
+            Initialize a Features object to hold observations.
+
+        Keyword Arguments:
+            xml: the scenario xml containing the game observations.
+            player_side: the side of the player. Dictates the units that they can actually control.
+            delta_state: the last keyframe. It is replaced if the observation is a keyframe.
+            projection: the fields to decode for each entity type. Decodes everything if None. Should not change while the keyframe is kept.
+
+        Returns:
+            None
+        """
+        self.delta_state = delta_state
+        super().__init__(xml, player_side, parser="stream", projection=projection)
+
+    def parse_scenario(self, xml:str, player_side:str, parser:str="stream") -> None:
+        records = self.create_stream_parser(player_side).parse_string(xml)
+        scenario = records.scen_dic.get("Scenario")
+        delta = scenario.get("Delta") if isinstance(scenario, dict) else None
+        if not isinstance(delta, dict):
+            self.scen_dic = records.scen_dic
+            self.unit_records = records
+            return
+        if delta.get("IsKeyframe") == "true":
+            self.delta_state.set_keyframe(delta.get("Keyframe"), records, player_side)
+        elif delta.get("Keyframe") != self.delta_state.keyframe_id:
+            raise KeyframeMismatchError(f"The observation was exported against keyframe {delta.get('Keyframe')}, but the last decoded keyframe is {self.delta_state.keyframe_id}.")
+        self.scen_dic = records.scen_dic
+        self.unit_records = self.delta_state.apply(records, player_side)
+
+    def create_stream_parser(self, player_side:str) -> ScenarioStreamParser:
+        return DeltaStreamParser(sides=[player_side], schema=get_delta_schema(self.projection))
+
+    def get_unit(self, unit:dict, unit_idx:int, unit_type:str, side_name:str) -> Unit:
+        unit_id = unit.get("ID")
+        decoded_units = self.delta_state.decoded_units
+        cached = decoded_units.get(unit_id)
+        if cached is not None and cached[0] is unit:
+            decoded_unit = cached[1]
+            if decoded_unit.XML_ID != unit_idx:
+                decoded_unit = decoded_unit._replace(XML_ID=unit_idx)
+            return decoded_unit
+        decoded_unit = super().get_unit(unit=unit, unit_idx=unit_idx, unit_type=unit_type, side_name=side_name)
+        decoded_units[unit_id] = (unit, decoded_unit)
+        return decoded_unit
@@ -6,8 +6,14 @@
 # imports
 import xml.etree.ElementTree as ET
 import xmltodict
-from typing import Tuple, NamedTuple
+from typing import Tuple, NamedTuple, Iterator, Callable
+from collections.abc import MutableSequence
+from functools import cached_property, partial
 import logging
+import numpy as np
+
+from pycmo.lib.stream_parser import ScenarioStreamParser, ScenarioRecords, get_scenario_schema
+from pycmo.lib.compact_parser import CompactParser, is_compact_observation
 
 # This section can be modified to dictate the type of observations that are returned from the game at each time step
 # Game
@@ -78,11 +84,158 @@ class Unit(NamedTuple):
     Mounts: list[Mount] | None
     Loadout: Loadout | None
 
+# Projections list the fields to decode for each entity type. Fields that are left out are None and the elements they
+# are read from are skipped by the "stream" parser. A Unit (Contact) projection without any fields drops the units
+# (contacts) altogether. Mounts, loadouts and weapons are only decoded if the field that holds them is projected.
+class Projection(NamedTuple):
+    Unit: frozenset[str]
+    Mount: frozenset[str]
+    Loadout: frozenset[str]
+    Weapon: frozenset[str]
+    Contact: frozenset[str]
+
+PROJECTED_TYPES = {"Unit": Unit, "Mount": Mount, "Loadout": Loadout, "Weapon": Weapon, "Contact": Contact}
+
+FULL_PROJECTION = Projection(*(frozenset(entity_type._fields) for entity_type in PROJECTED_TYPES.values()))
+
+def get_projection(spec:dict[str, list[str]] | Projection | None) -> Projection:
+    """
+    Description:
+        Build a projection from a declarative spec, e.g. {"Unit": ["ID", "Name", "Lon", "Lat"], "Contact": []}.
+
+    Keyword Arguments:
+        spec: the fields to decode keyed by entity type ("Unit", "Mount", "Loadout", "Weapon" or "Contact"). Entity types that are left out keep all their fields. Decodes everything if None.
+    
+    Returns:
+        (Projection) the projection.
+    """
+    if spec is None:
+        return FULL_PROJECTION
+    if isinstance(spec, Projection):
+        return spec
+    unknown_types = set(spec) - set(PROJECTED_TYPES)
+    if unknown_types:
+        raise ValueError(f"Unknown entity types in projection: {sorted(unknown_types)}.")
+    fields = {}
+    for type_name, entity_type in PROJECTED_TYPES.items():
+        if type_name not in spec:
+            fields[type_name] = frozenset(entity_type._fields)
+            continue
+        if isinstance(spec[type_name], str):
+            raise ValueError(f"The {type_name} projection must be a list of field names.")
+        fields[type_name] = frozenset(spec[type_name])
+        unknown_fields = fields[type_name] - set(entity_type._fields)
+        if unknown_fields:
+            raise ValueError(f"Unknown {type_name} fields in projection: {sorted(unknown_fields)}.")
+    return Projection(**fields)
+
+# Columnar views of the units and contacts. Row i holds the i-th unit (contact) and ID[i] is its GUID; `index` maps a
+# GUID back to its row. Missing float values are NaN, DBIDs that are not projected are -1.
+class UnitTable(NamedTuple):
+    ID: np.ndarray
+    DBID: np.ndarray
+    Lon: np.ndarray
+    Lat: np.ndarray
+    CH: np.ndarray
+    CS: np.ndarray
+    CA: np.ndarray
+    CurrentFuel: np.ndarray
+    MaxFuel: np.ndarray
+    index: dict[str, int]
+
+class ContactTable(NamedTuple):
+    ID: np.ndarray
+    Lon: np.ndarray
+    Lat: np.ndarray
+    CS: np.ndarray
+    CA: np.ndarray
+    index: dict[str, int]
+
+def get_unit_table(units:list[Unit]) -> UnitTable:
+    """
+    Description:
+        Build the columnar view of a list of units in a single pass.
+
+    Keyword Arguments:
+        units: the units.
+    
+    Returns:
+        (UnitTable) one array per field, with one row per unit.
+    """
+    ids = []
+    dbids = []
+    rows = []
+    for unit in units:
+        ids.append(unit.ID)
+        dbids.append(unit.DBID if unit.DBID is not None else -1) # -1 if DBID is not projected
+        rows.append((unit.Lon, unit.Lat, unit.CH, unit.CS, unit.CA, unit.CurrentFuel, unit.MaxFuel))
+    columns = np.array(rows, dtype=np.float64).reshape(-1, 7).T.copy() # None becomes NaN
+    return UnitTable(np.array(ids, dtype=object), np.array(dbids, dtype=np.int64), *columns, get_row_index(ids))
+
+def get_contact_table(contacts:list[Contact]) -> ContactTable:
+    """
+    Description:
+        Build the columnar view of a list of contacts in a single pass.
+
+    Keyword Arguments:
+        contacts: the contacts.
+    
+    Returns:
+        (ContactTable) one array per field, with one row per contact.
+    """
+    ids = []
+    rows = []
+    for contact in contacts:
+        ids.append(contact.ID)
+        rows.append((contact.Lon, contact.Lat, contact.CS, contact.CA))
+    columns = np.array(rows, dtype=np.float64).reshape(-1, 4).T.copy() # None becomes NaN
+    return ContactTable(np.array(ids, dtype=object), *columns, get_row_index(ids))
+
+def get_row_index(ids:list[str]) -> dict[str, int]:
+    # the first row wins if an ID is repeated, like a linear scan would
+    index = {}
+    for row, entity_id in enumerate(ids):
+        index.setdefault(entity_id, row)
+    return index
+
+def index_by_id(entities:list[Unit] | list[Contact]) -> dict[str, Unit | Contact]:
+    """
+    Description:
+        Index units or contacts by ID. The first one wins if an ID is repeated.
+
+    Keyword Arguments:
+        entities: the units or contacts.
+    
+    Returns:
+        (dict) the units or contacts keyed by ID.
+    """
+    index = {}
+    for entity in entities:
+        index.setdefault(entity.ID, entity)
+    return index
+
+def index_by_name(entities:list[Unit] | list[Contact]) -> dict[str, list[Unit | Contact]]:
+    """
+    Description:
+        Index units or contacts by name. Entities without a name are left out.
+
+    Keyword Arguments:
+        entities: the units or contacts.
+    
+    Returns:
+        (dict) the units or contacts with each name, in observation order, keyed by name.
+    """
+    index = {}
+    for entity in entities:
+        if entity.Name is not None:
+            index.setdefault(entity.Name, []).append(entity)
+    return index
+
 class Features(object):
     """
     Render feature layers from a Command: Professional Edition scenario XML into named tuples.
     """
-    def __init__(self, xml:str, player_side:str) -> None:
+    def __init__(self, xml:str, player_side:str, parser:str="xmltodict", projection:dict[str, list[str]] | Projection | None = None) -> None:
         """
         Description:
             Initialize a Features object to hold observations.
@@ -90,18 +243,104 @@ class Features(object):
         Keyword Arguments:
             xml: the path to the xml file containing the game observations.
             player_side: the side of the player. Dictates the units that they can actually control.
+            parser: the parser backend, either "xmltodict" or "stream". The "stream" parser reads the file in a single pass and only keeps the player's units and contacts, so `scen_dic` only holds the scenario-level fields and the sides.
+            projection: the fields to decode for each entity type, see `get_projection`. Decodes everything if None. The "stream" parser also skips the elements of the fields that are left out.
         
         Returns:
             None
         """
-        try:
-            tree = ET.parse(xml) # This variable contains the XML tree
-            root = tree.getroot() # This is the root of the XML tree
-            xmlstr = ET.tostring(root)            
-            self.scen_dic = xmltodict.parse(xmlstr) # our scenario xml is now in 'dic'
-        except FileNotFoundError:
-            raise FileNotFoundError("Unable to parse scenario xml.")
+        self.projection = get_projection(projection)
+        self.parse_scenario(xml, player_side, parser)
+        self.init_features(player_side)
+
+    @classmethod
+    def from_parsed(cls, scen_dic:dict, unit_records:ScenarioRecords | None, player_side:str, projection:dict[str, list[str]] | Projection | None = None) -> "Features":
+        """
+        Description:
+            Create a Features object from an already parsed scenario. The parsed data is shared, not copied.
+
+        Keyword Arguments:
+            scen_dic: the parsed scenario.
+            unit_records: the units extracted by the "stream" parser, or None for the "xmltodict" parser.
+            player_side: the side of the player. Dictates the units that they can actually control.
+            projection: the fields to decode for each entity type. It should not project fields that were skipped by the parser.
+        
+        Returns:
+            (Features) the observations of the player's side.
+        """
+        features = cls.__new__(cls)
+        features.projection = get_projection(projection)
+        features.scen_dic = scen_dic
+        features.unit_records = unit_records
+        features.init_features(player_side)
+        return features
+
+    def parse_scenario(self, xml:str, player_side:str, parser:str="xmltodict") -> None:
+        """
+        Description:
+            Parse the scenario xml into `scen_dic` (and `unit_records` for the "stream" parser).
+
+        Keyword Arguments:
+            xml: the path to the xml file containing the game observations.
+            player_side: the side of the player.
+            parser: the parser backend, either "xmltodict" or "stream".
+        
+        Returns:
+            None
+        """
+        self.unit_records = None
+        if parser == "stream":
+            records = self.create_stream_parser(player_side).parse_file(xml)
+            self.scen_dic = records.scen_dic
+            self.unit_records = records
+        elif parser == "xmltodict":
+            try:
+                tree = ET.parse(xml) # This variable contains the XML tree
+                root = tree.getroot() # This is the root of the XML tree
+                xmlstr = ET.tostring(root)            
+                self.scen_dic = xmltodict.parse(xmlstr) # our scenario xml is now in 'dic'
+            except FileNotFoundError:
+                raise FileNotFoundError("Unable to parse scenario xml.")
+        else:
+            raise ValueError(f"Unknown parser '{parser}'.")
+
+    def create_stream_parser(self, player_side:str) -> ScenarioStreamParser:
+        """
+        Description:
+            Create the parser used by the "stream" parser backend.
+
+        Keyword Arguments:
+            player_side: the side of the player.
+        
+        Returns:
+            (ScenarioStreamParser) a parser that keeps the player's units and contacts.
+        """
+        return ScenarioStreamParser(sides=[player_side], schema=get_scenario_schema(self.projection))
+
+    def create_compact_parser(self, player_side:str) -> CompactParser:
+        """
+        Description:
+            Create the parser used by the "compact" parser backend.
+
+        Keyword Arguments:
+            player_side: the side of the player.
+        
+        Returns:
+            (CompactParser) a parser that keeps the player's units and contacts.
+        """
+        return CompactParser(sides=[player_side], schema=get_scenario_schema(self.projection))
+
+    def init_features(self, player_side:str) -> None:
+        """
+        Description:
+            Extract the observations of the player's side from the parsed scenario.
+
+        Keyword Arguments:
+            player_side: the side of the player. Dictates the units that they can actually control.
         
+        Returns:
+            None
+        """
         self.logger = logging.getLogger(__name__)
         
         # get features
@@ -114,7 +353,8 @@ class Features(object):
             raise ValueError('Cannot find player side.')
         self.side_ = self.get_side_properties(player_side_index)
         self.contacts = self.get_side_contacts(player_side_index)
-        
+        self.build_indexes()
+
     def transform_obs_into_arrays(self) -> Tuple[Game, list[Unit], Side, list[Contact]]:
         """
         Description:
@@ -129,6 +369,76 @@ class Features(object):
         observation = (self.meta, self.units, self.side_, self.contacts)
         return observation
 
+    def build_indexes(self) -> None:
+        """
+        Description:
+            Index the units and contacts by ID and by name for constant time lookups.
+
+        Keyword Arguments:
+            None
+        
+        Returns:
+            None
+        """
+        self.units_by_id = index_by_id(self.units)
+        self.units_by_name = index_by_name(self.units)
+        self.contacts_by_id = index_by_id(self.contacts)
+        self.contacts_by_name = index_by_name(self.contacts)
+
+    def get_unit_by_id(self, unit_id:str) -> Unit | None:
+        return self.units_by_id.get(unit_id)
+
+    def get_unit_by_name(self, name:str) -> Unit | None:
+        """
+        Description:
+            Return the first unit with a name.
+
+        Keyword Arguments:
+            name: the name of the unit.
+        
+        Returns:
+            (Unit | None) the first unit with the name in observation order, or None if there is none.
+        """
+        units = self.units_by_name.get(name)
+        return units[0] if units else None
+
+    def get_units_by_name(self, name:str) -> list[Unit]:
+        return list(self.units_by_name.get(name, []))
+
+    def get_contact_by_id(self, contact_id:str) -> Contact | None:
+        return self.contacts_by_id.get(contact_id)
+
+    def get_contact_by_name(self, name:str) -> Contact | None:
+        """
+        Description:
+            Return the first contact with a name.
+
+        Keyword Arguments:
+            name: the name of the contact.
+        
+        Returns:
+            (Contact | None) the first contact with the name in observation order, or None if there is none.
+        """
+        contacts = self.contacts_by_name.get(name)
+        return contacts[0] if contacts else None
+
+    def get_contacts_by_name(self, name:str) -> list[Contact]:
+        return list(self.contacts_by_name.get(name, []))
+
+    @cached_property
+    def unit_table(self) -> UnitTable:
+        """
+        Columnar view of the player's units, built on first access.
+        """
+        return get_unit_table(self.units)
+
+    @cached_property
+    def contact_table(self) -> ContactTable:
+        """
+        Columnar view of the player's contacts, built on first access.
+        """
+        return get_contact_table(self.contacts)
+
     # ============== XML Data Extraction Methods ================================
     def get_meta(self) -> Game:
         """
@@ -202,27 +512,49 @@ class Features(object):
             (list) a list of the units of the side.
         """
         unit_ids = []
-        if side_name == None or 'ActiveUnits' not in self.scen_dic["Scenario"].keys():
+        if side_name == None or not self.projection.Unit:
             return unit_ids
+        for unit_type, unit_idx, unit in self.get_active_units():
+            try:
+                if unit["Side"] == side_name:
+                    unit_ids.append(self.get_unit(unit=unit, unit_idx=unit_idx, unit_type=unit_type, side_name=side_name))
+            except KeyError:
+                self.logger.warn("Failed to parse one unit xml.")                 
+        return unit_ids
+
+    def get_active_units(self) -> Iterator[Tuple[str, int, dict]]:
+        """
+        Description:
+            Iterate over the active units of the scenario, grouped by unit type.
+
+        Keyword Arguments:
+            None
+        
+        Returns:
+            (Iterator) tuples of the unit type, the index of the unit within its type, and the unit in dictionary format.
+        """
+        if self.unit_records is not None:
+            for unit_type, active_units in self.unit_records.units.items():
+                for unit_idx, unit in active_units:
+                    yield unit_type, unit_idx, unit
+            return
+        if 'ActiveUnits' not in self.scen_dic["Scenario"].keys():
+            return
         for unit_type in self.scen_dic["Scenario"]["ActiveUnits"].keys():
             active_units = self.scen_dic["Scenario"]["ActiveUnits"][unit_type]
             if not isinstance(self.scen_dic["Scenario"]["ActiveUnits"][unit_type], list):
                 active_units = [self.scen_dic["Scenario"]["ActiveUnits"][unit_type]]
             for unit_idx, unit in enumerate(active_units):
-                try:
-                    if unit["Side"] == side_name:
-                        unit_ids.append(self.get_unit(unit=unit, unit_idx=unit_idx, unit_type=unit_type, side_name=side_name))
-                except KeyError:
-                    self.logger.warn("Failed to parse one unit xml.")                 
-        return unit_ids
+                yield unit_type, unit_idx, unit
     
     def get_unit(self, unit:dict, unit_idx:int, unit_type:str, side_name:str) -> Unit:
+        fields = self.projection.Unit
         try:
-            unit_id = unit['ID']
-            name = unit['Name']
-            dbid = int(unit['DBID'])
-            lon = float(unit['Lon'])
-            lat = float(unit['Lat'])
+            unit_id = unit['ID'] if 'ID' in fields else None
+            name = unit['Name'] if 'Name' in fields else None
+            dbid = int(unit['DBID']) if 'DBID' in fields else None
+            lon = float(unit['Lon']) if 'Lon' in fields else None
+            lat = float(unit['Lat']) if 'Lat' in fields else None
             ch = None
             cs = None
             ca = None
@@ -230,19 +562,21 @@ class Features(object):
             mount = None
             cf = None
             mf = None
-            if 'Loadout' in unit.keys() and unit['Loadout'] != None:
+            if 'Loadout' in fields and 'Loadout' in unit.keys() and unit['Loadout'] != None:
                 loadout = self.get_loadout(unit)
-            if 'Mounts' in unit.keys() and unit['Mounts'] != None:
+            if 'Mounts' in fields and 'Mounts' in unit.keys() and unit['Mounts'] != None:
                 mount = self.get_mount(unit)
-            if 'CH' in unit.keys() and unit['CH'] != None:
+            if 'CH' in fields and 'CH' in unit.keys() and unit['CH'] != None:
                 ch = float(unit['CH'])
-            if 'CS' in unit.keys() and unit['CS'] != None:
+            if 'CS' in fields and 'CS' in unit.keys() and unit['CS'] != None:
                 cs = float(unit['CS'])
-            if 'CA' in unit.keys() and unit['CA'] != None:
+            if 'CA' in fields and 'CA' in unit.keys() and unit['CA'] != None:
                 ca = float(unit['CA'])
             if 'Fuel' in unit.keys():
-                cf = float(unit['Fuel']['FuelRec']['CQ'])
-                mf = float(unit['Fuel']['FuelRec']['MQ'])
+                if 'CurrentFuel' in fields:
+                    cf = float(unit['Fuel']['FuelRec']['CQ'])
+                if 'MaxFuel' in fields:
+                    mf = float(unit['Fuel']['FuelRec']['MQ'])
             return Unit(unit_idx, unit_id, name, side_name, dbid, unit_type, ch, cs, ca, lon, lat, cf, mf, mount, loadout)
         except KeyError:
             raise KeyError("Error parsing xml for unit.")
@@ -258,15 +592,17 @@ class Features(object):
         Returns:
             (list) a list of the unit's mounts.
         """        
+        fields = self.projection.Mount
         parsed_mounts = []
         mounts = unit["Mounts"]["Mount"]
         if not isinstance(mounts, list):
             mounts = [unit["Mounts"]["Mount"]]
         for mount_idx, mount in enumerate(mounts):
-            mount_id = mount["ID"]
-            name = mount["Name"]
-            dbid = int(mount["DBID"])
-            parsed_mounts.append(Mount(mount_idx, mount_id, name, dbid, self.get_loadout_or_mount_weapons('Mount', mount)))
+            mount_id = mount["ID"] if "ID" in fields else None
+            name = mount["Name"] if "Name" in fields else None
+            dbid = int(mount["DBID"]) if "DBID" in fields else None
+            weapons = self.get_loadout_or_mount_weapons('Mount', mount) if "Weapons" in fields else None
+            parsed_mounts.append(Mount(mount_idx, mount_id, name, dbid, weapons))
         return parsed_mounts      
 
     def get_loadout(self, unit:dict) -> Loadout:
@@ -280,11 +616,13 @@ class Features(object):
         Returns:
             (Loadout) the unit's current loadout.
         """                
+        fields = self.projection.Loadout
         loadout = unit["Loadout"]["Loadout"]
-        loadout_id = int(loadout["ID"])
-        name = loadout["Name"]
-        dbid = int(loadout["DBID"])
-        return Loadout(0, loadout_id, name, dbid, self.get_loadout_or_mount_weapons('Loadout', loadout))
+        loadout_id = int(loadout["ID"]) if "ID" in fields else None
+        name = loadout["Name"] if "Name" in fields else None
+        dbid = int(loadout["DBID"]) if "DBID" in fields else None
+        weapons = self.get_loadout_or_mount_weapons('Loadout', loadout) if "Weapons" in fields else None
+        return Loadout(0, loadout_id, name, dbid, weapons)
     
     def get_loadout_or_mount_weapons(self, mount_or_loadout:str, xml_str:dict) -> list[Weapon]:
         """
@@ -314,6 +652,7 @@ class Features(object):
         return self.get_weapon_records(weapon_records=wrec)
     
     def get_weapon_records(self, weapon_records:dict) -> list[Weapon]:
+        fields = self.projection.Weapon
         weapons = []
 
         if not isinstance(weapon_records, list):
@@ -322,11 +661,13 @@ class Features(object):
         for weapon_record_idx, weapon_record in enumerate(weapon_records):
             cl = None
             ml = None
-            if "CL" in weapon_record.keys():
+            if "QuantRemaining" in fields and "CL" in weapon_record.keys():
                 cl = int(weapon_record["CL"])
-            if "ML" in weapon_record.keys():
+            if "MaxQuant" in fields and "ML" in weapon_record.keys():
                 ml = int(weapon_record["ML"])
-            weapon = Weapon(weapon_record_idx, weapon_record["ID"], int(weapon_record['WeapID']), cl, ml)     
+            weapon_id = weapon_record["ID"] if "ID" in fields else None
+            weap_id = int(weapon_record['WeapID']) if "WeaponID" in fields else None
+            weapon = Weapon(weapon_record_idx, weapon_id, weap_id, cl, ml)     
             weapons.append(weapon)   
 
         return weapons   
@@ -343,6 +684,8 @@ class Features(object):
             (list) a list of contacts.
         """
         contact_id = []
+        if not self.projection.Contact:
+            return contact_id
         if "Contacts" in self.scen_dic["Scenario"]["Sides"]["Side"][side_index].keys():
             contacts = self.scen_dic["Scenario"]["Sides"]["Side"][side_index]["Contacts"]["Contact"]
             if not isinstance(contacts, list):
@@ -356,23 +699,25 @@ class Features(object):
         return contact_id
     
     def get_contact(self, contact:dict, contact_idx:int) -> Contact:
+        fields = self.projection.Contact
         try:
             cs = None
             ca = None
             lon = None
             lat = None
             contact_name = None
-            if 'CS' in contact.keys() and contact['CS'] != None:
+            if 'CS' in fields and 'CS' in contact.keys() and contact['CS'] != None:
                 cs = float(contact['CS'])
-            if 'CA' in contact.keys() and contact['CA'] != None:
+            if 'CA' in fields and 'CA' in contact.keys() and contact['CA'] != None:
                 ca = float(contact['CA'])
-            if 'Lon' in contact.keys() and contact['Lon'] != None:
+            if 'Lon' in fields and 'Lon' in contact.keys() and contact['Lon'] != None:
                 lon = float(contact['Lon'])
-            if 'Lat' in contact.keys() and contact['Lat'] != None:
+            if 'Lat' in fields and 'Lat' in contact.keys() and contact['Lat'] != None:
                 lat = float(contact['Lat'])
-            if 'Name' in contact.keys() and contact['Name'] != None:
+            if 'Name' in fields and 'Name' in contact.keys() and contact['Name'] != None:
                 contact_name = contact['Name']
-            return Contact(contact_idx, contact["ID"], contact_name, cs, ca, lon, lat)
+            contact_id = contact["ID"] if "ID" in fields else None
+            return Contact(contact_idx, contact_id, contact_name, cs, ca, lon, lat)
         except KeyError:
             raise KeyError("Error parsing xml for contact.")
 
@@ -380,30 +725,287 @@ class FeaturesFromSteam(Features):
     """
     Renders feature layers from a Command: Modern Operations scenario XML into named tuples.
     """
-    def __init__(self, xml:str, player_side:str) -> None:
+    def parse_scenario(self, xml:str, player_side:str, parser:str="xmltodict") -> None:
         """
         Description:
-            Initialize a Features object to hold observations.
+            Parse the scenario xml into `scen_dic` (and `unit_records` for the "stream" parser).
 
         Keyword Arguments:
-            xml: the path to the xml file containing the game observations.
-            player_side: the side of the player. Dictates the units that they can actually control.
+            xml: the scenario xml containing the game observations.
+            player_side: the side of the player.
+            parser: the parser backend, either "xmltodict", "stream" or "compact". The "compact" parser decodes the observations written by ScenEdit_ExportScenarioToCompact, and XML observations with the "stream" parser.
         
         Returns:
             None
         """
-        try:         
-            self.scen_dic = xmltodict.parse(xml) # our scenario xml is now in 'dic'
-        except FileNotFoundError:
-            raise FileNotFoundError("Unable to parse scenario xml.")
+        self.unit_records = None
+        if parser == "stream" or (parser == "compact" and not is_compact_observation(xml)):
+            records = self.create_stream_parser(player_side).parse_string(xml)
+            self.scen_dic = records.scen_dic
+            self.unit_records = records
+        elif parser == "compact":
+            records = self.create_compact_parser(player_side).parse_string(xml)
+            self.scen_dic = records.scen_dic
+            self.unit_records = records
+        elif parser == "xmltodict":
+            try:         
+                self.scen_dic = xmltodict.parse(xml) # our scenario xml is now in 'dic'
+            except FileNotFoundError:
+                raise FileNotFoundError("Unable to parse scenario xml.")
+        else:
+            raise ValueError(f"Unknown parser '{parser}'.")
+
+class LazyList(MutableSequence):
+    """
+    A list whose items are only built the first time the list is read or modified.
+    It wraps the built list instead of subclassing list, because the C code of list reads the storage of a list
+    subclass directly (e.g. `[0] + lazy_list`), which would skip building the items.
+    """
+    __slots__ = ('_build', '_items')
+    __hash__ = None
+
+    def __init__(self, build:Callable[[], list]) -> None:
+        """
+        Description:
+            Initialize an empty list that will be filled by `build` on first use.
+
+        Keyword Arguments:
+            build: a function that returns the items of the list.
         
-        # get features
+        Returns:
+            None
+        """
+        self._build = build
+        self._items = None
+
+    @property
+    def materialized(self) -> bool:
+        return self._build is None
+
+    def materialize(self) -> list:
+        """
+        Description:
+            Build the items of the list if they have not been built yet.
+
+        Keyword Arguments:
+            None
+        
+        Returns:
+            (list) the items.
+        """
+        if self._build is not None:
+            self._items = list(self._build())
+            self._build = None
+        return self._items
+
+    def __len__(self) -> int:
+        return len(self.materialize())
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __reversed__(self):
+        return reversed(self.materialize())
+
+    def __contains__(self, item) -> bool:
+        return item in self.materialize()
+
+    def __getitem__(self, index):
+        return self.materialize()[index]
+
+    def __setitem__(self, index, value) -> None:
+        self.materialize()[index] = value
+
+    def __delitem__(self, index) -> None:
+        del self.materialize()[index]
+
+    def insert(self, index:int, value) -> None:
+        self.materialize().insert(index, value)
+
+    def append(self, value) -> None:
+        self.materialize().append(value)
+
+    def extend(self, values) -> None:
+        self.materialize().extend(values)
+
+    def clear(self) -> None:
+        self._build = None
+        self._items = []
+
+    def sort(self, *args, **kwargs) -> None:
+        self.materialize().sort(*args, **kwargs)
+
+    def copy(self) -> list:
+        return list(self.materialize())
+
+    def __repr__(self) -> str:
+        return repr(self.materialize())
+
+    def __reduce__(self):
+        return (list, (self.copy(),))
+
+    def __add__(self, other):
+        return self.copy() + list(other) if isinstance(other, (list, LazyList)) else NotImplemented
+
+    def __radd__(self, other):
+        return other + self.copy() if isinstance(other, list) else NotImplemented
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __mul__(self, times:int):
+        return self.copy() * times
+
+    __rmul__ = __mul__
+
+def _compare_as_list(method_name:str) -> Callable:
+    def method(self, other):
+        if isinstance(other, LazyList):
+            other = other.materialize()
+        elif not isinstance(other, list):
+            return NotImplemented
+        return getattr(self.materialize(), method_name)(other)
+    method.__name__ = method_name
+    return method
+
+for _method_name in ('__eq__', '__ne__', '__lt__', '__le__', '__gt__', '__ge__'):
+    setattr(LazyList, _method_name, _compare_as_list(_method_name))
+
+class LazyFeatures(Features):
+    """
+    Features that only extract an observation section (meta, units, side_, contacts) the first time it is accessed.
+    Mounts and weapon records of each unit are returned as LazyLists and are only decoded when they are read, so errors
+    in them surface when they are first read instead of when the unit is built.
+    """
+    def init_features(self, player_side:str) -> None:
+        """
+        Description:
+            Record the player's side. Observations are extracted on first access.
+
+        Keyword Arguments:
+            player_side: the side of the player. Dictates the units that they can actually control.
+        
+        Returns:
+            None
+        """
+        self.logger = logging.getLogger(__name__)
         self.player_side = player_side
-        self.meta = self.get_meta() # Return the scenario-level rmation of the scenario
-        self.units = self.get_side_units(player_side)
+
+    @cached_property
+    def meta(self) -> Game:
+        return self.get_meta()
+
+    @cached_property
+    def units(self) -> list[Unit]:
+        return self.get_side_units(self.player_side)
+
+    @cached_property
+    def player_side_index(self) -> int:
         try:
-            player_side_index = self.get_sides().index(player_side)
+            return self.get_sides().index(self.player_side)
         except ValueError:
             raise ValueError('Cannot find player side.')
-        self.side_ = self.get_side_properties(player_side_index)
-        self.contacts = self.get_side_contacts(player_side_index)
+
+    @cached_property
+    def side_(self) -> Side:
+        return self.get_side_properties(self.player_side_index)
+
+    @cached_property
+    def contacts(self) -> list[Contact]:
+        return self.get_side_contacts(self.player_side_index)
+
+    @cached_property
+    def units_by_id(self) -> dict[str, Unit]:
+        return index_by_id(self.units)
+
+    @cached_property
+    def units_by_name(self) -> dict[str, list[Unit]]:
+        return index_by_name(self.units)
+
+    @cached_property
+    def contacts_by_id(self) -> dict[str, Contact]:
+        return index_by_id(self.contacts)
+
+    @cached_property
+    def contacts_by_name(self) -> dict[str, list[Contact]]:
+        return index_by_name(self.contacts)
+
+    def get_mount(self, unit:dict) -> list[Mount]:
+        return LazyList(partial(super().get_mount, unit))
+
+    def get_loadout_or_mount_weapons(self, mount_or_loadout:str, xml_str:dict) -> list[Weapon]:
+        return LazyList(partial(super().get_loadout_or_mount_weapons, mount_or_loadout, xml_str))
+
+class LazyFeaturesFromSteam(LazyFeatures, FeaturesFromSteam):
+    """
+    LazyFeatures for a Command: Modern Operations scenario XML.
+    """
+
+class MultiSideFeatures(object):
+    """
+    Parses a scenario once and holds a Features view for each side. The views share the parsed scenario. This is a
+    container, not a Features itself: the observations of a side are read from its view, `multi_side_features[side]`.
+    """
+    view_class = Features
+    lazy_view_class = LazyFeatures
+
+    def __init__(self, xml:str, sides:list[str] | None = None, parser:str="xmltodict", lazy_features:bool=False, projection:dict[str, list[str]] | Projection | None = None) -> None:
+        """
+        Description:
+            Initialize a MultiSideFeatures object to hold the observations of several sides.
+
+        Keyword Arguments:
+            xml: the path to the xml file containing the game observations.
+            sides: the sides to hold observations for. Holds every side in the scenario if None.
+            parser: the parser backend, either "xmltodict" or "stream", or "compact" for a scenario XML from Command: Modern Operations.
+            lazy_features: whether the views are LazyFeatures, which only extract the parts of the observation that are read.
+            projection: the fields to decode for each entity type, shared by the views. Decodes everything if None.
+        
+        Returns:
+            None
+        """
+        self.lazy_features = lazy_features
+        self.projection = get_projection(projection)
+        self.parse_scenario(xml, sides, parser)
+        self.init_features(sides)
+
+    def parse_scenario(self, xml:str, sides:list[str] | None, parser:str="xmltodict") -> None:
+        # the parser backends of the view class, with parsers that keep the units and contacts of every side held
+        self.view_class.parse_scenario(self, xml, sides, parser)
+
+    def create_stream_parser(self, sides:list[str] | None) -> ScenarioStreamParser:
+        return ScenarioStreamParser(sides=sides, schema=get_scenario_schema(self.projection))
+
+    def create_compact_parser(self, sides:list[str] | None) -> CompactParser:
+        return CompactParser(sides=sides, schema=get_scenario_schema(self.projection))
+
+    def get_sides(self) -> list[str]:
+        return self.view_class.get_sides(self)
+
+    def init_features(self, sides:list[str] | None) -> None:
+        """
+        Description:
+            Create the view of each side.
+
+        Keyword Arguments:
+            sides: the sides to hold observations for. Holds every side in the scenario if None.
+        
+        Returns:
+            None
+        """
+        self.logger = logging.getLogger(__name__)
+        self.meta = self.view_class.get_meta(self)
+        self.sides = list(sides) if sides is not None else self.get_sides()
+        view_class = self.lazy_view_class if self.lazy_features else self.view_class
+        self.views = {side: view_class.from_parsed(self.scen_dic, self.unit_records, side, self.projection) for side in self.sides}
+
+    def __getitem__(self, side:str) -> Features:
+        return self.views[side]
+
+class MultiSideFeaturesFromSteam(MultiSideFeatures):
+    """
+    MultiSideFeatures for a Command: Modern Operations scenario XML.
+    """
+    view_class = FeaturesFromSteam
+    lazy_view_class = LazyFeaturesFromSteam
@@ -0,0 +1,221 @@
+# Purpose: Wait for the files that the game writes (the observation and the scenario ended file) to be completely
+# written, with inotify where it is available and by polling their stat with backoff otherwise, so that an environment
+# sleeps instead of spinning while the game runs.
+
+# imports
+from abc import ABC, abstractmethod
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+from time import monotonic, sleep
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008 # a file opened for writing was closed
+IN_MOVED_TO = 0x00000080 # a file was renamed into the directory, e.g. by an atomic replace
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII") # wd, mask, cookie, len, followed by len bytes of name
+
+def load_libc() -> ctypes.CDLL | None:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") else None
+
+libc = load_libc()
+
+def inotify_available() -> bool:
+    return libc is not None
+
+class FileWatcher(ABC):
+    """
+    Waits for changes to a set of files. A file is reported once it has been completely written, so that it can be read
+    without retrying. While nothing changes, `wait` waits for longer and longer, up to `max_interval`, and it goes back
+    to `min_interval` as soon as a file changes.
+    """
+    def __init__(self, paths:list[str], min_interval:float=0.005, max_interval:float=0.25, backoff:float=2.0) -> None:
+        """
+        Description:
+            Initializes the watcher.
+
+        Keyword Arguments:
+            paths: the files to watch. They do not need to exist yet.
+            min_interval: the shortest time in seconds that `wait` waits for.
+            max_interval: the longest time in seconds that `wait` waits for.
+            backoff: the factor by which the wait grows while nothing changes.
+
+        Returns:
+            None
+        """
+        self.paths = {os.path.abspath(path) for path in paths}
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+
+    def wait(self, timeout:float | None=None) -> set[str]:
+        """
+        Description:
+            Wait until a watched file has been completely written, or until the timeout passes.
+
+        Keyword Arguments:
+            timeout: the longest time in seconds to wait for. Defaults to the current backoff interval.
+
+        Returns:
+            (set[str]) the absolute paths of the files that were written, empty if none were.
+        """
+        changed = self.wait_for_changes(self.interval if timeout is None else timeout)
+        self.interval = self.min_interval if changed else min(self.interval * self.backoff, self.max_interval)
+        return changed
+
+    @abstractmethod
+    def wait_for_changes(self, timeout:float) -> set[str]:
+        """
+        Description:
+            Wait until a watched file has been completely written, or until the timeout passes.
+
+        Keyword Arguments:
+            timeout: the longest time in seconds to wait for.
+
+        Returns:
+            (set[str]) the absolute paths of the files that were written, empty if none were.
+        """
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "FileWatcher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class PollingFileWatcher(FileWatcher):
+    """
+    Watches files by comparing their stat (inode, modification time and size) between polls. A changed file is only
+    reported once its stat is the same in two polls in a row, i.e. once the game has stopped writing it.
+    """
+    def __init__(self, paths:list[str], min_interval:float=0.005, max_interval:float=0.25, backoff:float=2.0) -> None:
+        super().__init__(paths, min_interval=min_interval, max_interval=max_interval, backoff=backoff)
+        self.reported = {path: self.signature(path) for path in self.paths} # the stat of each file when it was last reported
+        self.pending = {} # the stat of each changed file that is still being written
+
+    @staticmethod
+    def signature(path:str) -> tuple[int, int, int] | None:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def poll(self) -> set[str]:
+        changed = set()
+        for path in self.paths:
+            signature = self.signature(path)
+            if signature == self.reported[path]:
+                self.pending.pop(path, None)
+            elif path in self.pending and self.pending[path] == signature: # unchanged since the last poll, so it is complete
+                del self.pending[path]
+                self.reported[path] = signature
+                if signature is not None:
+                    changed.add(path)
+            else:
+                self.pending[path] = signature
+        return changed
+
+    def wait_for_changes(self, timeout:float) -> set[str]:
+        changed = self.poll()
+        if changed:
+            return changed
+        sleep(min(timeout, self.min_interval) if self.pending else timeout) # check a file that is being written again soon
+        return self.poll()
+
+class InotifyFileWatcher(FileWatcher):
+    """
+    Watches files with inotify, on Linux. A file is reported when it is closed after being written or when it is
+    renamed into place, so it is never reported while it is being written. The directories of the files are watched, so
+    the files do not need to exist yet and can be replaced.
+    """
+    def __init__(self, paths:list[str], min_interval:float=0.005, max_interval:float=0.25, backoff:float=2.0) -> None:
+        if libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform.")
+        super().__init__(paths, min_interval=min_interval, max_interval=max_interval, backoff=backoff)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.directories = {} # watch descriptor -> directory
+        for directory in {os.path.dirname(path) for path in self.paths}:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                error = ctypes.get_errno()
+                self.close()
+                raise OSError(error, os.strerror(error), directory)
+            self.directories[wd] = directory
+        self.poller = select.poll() # unlike select.select, works with descriptors past FD_SETSIZE, which many environments reach
+        self.poller.register(self.fd, select.POLLIN)
+
+    def read_events(self) -> set[str]:
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset + name_length].rstrip(b"\0")
+                offset += name_length
+                path = os.path.join(self.directories.get(wd, ""), os.fsdecode(name))
+                if path in self.paths:
+                    changed.add(path)
+
+    def wait_for_changes(self, timeout:float) -> set[str]:
+        deadline = monotonic() + timeout
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0 or not self.poller.poll(remaining * 1000):
+                return set()
+            changed = self.read_events()
+            if changed: # else only other files in the directories changed
+                return changed
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+FILE_WATCHERS = {"inotify": InotifyFileWatcher, "polling": PollingFileWatcher}
+
+def create_file_watcher(paths:list[str], kind:str="auto", **kwargs) -> FileWatcher:
+    """
+    Description:
+        Create a watcher for the files.
+
+    Keyword Arguments:
+        paths: the files to watch.
+        kind: "inotify", "polling", or "auto" for inotify where it is available and works, and polling otherwise.
+        kwargs: the intervals of the watcher (see FileWatcher).
+
+    Returns:
+        (FileWatcher) the watcher.
+    """
+    if kind == "auto":
+        if inotify_available():
+            try:
+                return InotifyFileWatcher(paths, **kwargs)
+            except OSError: # e.g. past the limit of inotify instances per user, which many environments can reach
+                pass
+        kind = "polling"
+    if kind not in FILE_WATCHERS:
+        raise ValueError(f"Unknown file watcher '{kind}', expected 'auto', 'inotify' or 'polling'.")
+    return FILE_WATCHERS[kind](paths, **kwargs)
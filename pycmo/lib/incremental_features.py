@@ -0,0 +1,178 @@
+# Purpose: Decode consecutive observations incrementally by reusing the units that did not change since the previous step.
+
+# imports
+from functools import lru_cache
+from typing import NamedTuple
+
+from pycmo.lib.features import Features, FeaturesFromSteam, Unit, Mount, Loadout, Projection
+from pycmo.lib.stream_parser import ScenarioStreamParser, get_scenario_schema
+
+class DecodeStats(NamedTuple):
+    hits: int # units reused as is
+    partial_hits: int # units rebuilt while reusing their mounts or loadout
+    misses: int # units built from scratch
+
+class CachedUnit(NamedTuple):
+    fragment: bytes
+    mounts_fragment: bytes | None
+    loadout_fragment: bytes | None
+    unit: Unit
+
+def get_fragment(record:dict | str | None) -> bytes | None:
+    if isinstance(record, dict):
+        return record.get("#fragment")
+    return None
+
+@lru_cache(maxsize=None)
+def get_incremental_schema(projection:Projection) -> dict:
+    """
+    Description:
+        Build the scenario schema of a projection, always keeping unit IDs to key the units in the UnitCache.
+
+    Keyword Arguments:
+        projection: the Projection listing the fields to decode for each entity type.
+
+    Returns:
+        (dict) the scenario schema.
+    """
+    schema = dict(get_scenario_schema(projection))
+    if "ActiveUnits" in schema:
+        schema["ActiveUnits"] = {"*": dict(schema["ActiveUnits"]["*"], ID=None)}
+    return schema
+
+class UnitCache(object):
+    """
+    Holds the units decoded at the previous step, keyed by unit ID, together with the raw XML they were decoded from.
+    Units that are not seen at a step are dropped from the cache.
+    """
+    def __init__(self) -> None:
+        self.previous = {}
+        self.current = {}
+        self.stats = DecodeStats(0, 0, 0) # stats of the last step
+        self.total_stats = DecodeStats(0, 0, 0)
+        self.steps = 0
+
+    def start_step(self) -> None:
+        self.current = {}
+        self._hits = 0
+        self._partial_hits = 0
+        self._misses = 0
+
+    def add(self, unit_id:str, cached_unit:CachedUnit, reused_parts:int | None = None) -> None:
+        """
+        Description:
+            Record a unit decoded at the current step.
+
+        Keyword Arguments:
+            unit_id: the ID of the unit.
+            cached_unit: the unit and the raw XML it was decoded from.
+            reused_parts: None if the whole unit was reused, otherwise the number of parts (mounts, loadout) that were reused.
+
+        Returns:
+            None
+        """
+        self.current[unit_id] = cached_unit
+        if reused_parts is None:
+            self._hits += 1
+        elif reused_parts > 0:
+            self._partial_hits += 1
+        else:
+            self._misses += 1
+
+    def end_step(self) -> DecodeStats:
+        """
+        Description:
+            Replace the units of the previous step with the units of the current step.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (DecodeStats) the hit and miss counts of the step.
+        """
+        self.previous = self.current
+        self.current = {}
+        self.stats = DecodeStats(self._hits, self._partial_hits, self._misses)
+        self.total_stats = DecodeStats(*[total + step for total, step in zip(self.total_stats, self.stats)])
+        self.steps += 1
+        return self.stats
+
+    def clear(self) -> None:
+        self.previous = {}
+        self.current = {}
+
+class IncrementalFeatures(Features):
+    """
+    Features that reuse the units of the previous observation whose XML did not change.
+    Units with the same raw XML as at the previous step are returned as is. For the others, the mounts and loadout are
+    reused when their own XML did not change. Reused mounts and weapon lists are shared with the previous observation.
+    Always uses the "stream" parser backend.
+    """
+    def __init__(self, xml:str, player_side:str, unit_cache:UnitCache, projection:dict[str, list[str]] | Projection | None = None) -> None:
+        """
+        Description:
+            Initialize a Features object to hold observations.
+
+        Keyword Arguments:
+            xml: the path to the xml file containing the game observations.
+            player_side: the side of the player. Dictates the units that they can actually control.
+            unit_cache: the cache holding the units of the previous step. It is updated with the units of this step.
+            projection: the fields to decode for each entity type. Decodes everything if None. The units in the cache must have been decoded with the same projection.
+        
+        Returns:
+            None
+        """
+        self.unit_cache = unit_cache
+        self.decode_stats = DecodeStats(0, 0, 0)
+        self._previous_unit = None
+        self._reused_parts = 0
+        super().__init__(xml, player_side, parser="stream", projection=projection)
+
+    def create_stream_parser(self, player_side:str) -> ScenarioStreamParser:
+        return ScenarioStreamParser(sides=[player_side], fragments=True, schema=get_incremental_schema(self.projection))
+
+    def get_side_units(self, side_name=None) -> list[Unit]:
+        self.unit_cache.start_step()
+        units = super().get_side_units(side_name)
+        self.decode_stats = self.unit_cache.end_step()
+        return units
+
+    def get_unit(self, unit:dict, unit_idx:int, unit_type:str, side_name:str) -> Unit:
+        unit_id = unit.get("ID") # decoded even if the projection leaves it out, see get_incremental_schema
+        fragment = unit.get("#fragment")
+        previous = self.unit_cache.previous.get(unit_id)
+        if previous is not None and previous.fragment == fragment:
+            decoded_unit = previous.unit
+            if decoded_unit.XML_ID != unit_idx:
+                decoded_unit = decoded_unit._replace(XML_ID=unit_idx)
+            self.unit_cache.add(unit_id, previous._replace(unit=decoded_unit))
+            return decoded_unit
+
+        self._previous_unit = previous
+        self._reused_parts = 0
+        try:
+            decoded_unit = super().get_unit(unit=unit, unit_idx=unit_idx, unit_type=unit_type, side_name=side_name)
+        finally:
+            self._previous_unit = None
+        cached_unit = CachedUnit(fragment, get_fragment(unit.get("Mounts")), get_fragment(unit.get("Loadout")), decoded_unit)
+        self.unit_cache.add(unit_id, cached_unit, reused_parts=self._reused_parts)
+        return decoded_unit
+
+    def get_mount(self, unit:dict) -> list[Mount]:
+        previous = self._previous_unit
+        if previous is not None and previous.mounts_fragment is not None and previous.mounts_fragment == get_fragment(unit["Mounts"]):
+            self._reused_parts += 1
+            return previous.unit.Mounts
+        return super().get_mount(unit)
+
+    def get_loadout(self, unit:dict) -> Loadout:
+        previous = self._previous_unit
+        if previous is not None and previous.loadout_fragment is not None and previous.loadout_fragment == get_fragment(unit["Loadout"]):
+            self._reused_parts += 1
+            return previous.unit.Loadout
+        return super().get_loadout(unit)
+
+class IncrementalFeaturesFromSteam(IncrementalFeatures, FeaturesFromSteam):
+    """
+    IncrementalFeatures for a Command: Modern Operations scenario XML.
+    """
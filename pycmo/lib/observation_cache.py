@@ -0,0 +1,95 @@
+# Purpose: Bounded cache of values parsed from files, keyed by file identity, so that unchanged observation files are not parsed twice.
+
+# imports
+import os
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, NamedTuple
+
+class CacheStats(NamedTuple):
+    hits: int # values returned without parsing, including files rewritten with the same contents
+    misses: int # values parsed from the file
+    evictions: int # values dropped to stay within the size limit
+    size: int # values currently cached
+
+class ObservationCache(object):
+    """
+    Caches the value parsed from a file under (path, mtime_ns, size, content hash).
+    A file whose path, modification time and size are unchanged costs a single stat(). Otherwise, the file is read and
+    hashed, and a value cached for the same contents is reused without parsing. The least recently used values are
+    evicted past `max_size`.
+    """
+    def __init__(self, max_size:int=8) -> None:
+        """
+        Description:
+            Initialize an empty cache.
+
+        Keyword Arguments:
+            max_size: the maximum number of values to keep.
+
+        Returns:
+            None
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        self.max_size = max_size
+        self.entries = OrderedDict() # (path, mtime_ns, size, content hash) -> value
+        self.content_hashes = {} # (path, mtime_ns, size) -> content hash
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, self.evictions, len(self.entries))
+
+    def get(self, path:str, load:Callable[[bytes], Any]) -> Any:
+        """
+        Description:
+            Return the value parsed from a file, parsing it only if no value is cached for its current contents.
+
+        Keyword Arguments:
+            path: the path to the file.
+            load: parses the contents of the file into the value to cache. Values are not cached if it raises.
+
+        Returns:
+            (Any) the value parsed from the file.
+        """
+        stat = os.stat(path)
+        file_key = (path, stat.st_mtime_ns, stat.st_size)
+        content_hash = self.content_hashes.get(file_key)
+        if content_hash is not None:
+            key = file_key + (content_hash,)
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+        with open(path, 'rb') as f:
+            contents = f.read()
+        content_hash = hashlib.blake2b(contents, digest_size=16).digest()
+        key = file_key + (content_hash,)
+        for cached_key in self.entries:
+            if cached_key[0] == path and cached_key[2:] == key[2:]:
+                # the file was rewritten with the same contents
+                value = self.entries.pop(cached_key)
+                del self.content_hashes[cached_key[:3]]
+                self.hits += 1
+                self._add(key, value)
+                return value
+
+        value = load(contents)
+        self.misses += 1
+        self._add(key, value)
+        return value
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.content_hashes.clear()
+
+    def _add(self, key:tuple, value:Any) -> None:
+        self.entries[key] = value
+        self.content_hashes[key[:3]] = key[3]
+        while len(self.entries) > self.max_size:
+            evicted_key, _ = self.entries.popitem(last=False)
+            del self.content_hashes[evicted_key[:3]]
+            self.evictions += 1
@@ -4,6 +4,8 @@
 # Purpose: Protocol library to communicate with a Command server.
 
 # imports
+import asyncio
+import collections
 import socket
 import subprocess
 import os
@@ -75,13 +77,144 @@ class Server():
         # TODO
         pass
 
+# The Lua script that runs a batch of commands, each in a function of its own, and returns the response of each command
+# framed with its length, so that the responses can be read in order with "length" framing. A command that fails
+# responds with its error message.
+BATCH_HEADER = """--script
+local responses = {}
+local function frame(ok, result)
+    local response = (ok and result == nil) and '' or tostring(result)
+    responses[#responses + 1] = #response .. '\\n' .. response
+end
+"""
+BATCH_COMMAND = "frame(pcall(function()\n{}\nend))\n"
+BATCH_FOOTER = "return table.concat(responses)"
+
+def format_batch(commands:list[str]) -> str:
+    """
+    Description:
+        Combine Lua commands into one script that runs them in order and returns their framed responses.
+
+    Keyword Arguments:
+        commands: the Lua commands, each of them a script that may return a value.
+
+    Returns:
+        (str) the script.
+    """
+    return BATCH_HEADER + "".join(BATCH_COMMAND.format(command) for command in commands) + BATCH_FOOTER
+
+class FramingError(ValueError):
+    """
+    Raised when a framed response from the CMO server is malformed.
+    """
+
+class ResponseReader():
+    """
+    Reads complete responses from a socket into a preallocated buffer that grows as needed. With "length" framing, each
+    response starts with its length in bytes as ASCII digits followed by a newline, as written by FrameResponse in
+    pycmo_lib.lua. With "sentinel" framing, each response ends with the delimiter. The bytes received after a response
+    are kept for the next one.
+    """
+    max_header_length = 20
+
+    def __init__(self, s:socket.socket, framing:str="length", delimiter:bytes=b"\0", buffer_size:int=65536) -> None:
+        """
+        Description:
+            Initializes the reader.
+
+        Keyword Arguments:
+            s: the socket connected to the game.
+            framing: how responses are delimited, either "length" or "sentinel".
+            delimiter: the bytes that end each response with "sentinel" framing.
+            buffer_size: the initial size of the buffer in bytes. It doubles whenever a response does not fit.
+
+        Returns:
+            None
+        """
+        if framing not in ("length", "sentinel"):
+            raise ValueError(f"Unknown framing {framing!r}, expected 'length' or 'sentinel'.")
+        if framing == "sentinel" and not delimiter:
+            raise ValueError("Sentinel framing needs a delimiter.")
+        self.s = s
+        self.framing = framing
+        self.delimiter = delimiter
+        self.buffer = bytearray(max(buffer_size, 1))
+        self.start = 0 # the start of the bytes that have not been read yet
+        self.end = 0 # the end of the bytes received
+
+    def reserve(self, size:int) -> None:
+        # makes room for `size` bytes from self.start, moving the unread bytes to the front and growing the buffer if needed
+        if self.start + size <= len(self.buffer):
+            return
+        unread = self.end - self.start
+        if self.start > 0:
+            self.buffer[:unread] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, unread
+        if size > len(self.buffer):
+            capacity = len(self.buffer)
+            while capacity < size:
+                capacity *= 2
+            self.buffer.extend(bytes(capacity - len(self.buffer)))
+
+    def receive(self) -> None:
+        # receives at least one more byte into the buffer
+        if self.end == len(self.buffer):
+            self.reserve(self.end - self.start + 1)
+        with memoryview(self.buffer) as view:
+            received = self.s.recv_into(view[self.end:])
+        if received == 0:
+            raise ConnectionError("The CMO server closed the connection before the response was complete.")
+        self.end += received
+
+    def find(self, pattern:bytes) -> int:
+        # receives until `pattern` is found in the unread bytes and returns its offset
+        position = self.start
+        while True:
+            found = self.buffer.find(pattern, position, self.end)
+            if found != -1:
+                return found
+            searched = max(0, self.end - len(pattern) + 1 - self.start) # the unread bytes that cannot start the pattern
+            self.receive()
+            position = self.start + searched
+
+    def read_response(self) -> bytes:
+        """
+        Description:
+            Read the next complete response.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (bytes) the response, without its framing.
+        """
+        if self.framing == "sentinel":
+            end = self.find(self.delimiter)
+            response = bytes(self.buffer[self.start:end])
+            self.start = end + len(self.delimiter)
+        else:
+            header_end = self.find(b"\n")
+            header = bytes(self.buffer[self.start:header_end])
+            if not header.isdigit() or len(header) > self.max_header_length:
+                raise FramingError(f"Invalid response length {header[:self.max_header_length]!r}.")
+            length = int(header)
+            self.start = header_end + 1
+            self.reserve(length)
+            while self.end - self.start < length:
+                self.receive()
+            response = bytes(self.buffer[self.start:self.start + length])
+            self.start += length
+        if self.start == self.end: # nothing left to read, so the next response starts at the front of the buffer
+            self.start = self.end = 0
+        return response
+
 class Client():
     """
     The Client connects to the Server (either the Server class or a GUI-instance of the game running) and sends actions to the game.
     Connection is via a TCP/IP port.
     See the Command Premium Edition manual for configuration. This functionality is only available in the Premium version of the game.
     """
-    def __init__(self, host:str="localhost", port:int=7777) -> None:
+    def __init__(self, host:str="localhost", port:int=7777, framing:str | None=None, delimiter:bytes=b"\0", buffer_size:int=65536) -> None:
         """
         Description:
             Initializes the client.
@@ -89,12 +222,19 @@ class Client():
         Keyword Arguments:
             host: the IP host of the socket. Default is "localhost".
             port: the port on which the game is receiving instructions. Default is 7777.
+            framing: how the responses of the game are delimited, either "length" or "sentinel" (see ResponseReader). If None, each response is read with a single recv of at most 1024 bytes.
+            delimiter: the bytes that end each response with "sentinel" framing.
+            buffer_size: the initial size of the buffer that framed responses are read into.
 
         Returns:
             None
         """
         self.host = host
         self.port = port
+        self.framing = framing
+        self.delimiter = delimiter
+        self.buffer_size = buffer_size
+        self.reader = None
         
     def connect(self) -> bool:
         """
@@ -111,6 +251,8 @@ class Client():
         try:
             self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # open a socket to the game
             self.s.connect((self.host, self.port))
+            if self.framing is not None:
+                self.reader = ResponseReader(self.s, framing=self.framing, delimiter=self.delimiter, buffer_size=self.buffer_size)
             return True
         except OSError:
             raise ConnectionError("No active instance of Command to connect to. Aborting.")
@@ -127,16 +269,45 @@ class Client():
                 For this code, we chose UTF-8 encoding.
 
         Returns:
-            (str) return code of the send operation
+            (str) return code of the send operation, or the whole response of the game with framing
         """
         try:
             self.s.sendall(data.encode(encoding=encoding))
-            data = self.s.recv(1024)
+            if self.reader is not None:
+                data = self.reader.read_response()
+            else:
+                data = self.s.recv(1024)
             received = str(data, encoding)
             return received
         except OSError:
             raise ConnectionError("Failed to send data to CMO server.")
 
+    def send_batch(self, commands:list[str], encoding:str="UTF-8", decode:bool=True) -> list[str] | list[bytes]:
+        """
+        Description:
+            Send several commands to the game in a single write and collect their responses, in order, in a single
+            round trip instead of one per command. The commands are run by one script (see `format_batch`), so a syntax
+            error in one of them fails the whole batch. Only available with "length" framing.
+
+        Keyword Arguments:
+            commands: the Lua commands to send to the game.
+            encoding: the encoding of the commands and of the responses.
+            decode: whether to decode the responses. If False, they are returned as received, e.g. to parse an observation without decoding it first.
+
+        Returns:
+            (list[str] | list[bytes]) the response of each command, which is the value that it returns as a string, an empty string if it does not return anything, or its error message if it fails.
+        """
+        if self.framing != "length":
+            raise ValueError("Batches of commands need the client to use framing=\"length\".")
+        if len(commands) == 0:
+            return []
+        try:
+            self.s.sendall(format_batch(commands).encode(encoding=encoding))
+            responses = [self.reader.read_response() for _ in commands]
+            return [str(response, encoding) for response in responses] if decode else responses
+        except OSError:
+            raise ConnectionError("Failed to send data to CMO server.")
+
     def restart(self) -> bool:
         """
         Description:
@@ -168,6 +339,202 @@ class Client():
         except:
             raise ConnectionError("Failed to close client connection.")
         
+class AsyncClient():
+    """
+    An asyncio version of the Client, so that one event loop can drive many instances of the game at once. With framing,
+    several commands can be in flight on the same connection: a task that runs for as long as the connection is open
+    reads their responses in the order in which they were sent.
+    """
+    def __init__(self, host:str="localhost", port:int=7777, framing:str | None=None, delimiter:bytes=b"\0", buffer_size:int=65536) -> None:
+        """
+        Description:
+            Initializes the client.
+
+        Keyword Arguments:
+            host: the IP host of the socket. Default is "localhost".
+            port: the port on which the game is receiving instructions. Default is 7777.
+            framing: how the responses of the game are delimited, either "length" or "sentinel" (see ResponseReader). If None, each response is read with a single read of at most 1024 bytes, one command at a time.
+            delimiter: the bytes that end each response with "sentinel" framing.
+            buffer_size: the size of the buffer of the stream that responses are read from.
+
+        Returns:
+            None
+        """
+        if framing not in (None, "length", "sentinel"):
+            raise ValueError(f"Unknown framing {framing!r}, expected 'length' or 'sentinel'.")
+        if framing == "sentinel" and not delimiter:
+            raise ValueError("Sentinel framing needs a delimiter.")
+        self.host = host
+        self.port = port
+        self.framing = framing
+        self.delimiter = delimiter
+        self.buffer_size = buffer_size
+        self.reader = None
+        self.writer = None
+        self.pending = collections.deque() # the (future, number of responses) of each command in flight, in order
+        self.command_sent = None # set when a command is added to self.pending
+        self.read_task = None
+        self.lock = None # serializes the commands of unframed connections
+
+    async def connect(self) -> bool:
+        """
+        Description:
+            Connect to the game.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (bool) connection successful or not
+        """
+        try:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=self.buffer_size)
+        except OSError:
+            raise ConnectionError("No active instance of Command to connect to. Aborting.")
+        self.pending = collections.deque()
+        self.command_sent = asyncio.Event()
+        self.lock = asyncio.Lock()
+        if self.framing is not None:
+            self.read_task = asyncio.get_running_loop().create_task(self.read_responses())
+        return True
+
+    async def read_response(self) -> bytes:
+        # reads the next framed response
+        if self.framing == "sentinel":
+            chunks = []
+            while True:
+                try:
+                    chunks.append((await self.reader.readuntil(self.delimiter))[:-len(self.delimiter)])
+                    return b"".join(chunks)
+                except asyncio.LimitOverrunError as error: # longer than the buffer, so it is read in parts
+                    chunks.append(await self.reader.readexactly(error.consumed))
+        try:
+            header = (await self.reader.readuntil(b"\n"))[:-1]
+        except asyncio.LimitOverrunError:
+            header = b""
+        if not header.isdigit() or len(header) > ResponseReader.max_header_length:
+            raise FramingError(f"Invalid response length {header[:ResponseReader.max_header_length]!r}.")
+        return await self.reader.readexactly(int(header))
+
+    async def read_responses(self) -> None:
+        # resolves the commands in flight with their responses, in order, until the connection fails
+        try:
+            while True:
+                while not self.pending:
+                    self.command_sent.clear()
+                    await self.command_sent.wait()
+                future, count = self.pending[0]
+                responses = [await self.read_response() for _ in range(count)]
+                self.pending.popleft()
+                if not future.done():
+                    future.set_result(responses)
+        except (OSError, asyncio.IncompleteReadError, FramingError) as error:
+            if not isinstance(error, FramingError):
+                error = ConnectionError("The CMO server closed the connection before the response was complete.")
+            self.fail_pending(error)
+
+    def fail_pending(self, error:Exception) -> None:
+        while self.pending:
+            future, _ = self.pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def submit(self, data:bytes, count:int) -> list[bytes]:
+        # sends data to the game and waits for the `count` responses to it
+        if self.read_task is None or self.read_task.done():
+            raise ConnectionError("Failed to send data to CMO server.")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.writer.write(data)
+            self.pending.append((future, count)) # in the same order as the writes, since nothing is awaited in between
+            self.command_sent.set()
+            await self.writer.drain()
+        except OSError:
+            raise ConnectionError("Failed to send data to CMO server.")
+        return await future
+
+    async def send(self, data:str, encoding:str="UTF-8") -> str:
+        """
+        Description:
+            Send a command or an entire script to the game via data packets to the socket.
+
+        Keyword Arguments:
+            data: a string of commands to send to the game's Lua API. Refer to the documentation for formatting.
+            encoding: different encoding types when connecting to Lua TCP socket.
+
+        Returns:
+            (str) return code of the send operation, or the whole response of the game with framing
+        """
+        if self.framing is not None:
+            responses = await self.submit(data.encode(encoding=encoding), 1)
+            return str(responses[0], encoding)
+        async with self.lock:
+            try:
+                self.writer.write(data.encode(encoding=encoding))
+                await self.writer.drain()
+                return str(await self.reader.read(1024), encoding)
+            except OSError:
+                raise ConnectionError("Failed to send data to CMO server.")
+
+    async def send_batch(self, commands:list[str], encoding:str="UTF-8", decode:bool=True) -> list[str] | list[bytes]:
+        """
+        Description:
+            Send several commands to the game in a single write and collect their responses, in order (see
+            `Client.send_batch`). Only available with "length" framing.
+
+        Keyword Arguments:
+            commands: the Lua commands to send to the game.
+            encoding: the encoding of the commands and of the responses.
+            decode: whether to decode the responses. If False, they are returned as received.
+
+        Returns:
+            (list[str] | list[bytes]) the response of each command.
+        """
+        if self.framing != "length":
+            raise ValueError("Batches of commands need the client to use framing=\"length\".")
+        if len(commands) == 0:
+            return []
+        responses = await self.submit(format_batch(commands).encode(encoding=encoding), len(commands))
+        return [str(response, encoding) for response in responses] if decode else responses
+
+    async def restart(self) -> bool:
+        """
+        Description:
+            Restart the client's connection the game.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (bool) connection successful or not
+        """
+        await self.end_connection()
+        return await self.connect()
+
+    async def end_connection(self) -> bool:
+        """
+        Description:
+            End the client's connection the game. The commands still in flight fail with a ConnectionError.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (bool) connection end successful or not
+        """
+        if self.read_task is not None:
+            self.read_task.cancel()
+            self.read_task = None
+        self.fail_pending(ConnectionError("The connection to the CMO server was closed."))
+        if self.writer is None:
+            raise ConnectionError("Failed to close client connection.")
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError: # the game already closed the connection
+            pass
+        return True
+
 @dataclass
 class SteamClientProps:
     scenario_name: str
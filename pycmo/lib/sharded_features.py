@@ -0,0 +1,212 @@
+# Purpose: Read the observations written by ScenEdit_ExportScenarioToShards, which are split across several shard files, and decode the shards in parallel.
+
+# imports
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import Executor
+from typing import NamedTuple
+
+from pycmo.lib.features import FeaturesFromSteam, Projection
+from pycmo.lib.stream_parser import ScenarioStreamParser, ScenarioRecords, get_scenario_schema
+from pycmo.lib.tools import open_cmo_steam_observation_xml
+
+SHARD_EXPORT_ID = re.compile(rb"<Scenario><Export>([^<]*)</Export>")
+
+class ShardManifest(NamedTuple):
+    ExportID: str # the ID of the export that wrote the shards
+    Shards: int # the number of shards
+
+class IncompleteShardsError(ValueError):
+    """
+    Raised when the shards on disk do not all belong to the export listed in the manifest.
+    """
+
+def get_manifest_path(observation_path:str) -> str:
+    """
+    Description:
+        Return the path of the manifest written next to an observation file by ScenEdit_ExportScenarioToShards.
+
+    Keyword Arguments:
+        observation_path: the path to the observation file, e.g. "Steam demo.inst".
+
+    Returns:
+        (str) the path to the manifest, e.g. "Steam demo_manifest.inst".
+    """
+    root, extension = os.path.splitext(observation_path)
+    return root + "_manifest" + extension
+
+def get_shard_path(observation_path:str, shard_idx:int) -> str:
+    """
+    Description:
+        Return the path of a shard written next to an observation file by ScenEdit_ExportScenarioToShards.
+
+    Keyword Arguments:
+        observation_path: the path to the observation file, e.g. "Steam demo.inst".
+        shard_idx: the number of the shard, starting at 1.
+
+    Returns:
+        (str) the path to the shard, e.g. "Steam demo_shard1.inst".
+    """
+    root, extension = os.path.splitext(observation_path)
+    return root + "_shard" + str(shard_idx) + extension
+
+def read_manifest(manifest_path:str) -> ShardManifest | None:
+    """
+    Description:
+        Read a shard manifest.
+
+    Keyword Arguments:
+        manifest_path: the path to the manifest.
+
+    Returns:
+        (ShardManifest | None) the manifest, or None if it is missing, partial or corrupt.
+    """
+    with open_cmo_steam_observation_xml(manifest_path) as manifest_xml:
+        if manifest_xml is None:
+            return None
+        try:
+            manifest = ET.fromstring(bytes(manifest_xml) if isinstance(manifest_xml, memoryview) else manifest_xml)
+            return ShardManifest(manifest.findtext("Export"), int(manifest.findtext("Shards")))
+        except (ET.ParseError, TypeError, ValueError):
+            return None
+
+def get_shard_export_id(shard:bytes) -> str | None:
+    match = SHARD_EXPORT_ID.search(shard, 0, 512)
+    return match.group(1).decode() if match else None
+
+def read_shard_set(observation_path:str) -> tuple[ShardManifest, list[bytes]]:
+    """
+    Description:
+        Read the manifest and the shards that it lists once.
+
+    Keyword Arguments:
+        observation_path: the path to the observation file that the shards were exported next to.
+
+    Returns:
+        (tuple[ShardManifest, list[bytes]]) the manifest and the xml of each shard, in order.
+    """
+    manifest = read_manifest(get_manifest_path(observation_path))
+    if manifest is None:
+        raise IncompleteShardsError("The shard manifest is missing or partial.")
+    shards = []
+    for shard_idx in range(1, manifest.Shards + 1):
+        with open_cmo_steam_observation_xml(get_shard_path(observation_path, shard_idx)) as shard_xml:
+            if shard_xml is None:
+                raise IncompleteShardsError(f"Shard {shard_idx} of export {manifest.ExportID} is missing or partial.")
+            shard = bytes(shard_xml) if not isinstance(shard_xml, str) else shard_xml.encode()
+        if get_shard_export_id(shard) != manifest.ExportID:
+            raise IncompleteShardsError(f"Shard {shard_idx} does not belong to export {manifest.ExportID}.")
+        shards.append(shard)
+    return manifest, shards
+
+def read_shards(observation_path:str, timeout:float=10.0, poll_interval:float=0.01) -> tuple[ShardManifest, list[bytes]]:
+    """
+    Description:
+        Wait until the manifest lists a complete set of shards that all belong to its export, and read them. The game
+        writes the shards of an export before its manifest, so shards that are being overwritten by the next export do
+        not match the manifest until the next manifest is written.
+
+    Keyword Arguments:
+        observation_path: the path to the observation file that the shards were exported next to.
+        timeout: the number of seconds to wait for a complete set of shards.
+        poll_interval: the number of seconds to wait between attempts.
+
+    Returns:
+        (tuple[ShardManifest, list[bytes]]) the manifest and the xml of each shard, in order.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return read_shard_set(observation_path)
+        except IncompleteShardsError as error:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"No complete set of shards was exported: {error}")
+        time.sleep(poll_interval)
+
+class ShardStreamParser(ScenarioStreamParser):
+    """
+    Also counts the units of every type in `records.unit_totals`, so that the index of a unit within its type can be
+    carried over from one shard to the next.
+    """
+    def _create_parser(self, encoding:str | None = None):
+        parser = super()._create_parser(encoding)
+        self._records.unit_totals = self._unit_totals = {}
+        return parser
+
+    def _start_unit(self, unit_type:str) -> None:
+        super()._start_unit(unit_type)
+        self._unit_totals[unit_type] = self._unit_totals.get(unit_type, 0) + 1
+
+def parse_shard(shard:bytes, sides:list[str] | None, schema:dict) -> ScenarioRecords:
+    """
+    Description:
+        Parse one shard. Runs in the worker processes when the shards are parsed in parallel.
+
+    Keyword Arguments:
+        shard: the xml of the shard.
+        sides: the sides to keep units and contacts for. Keeps every side if None.
+        schema: the schema of the Scenario element.
+
+    Returns:
+        (ScenarioRecords) the records of the shard.
+    """
+    return ShardStreamParser(sides=sides, schema=schema).parse_string(shard)
+
+def merge_shards(shard_records:list[ScenarioRecords]) -> ScenarioRecords:
+    """
+    Description:
+        Merge the records of the shards of an export, in order, into the records of the whole observation.
+
+    Keyword Arguments:
+        shard_records: the records of each shard.
+
+    Returns:
+        (ScenarioRecords) the records of the whole observation, as parsed from a single document.
+    """
+    merged = ScenarioRecords()
+    merged.scen_dic = shard_records[0].scen_dic
+    unit_offsets = {}
+    for records in shard_records:
+        merged.has_active_units = merged.has_active_units or records.has_active_units
+        for unit_type, units in records.units.items():
+            offset = unit_offsets.get(unit_type, 0)
+            merged_units = merged.units.setdefault(unit_type, [])
+            merged_units.extend((unit_idx + offset, unit) for unit_idx, unit in units)
+        for unit_type, total in records.unit_totals.items():
+            unit_offsets[unit_type] = unit_offsets.get(unit_type, 0) + total
+    return merged
+
+class ShardedFeaturesFromSteam(FeaturesFromSteam):
+    """
+    FeaturesFromSteam for the shards written by ScenEdit_ExportScenarioToShards, e.g. as read by `read_shards`. The
+    shards are parsed with the "stream" parser, in parallel if an executor is given.
+    """
+    def __init__(self, shards:list[bytes | str], player_side:str, projection:dict[str, list[str]] | Projection | None = None, executor:Executor | None = None) -> None:
+        """
+        Description:
+            Initialize a Features object to hold observations.
+
+        Keyword Arguments:
+            shards: the xml of each shard, in order.
+            player_side: the side of the player. Dictates the units that they can actually control.
+            projection: the fields to decode for each entity type. Decodes everything if None.
+            executor: the executor that parses the shards, e.g. a ProcessPoolExecutor kept across observations. The shards are parsed in the current process if None.
+
+        Returns:
+            None
+        """
+        self.executor = executor
+        super().__init__(shards, player_side, parser="stream", projection=projection)
+
+    def parse_scenario(self, shards:list[bytes | str], player_side:str, parser:str="stream") -> None:
+        schema = get_scenario_schema(self.projection)
+        sides = [player_side]
+        if self.executor is None or len(shards) == 1:
+            shard_records = [parse_shard(shard, sides, schema) for shard in shards]
+        else:
+            shard_records = list(self.executor.map(parse_shard, shards, [sides] * len(shards), [schema] * len(shards)))
+        records = merge_shards(shard_records)
+        self.scen_dic = records.scen_dic
+        self.unit_records = records
@@ -1,7 +1,7 @@
 from gymnasium import spaces
 import numpy as np
 
-from pycmo.lib.features import Mount, Loadout
+from pycmo.lib.features import Mount, Loadout, Unit, Contact
 
 # CONSTANTS
 pycmo_text_max_length = 2000
@@ -85,3 +85,28 @@ def add_mount_space_to_unit_space(unit_space:spaces.Dict, mounts:list[Mount]) ->
 def add_loadout_space_to_unit_space(unit_space:spaces.Dict, loadout:Loadout) -> spaces.Dict:
     unit_space["Loadout"] = get_loadout_space(num_weapons=len(loadout.Weapons))
     return unit_space
+
+def get_entity_observation(entity:Unit | Contact, entity_space:spaces.Dict) -> dict:
+    entity_observation = {}
+    for key in entity_space.keys():
+        obs_value = getattr(entity, key)
+        if isinstance(obs_value, float):
+            entity_observation[key] = np.array((obs_value,), dtype=np.float64)
+        else:
+            entity_observation[key] = obs_value
+    return entity_observation
+
+def get_default_observation(space:spaces.Space):
+    # a member of the space, e.g. for an entity that has not been observed yet: zeros (within the bounds of each box)
+    # and the shortest text allowed
+    if isinstance(space, spaces.Dict):
+        return {key: get_default_observation(subspace) for key, subspace in space.items()}
+    if isinstance(space, spaces.Tuple):
+        return tuple(get_default_observation(subspace) for subspace in space)
+    if isinstance(space, spaces.Box):
+        return np.clip(np.zeros(space.shape), space.low, space.high).astype(space.dtype)
+    if isinstance(space, spaces.Text):
+        return min(space.characters) * space.min_length
+    if isinstance(space, spaces.Discrete):
+        return space.start
+    raise ValueError(f"No default observation for {space}.")
@@ -0,0 +1,326 @@
+# Purpose: A pure-Python stand-in for the Lua console that Command: Professional Edition serves over TCP. It runs the
+# commands that pycmo sends to the game (batches, actions, VP_RunForTimeAndHalt, the step and scenario-ended polls and
+# the observation exports) against a scenario xml from the corpus, so that Client, CPEEnv and run_loop can be tested
+# and benchmarked without the game.
+
+# imports
+import logging
+import os
+import re
+import socket
+import threading
+from time import monotonic, sleep
+
+from pycmo.configs.config import get_config
+from pycmo.lib.protocol import BATCH_HEADER, BATCH_COMMAND, BATCH_FOOTER
+from pycmo.lib.tools import ticks_to_unix
+
+# open config and set important files and folder paths
+config = get_config()
+
+TICKS_PER_SECOND = 10000000
+BATCH_COMMAND_PREFIX, BATCH_COMMAND_SUFFIX = BATCH_COMMAND.split("{}")
+
+# the parts of the scripts that pycmo sends, see CPEEnv and pycmo.lib.actions
+RETURN_LITERAL = re.compile(r"return (?:'([^']*)'|\"([^\"]*)\"|(-?\d+(?:\.\d+)?))")
+ACTION = re.compile(r"^\s*((?:ScenEdit_SetUnit|ScenEdit_AttackContact|ScenEdit_RefuelUnit|Tool_EmulateNoConsole)\(.*\))\s*$", re.MULTILINE)
+RUN_FOR_TIME = re.compile(r"VP_RunForTimeAndHalt\(\{Time='(\d+):(\d+):(\d+)'\}\)")
+STEP_POLL = re.compile(r"local elapsed = now - (-?\d+) \nif elapsed >= (\d+) then")
+EXPORT_LIMIT = re.compile(r"if #theXML <= (\d+) then")
+RETURN_XML = re.compile(r"return (?:theXML|ScenEdit_ExportScenarioToXML\(\))")
+OPEN_FILE = re.compile(r"io\.open\('([^']*)', 'w'\)")
+FALLBACK_RETURN = re.compile(r"return '([^']*)'\s*$")
+SCENARIO_TIME = re.compile(rb"<Time>(\d+)</Time>")
+
+class UnsupportedCommandError(ValueError):
+    """
+    Raised when the stand-in server is sent a command that it does not know how to run.
+    """
+
+class StandInScenario():
+    """
+    The state of the game behind a StandInServer. The clock starts at the time of the scenario xml and moves forward
+    when the scenario is run with VP_RunForTimeAndHalt, `run_delay` seconds after the command. Each export returns the
+    scenario xml with its time set to the clock, or, when replaying, the next of `replay_files` as it was recorded.
+    """
+    def __init__(self, xml_file:str | None=None, replay_files:list[str] | None=None, run_delay:float=0.0, export_delay:float=0.0, duration:int | None=None) -> None:
+        """
+        Description:
+            Initializes the scenario.
+
+        Keyword Arguments:
+            xml_file: the scenario xml that the clock, the duration and synthesized observations come from. Defaults to xml/scen.xml.
+            replay_files: observations, e.g. the step files of a recorded session, to return in order from each export instead. The last one is repeated.
+            run_delay: the time in seconds that the game takes to run each step.
+            export_delay: the time in seconds that the game takes to export each observation.
+            duration: the duration of the scenario in seconds. Defaults to the duration in the scenario xml.
+
+        Returns:
+            None
+        """
+        if xml_file is None:
+            xml_file = os.path.join(config['pycmo_path'], 'xml', 'scen.xml')
+        with open(xml_file, 'rb') as f:
+            self.xml = f.read()
+        self.replay = []
+        for replay_file in replay_files or []:
+            with open(replay_file, 'rb') as f:
+                self.replay.append(f.read())
+        self.run_delay = run_delay
+        self.export_delay = export_delay
+        self.time_match = SCENARIO_TIME.search(self.xml) # the first <Time> is the time of the scenario
+        self.start_ticks = int(self.time_match.group(1))
+        if duration is None:
+            duration = int(re.search(rb"<Duration>(\d+)</Duration>", self.xml).group(1)) // TICKS_PER_SECOND
+        self.duration = duration
+        self.elapsed = 0 # the seconds that the scenario has run for
+        self.target_elapsed = None # where the step that is running ends
+        self.run_ends_at = 0.0 # the monotonic time at which the step that is running ends
+        self.exports = 0
+        self.actions = [] # the actions that were run, in order
+        self.lock = threading.Lock()
+
+    def current_time(self) -> int:
+        """
+        Description:
+            Returns the time of the scenario in UNIX format, as ScenEdit_CurrentTime does.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (int) the time in UNIX format.
+        """
+        if self.target_elapsed is not None and monotonic() >= self.run_ends_at:
+            self.elapsed = self.target_elapsed
+            self.target_elapsed = None
+        return ticks_to_unix(self.start_ticks) + self.elapsed
+
+    def has_ended(self) -> bool:
+        self.current_time()
+        return self.elapsed >= self.duration
+
+    def run_for(self, seconds:int) -> None:
+        self.current_time()
+        start = self.elapsed if self.target_elapsed is None else self.target_elapsed
+        self.target_elapsed = min(start + seconds, max(self.duration, start))
+        self.run_ends_at = monotonic() + self.run_delay
+
+    def export(self) -> bytes:
+        """
+        Description:
+            Returns the observation, as ScenEdit_ExportScenarioToXML does.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            (bytes) the scenario xml.
+        """
+        sleep(self.export_delay)
+        self.exports += 1
+        if self.replay:
+            return self.replay[min(self.exports, len(self.replay)) - 1]
+        if self.elapsed == 0:
+            return self.xml
+        ticks = str(self.start_ticks + self.elapsed * TICKS_PER_SECOND).encode()
+        return self.xml[:self.time_match.start(1)] + ticks + self.xml[self.time_match.end(1):]
+
+    def run_command(self, command:str) -> bytes:
+        """
+        Description:
+            Run one command, i.e. one script, the way the game would run the scripts that pycmo sends.
+
+        Keyword Arguments:
+            command: the Lua script.
+
+        Returns:
+            (bytes) the value that the script returns, or an empty response if it does not return anything.
+        """
+        with self.lock:
+            script = command.strip()
+            if script.startswith("--script"):
+                script = script[len("--script"):].strip()
+            if script == "":
+                return b""
+            literal = RETURN_LITERAL.fullmatch(script)
+            if literal is not None:
+                return next(group for group in literal.groups() if group is not None).encode()
+            recognized = False
+            for action in ACTION.finditer(script):
+                self.actions.append(action.group(1))
+                recognized = True
+            run = RUN_FOR_TIME.search(script)
+            if run is not None:
+                hours, minutes, seconds = map(int, run.groups())
+                self.run_for(hours * 3600 + minutes * 60 + seconds)
+                recognized = True
+            poll = STEP_POLL.search(script)
+            if poll is not None and self.current_time() - int(poll.group(1)) < int(poll.group(2)):
+                return b"" # the step has not finished yet
+            if "VP_GetScenario()" in script: # the scenario-ended check of CPEEnv
+                path = OPEN_FILE.search(script)
+                if path is not None and self.has_ended():
+                    with open(path.group(1), 'w') as f:
+                        f.write('True')
+                return b""
+            if "ScenEdit_ExportScenarioToXML()" in script:
+                xml = self.export()
+                limit = EXPORT_LIMIT.search(script)
+                if RETURN_XML.search(script) is not None and (limit is None or len(xml) <= int(limit.group(1))):
+                    return xml
+                path = OPEN_FILE.search(script)
+                if path is not None:
+                    with open(path.group(1), 'wb') as f:
+                        f.write(xml)
+                fallback = FALLBACK_RETURN.search(script)
+                return fallback.group(1).encode() if fallback is not None else b""
+            if not recognized:
+                raise UnsupportedCommandError(f"The stand-in server cannot run the command: {script[:200]}")
+            return b""
+
+class StandInServer():
+    """
+    A stand-in for the TCP server of the game, which runs the commands that it receives against a StandInScenario. A
+    batch (see `format_batch`) is answered with the length-framed response of each of its commands, as the game
+    answers it, and a command that fails responds with its error message. A command sent on its own is answered with
+    its response followed by `delimiter`, which "sentinel" framing reads up to, and which unframed clients read as the
+    game's acknowledgement.
+    """
+    def __init__(self, scenario:StandInScenario | None=None, host:str="localhost", port:int=0, round_trip_delay:float=0.0, command_delay:float=0.0, delimiter:bytes=b"\0") -> None:
+        """
+        Description:
+            Initializes the server and starts listening.
+
+        Keyword Arguments:
+            scenario: the game behind the server. Defaults to a StandInScenario of xml/scen.xml.
+            host: the IP host to listen on.
+            port: the port to listen on. If 0, any free port, which is kept when the server is started again.
+            round_trip_delay: the simulated network round trip of each message, in seconds.
+            command_delay: the simulated time that the game takes to run each command, in seconds.
+            delimiter: the bytes that end the response to each command sent on its own.
+
+        Returns:
+            None
+        """
+        self.scenario = scenario if scenario is not None else StandInScenario()
+        self.host = host
+        self.port = port
+        self.round_trip_delay = round_trip_delay
+        self.command_delay = command_delay
+        self.delimiter = delimiter
+        self.commands = [] # every command run, in order
+        self.errors = [] # the commands that failed, with their error messages
+        self.listener = None
+        self.connections = []
+        self.start()
+
+    def start(self) -> None:
+        """
+        Description:
+            Start listening, e.g. again after `stop`, on the same port.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            None
+        """
+        self.listener = socket.create_server((self.host, self.port))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.accept, args=(self.listener,), daemon=True).start()
+
+    def accept(self, listener:socket.socket) -> None:
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError: # stopped
+                return
+            self.connections.append(connection)
+            threading.Thread(target=self.serve, args=(connection,), daemon=True).start()
+
+    def serve(self, connection:socket.socket) -> None:
+        script = b""
+        try:
+            while data := connection.recv(65536):
+                script += data
+                if script.startswith(BATCH_HEADER.encode()) and not script.endswith(BATCH_FOOTER.encode()):
+                    continue # the rest of the batch has not arrived yet
+                connection.sendall(self.respond(script.decode("UTF-8")))
+                script = b""
+        except OSError: # the client or `stop` closed the connection
+            pass
+
+    def respond(self, script:str) -> bytes:
+        """
+        Description:
+            Run a script received from a client and return the bytes to answer it with.
+
+        Keyword Arguments:
+            script: a batch of commands or a single command.
+
+        Returns:
+            (bytes) the answer.
+        """
+        batched = script.startswith(BATCH_HEADER)
+        commands = split_batch(script) if batched else [script]
+        sleep(self.round_trip_delay + self.command_delay * len(commands))
+        responses = []
+        for command in commands:
+            self.commands.append(command)
+            try:
+                responses.append(self.scenario.run_command(command))
+            except Exception as error:
+                logging.debug("The stand-in server failed to run a command: %s", error)
+                self.errors.append((command, str(error)))
+                responses.append(str(error).encode())
+        if batched:
+            return b"".join(str(len(response)).encode() + b"\n" + response for response in responses)
+        return responses[0] + self.delimiter
+
+    def stop(self) -> None:
+        """
+        Description:
+            Stop listening and close every connection.
+
+        Keyword Arguments:
+            None
+
+        Returns:
+            None
+        """
+        try:
+            self.listener.shutdown(socket.SHUT_RDWR) # wakes the accept thread, which would otherwise keep the port open
+        except OSError:
+            pass
+        self.listener.close()
+        for connection in self.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+        self.connections = []
+
+    def __enter__(self) -> "StandInServer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+def split_batch(script:str) -> list[str]:
+    """
+    Description:
+        Split a script made by `format_batch` back into its commands.
+
+    Keyword Arguments:
+        script: the batch.
+
+    Returns:
+        (list[str]) the commands.
+    """
+    body = script[len(BATCH_HEADER):len(script) - len(BATCH_FOOTER)]
+    if body == "":
+        return []
+    body = body[len(BATCH_COMMAND_PREFIX):len(body) - len(BATCH_COMMAND_SUFFIX)]
+    return body.split(BATCH_COMMAND_SUFFIX + BATCH_COMMAND_PREFIX)
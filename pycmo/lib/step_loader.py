@@ -0,0 +1,131 @@
+# Purpose: Decode recorded step files (.xml or Steam .inst observations) in bulk across a process pool.
+
+# imports
+import os
+import glob
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, NamedTuple
+
+from pycmo.lib.features import Features, FeaturesFromSteam, UnitTable, ContactTable
+from pycmo.lib.tools import open_cmo_steam_observation_xml
+
+STEP_FILE_EXTENSIONS = (".xml", ".inst")
+
+class StepArrays(NamedTuple):
+    Time: int # the scenario time of the step
+    TotalScore: int # the score of the player's side
+    units: UnitTable
+    contacts: ContactTable
+
+class DecodedStep(NamedTuple):
+    path: str
+    observation: Features | StepArrays | None # None if the step failed to decode and errors are skipped
+
+def get_step_files(steps:str | list[str]) -> list[str]:
+    """
+    Description:
+        Resolve a folder, a glob or a list of paths into step files sorted by step.
+        Files named after their step number (0.xml, 1.xml, ..., 10.xml) are sorted numerically and come first.
+
+    Keyword Arguments:
+        steps: a folder containing step files, a glob pattern, or a list of paths.
+
+    Returns:
+        (list) the paths to the step files in step order.
+    """
+    if isinstance(steps, str):
+        if os.path.isdir(steps):
+            step_files = [os.path.join(steps, file_name) for file_name in os.listdir(steps) if file_name.endswith(STEP_FILE_EXTENSIONS)]
+        else:
+            step_files = glob.glob(steps)
+    else:
+        step_files = list(steps)
+    return sorted(step_files, key=get_step_sort_key)
+
+def get_step_sort_key(path:str) -> tuple:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if stem.isdigit():
+        return (0, int(stem), path)
+    return (1, 0, path)
+
+def decode_step(path:str, player_side:str, parser:str="stream", arrays:bool=False) -> Features | StepArrays:
+    """
+    Description:
+        Decode one step file. Steam observation files (.inst) are decoded with FeaturesFromSteam, xml files with Features.
+        A Steam observation file that is partial or corrupt raises a ValueError.
+
+    Keyword Arguments:
+        path: the path to the step file.
+        player_side: the side of the player.
+        parser: the parser backend, either "xmltodict" or "stream".
+        arrays: whether to return only the numeric unit and contact fields as NumPy arrays.
+
+    Returns:
+        (Features | StepArrays) the decoded step.
+    """
+    if path.endswith(".inst"):
+        with open_cmo_steam_observation_xml(path) as observation_xml:
+            if observation_xml is None:
+                raise ValueError(f"The step file {path} is missing, partial or corrupt.")
+            observation = FeaturesFromSteam(observation_xml, player_side, parser=parser)
+    else:
+        observation = Features(path, player_side, parser=parser)
+    if arrays:
+        return StepArrays(observation.meta.Time, observation.side_.TotalScore, observation.unit_table, observation.contact_table)
+    return observation
+
+def load_steps(steps:str | list[str], player_side:str, parser:str="stream", arrays:bool=False, processes:int | None = None, skip_errors:bool=False) -> Iterator[DecodedStep]:
+    """
+    Description:
+        Decode step files across a process pool and yield them in step order as they become available.
+        At most a few steps per process are decoded ahead of the consumer.
+
+    Keyword Arguments:
+        steps: a folder containing step files, a glob pattern, or a list of paths.
+        player_side: the side of the player.
+        parser: the parser backend, either "xmltodict" or "stream".
+        arrays: whether to return only the numeric unit and contact fields as NumPy arrays, which are much cheaper to send back from the worker processes than Features.
+        processes: the number of worker processes. Defaults to the number of CPUs. Steps are decoded in the current process if 1.
+        skip_errors: whether to log and yield None for the steps that fail to decode instead of raising.
+
+    Returns:
+        (Iterator[DecodedStep]) the decoded steps in step order.
+    """
+    logger = logging.getLogger(__name__)
+    step_files = get_step_files(steps)
+    processes = processes or os.cpu_count() or 1
+
+    def get_result(path, decode):
+        try:
+            return DecodedStep(path, decode())
+        except Exception as error:
+            if not skip_errors:
+                raise
+            logger.warning(f"Failed to decode step {path}: {error!r}")
+            return DecodedStep(path, None)
+
+    if processes == 1:
+        for path in step_files:
+            yield get_result(path, lambda: decode_step(path, player_side, parser, arrays))
+        return
+
+    max_pending = processes * 4
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = deque()
+        step_files = iter(step_files)
+        for path in step_files:
+            pending.append((path, executor.submit(decode_step, path, player_side, parser, arrays)))
+            if len(pending) >= max_pending:
+                break
+        try:
+            while pending:
+                path, future = pending.popleft()
+                next_path = next(step_files, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(decode_step, next_path, player_side, parser, arrays)))
+                yield get_result(path, future.result)
+        finally:
+            for _, future in pending: # the consumer stopped early
+                future.cancel()
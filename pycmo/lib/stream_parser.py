@@ -0,0 +1,322 @@
+# Purpose: Single-pass streaming parser that extracts only the parts of a scenario XML that Features needs.
+
+# imports
+from xml.parsers import expat
+from functools import lru_cache
+from typing import BinaryIO
+
+# Schemas describe which elements the parser keeps. A dict maps child tags to their own schema, None marks a leaf whose
+# text is kept, and "*" matches any tag. Everything that is not listed is skipped without being materialized.
+WEAPON_RECORD_SCHEMA = {"ID": None, "WeapID": None, "CL": None, "ML": None}
+
+UNIT_SCHEMA = {
+    "ID": None,
+    "Name": None,
+    "Side": None,
+    "DBID": None,
+    "Lon": None,
+    "Lat": None,
+    "CH": None,
+    "CS": None,
+    "CA": None,
+    "Loadout": {"Loadout": {"ID": None, "Name": None, "DBID": None, "Weaps": {"WRec": WEAPON_RECORD_SCHEMA}}},
+    "Mounts": {"Mount": {"ID": None, "Name": None, "DBID": None, "MW": {"WRec": WEAPON_RECORD_SCHEMA}}},
+    "Fuel": {"FuelRec": {"CQ": None, "MQ": None}},
+}
+
+CONTACT_SCHEMA = {"ID": None, "Name": None, "CS": None, "CA": None, "Lon": None, "Lat": None}
+
+SIDE_SCHEMA = {"ID": None, "Name": None, "TotalScore": None, "Contacts": {"Contact": CONTACT_SCHEMA}}
+
+SCENARIO_SCHEMA = {
+    "TimelineID": None,
+    "Time": None,
+    "Title": None,
+    "ZeroHour": None,
+    "StartTime": None,
+    "Duration": None,
+    "Sides": {"Side": SIDE_SCHEMA},
+    "ActiveUnits": {"*": UNIT_SCHEMA},
+}
+
+# The element each field of the Features named tuples is read from. Fields that are not listed (XML_ID, Side, Type) do
+# not have an element of their own. Weapons, Mounts, Loadout and the fuel fields hold nested elements.
+WEAPON_FIELD_ELEMENTS = {"ID": "ID", "WeaponID": "WeapID", "QuantRemaining": "CL", "MaxQuant": "ML"}
+MOUNT_FIELD_ELEMENTS = {"ID": "ID", "Name": "Name", "DBID": "DBID"}
+LOADOUT_FIELD_ELEMENTS = {"ID": "ID", "Name": "Name", "DBID": "DBID"}
+UNIT_FIELD_ELEMENTS = {"ID": "ID", "Name": "Name", "DBID": "DBID", "Lon": "Lon", "Lat": "Lat", "CH": "CH", "CS": "CS", "CA": "CA"}
+FUEL_FIELD_ELEMENTS = {"CurrentFuel": "CQ", "MaxFuel": "MQ"}
+CONTACT_FIELD_ELEMENTS = {"ID": "ID", "Name": "Name", "CS": "CS", "CA": "CA", "Lon": "Lon", "Lat": "Lat"}
+
+@lru_cache(maxsize=None)
+def get_scenario_schema(projection) -> dict:
+    """
+    Description:
+        Build the schema that only keeps the elements needed by a projection, so that the parser skips everything else.
+
+    Keyword Arguments:
+        projection: the Projection listing the fields to decode for each entity type.
+
+    Returns:
+        (dict) the scenario schema.
+    """
+    weapon_schema = {element: None for field, element in WEAPON_FIELD_ELEMENTS.items() if field in projection.Weapon}
+    mount_schema = {element: None for field, element in MOUNT_FIELD_ELEMENTS.items() if field in projection.Mount}
+    if "Weapons" in projection.Mount:
+        mount_schema["MW"] = {"WRec": weapon_schema}
+    loadout_schema = {element: None for field, element in LOADOUT_FIELD_ELEMENTS.items() if field in projection.Loadout}
+    if "Weapons" in projection.Loadout:
+        loadout_schema["Weaps"] = {"WRec": weapon_schema}
+
+    unit_schema = {element: None for field, element in UNIT_FIELD_ELEMENTS.items() if field in projection.Unit}
+    unit_schema["Side"] = None # always needed to keep the units of the requested sides
+    if "Loadout" in projection.Unit:
+        unit_schema["Loadout"] = {"Loadout": loadout_schema}
+    if "Mounts" in projection.Unit:
+        unit_schema["Mounts"] = {"Mount": mount_schema}
+    fuel_schema = {element: None for field, element in FUEL_FIELD_ELEMENTS.items() if field in projection.Unit}
+    if fuel_schema:
+        unit_schema["Fuel"] = {"FuelRec": fuel_schema}
+
+    side_schema = {"ID": None, "Name": None, "TotalScore": None}
+    if projection.Contact:
+        side_schema["Contacts"] = {"Contact": {element: None for field, element in CONTACT_FIELD_ELEMENTS.items() if field in projection.Contact}}
+
+    scenario_schema = {tag: schema for tag, schema in SCENARIO_SCHEMA.items() if tag not in ("Sides", "ActiveUnits")}
+    scenario_schema["Sides"] = {"Side": side_schema}
+    if projection.Unit:
+        scenario_schema["ActiveUnits"] = {"*": unit_schema}
+    return scenario_schema
+
+class ScenarioRecords(object):
+    """
+    The records extracted from one scenario XML.
+
+    `scen_dic` has the same layout as the dictionary produced by xmltodict, but only holds the scenario-level fields and
+    the sides. Contacts are only kept for the requested sides. Units are kept apart in `units`, grouped by unit type in
+    the order in which each type first appears, as a list of (index of the unit within its type, unit record) tuples.
+    Unit and contact records are dictionaries with the same layout as their xmltodict counterparts restricted to the
+    fields in the schema, so they can be handed to the Features getters directly.
+    """
+    def __init__(self) -> None:
+        self.scen_dic = {}
+        self.has_active_units = False
+        self.units = {}
+
+class ScenarioStreamParser(object):
+    """
+    Parses a scenario XML in one pass over an expat event stream.
+    """
+    def __init__(self, sides:list[str] | None = None, fragments:bool = False, schema:dict = SCENARIO_SCHEMA) -> None:
+        """
+        Description:
+            Initialize a parser.
+
+        Keyword Arguments:
+            sides: the names of the sides to keep units and contacts for. Keeps every side if None.
+            fragments: whether to keep the raw bytes of each unit, and of its Loadout, Mounts and Fuel elements, under the "#fragment" key of their records. The whole document is read into memory when this is set.
+            schema: the schema of the Scenario element, e.g. one built by `get_scenario_schema`.
+
+        Returns:
+            None
+        """
+        self.sides = set(sides) if sides is not None else None
+        self.fragments = fragments
+        self.schema = schema
+
+    def parse_file(self, xml:str | BinaryIO) -> ScenarioRecords:
+        """
+        Description:
+            Parse a scenario XML file.
+
+        Keyword Arguments:
+            xml: the path to the xml file or a binary file object.
+
+        Returns:
+            (ScenarioRecords) the extracted records.
+        """
+        if self.fragments:
+            if hasattr(xml, "read"):
+                return self.parse_string(xml.read())
+            try:
+                with open(xml, 'rb') as f:
+                    return self.parse_string(f.read())
+            except FileNotFoundError:
+                raise FileNotFoundError("Unable to parse scenario xml.")
+        parser = self._create_parser()
+        if hasattr(xml, "read"):
+            parser.ParseFile(xml)
+        else:
+            try:
+                with open(xml, 'rb') as f:
+                    parser.ParseFile(f)
+            except FileNotFoundError:
+                raise FileNotFoundError("Unable to parse scenario xml.")
+        return self._records
+
+    def parse_string(self, xml:str | bytes | memoryview) -> ScenarioRecords:
+        """
+        Description:
+            Parse a scenario XML held in memory.
+
+        Keyword Arguments:
+            xml: the scenario xml as a string, as bytes or as any buffer, e.g. a memoryview. Buffers are copied to bytes when fragments are kept, so that the fragments do not hold on to the buffer.
+
+        Returns:
+            (ScenarioRecords) the extracted records.
+        """
+        encoding = None
+        if isinstance(xml, str):
+            xml = xml.encode('utf-8')
+            encoding = 'utf-8'
+        elif self.fragments and xml is not None and not isinstance(xml, bytes):
+            xml = bytes(xml)
+        parser = self._create_parser(encoding)
+        self._buffer = xml
+        try:
+            parser.Parse(xml, True)
+        finally:
+            self._buffer = None
+        return self._records
+
+    # ============== Expat Handlers ================================
+    def _create_parser(self, encoding:str | None = None):
+        self._records = ScenarioRecords()
+        self._unit_counts = {}
+        self._stack = [] # one [tag, schema, record, text chunks, has children, start byte of the fragment] frame per kept element
+        self._skip = 0 # depth inside an element that is not kept
+        parser = expat.ParserCreate(encoding)
+        parser.buffer_text = True
+        self._parser = parser
+        self._set_handlers(skipping=False)
+        return parser
+
+    def _set_handlers(self, skipping:bool) -> None:
+        # skipped subtrees only need their depth tracked, so they do not get a character data handler at all
+        parser = self._parser
+        if skipping:
+            parser.StartElementHandler = self._skip_start_element
+            parser.EndElementHandler = self._skip_end_element
+            parser.CharacterDataHandler = None
+        else:
+            parser.StartElementHandler = self._start_element
+            parser.EndElementHandler = self._end_element
+            parser.CharacterDataHandler = self._characters
+
+    def _skip_subtree(self) -> None:
+        self._skip = 1
+        self._set_handlers(skipping=True)
+
+    def _skip_start_element(self, tag:str, attrs:dict) -> None:
+        self._skip += 1
+
+    def _skip_end_element(self, tag:str) -> None:
+        self._skip -= 1
+        if not self._skip:
+            self._set_handlers(skipping=False)
+
+    def _start_element(self, tag:str, attrs:dict) -> None:
+        stack = self._stack
+        if not stack:
+            if tag != "Scenario":
+                self._skip_subtree()
+                return
+            stack.append([tag, self.schema, {}, [], False, None])
+            return
+        parent = stack[-1]
+        parent[4] = True
+        parent_schema = parent[1]
+        if parent_schema is None:
+            self._skip_subtree()
+            return
+        schema = parent_schema.get(tag, parent_schema.get("*", False))
+        if schema is False:
+            self._skip_subtree()
+            return
+        fragment_start = None
+        if parent[0] == "ActiveUnits":
+            self._start_unit(tag)
+            if self.fragments:
+                fragment_start = self._parser.CurrentByteIndex
+        elif tag == "Contacts" and parent[0] == "Side" and not self._keep_contacts(parent[2]):
+            self._skip_subtree()
+            return
+        elif self.fragments and schema is not None and len(stack) == 3 and stack[1][0] == "ActiveUnits":
+            fragment_start = self._parser.CurrentByteIndex
+        stack.append([tag, schema, {}, [], False, fragment_start])
+
+    def _end_element(self, tag:str) -> None:
+        stack = self._stack
+        frame = stack.pop()
+        if frame[4]:
+            value = frame[2]
+        else:
+            value = ''.join(frame[3]).strip() or None
+        if frame[5] is not None and isinstance(value, dict):
+            value["#fragment"] = self._get_fragment(frame)
+        if not stack:
+            self._records.scen_dic[tag] = value
+            return
+        parent_tag = stack[-1][0]
+        if parent_tag == "ActiveUnits":
+            self._end_unit(tag, value)
+            return
+        if parent_tag == "Scenario" and tag == "ActiveUnits":
+            self._records.has_active_units = True
+            return
+        if parent_tag == "Sides" and tag == "Side":
+            self._prune_side(value)
+        elif tag == "Side" and len(stack) == 3 and stack[1][0] == "ActiveUnits" and not self._keep_unit(value):
+            # the unit belongs to another side, so drop what was read so far and skip the rest of it
+            stack.pop()
+            self._skip_subtree()
+            return
+        record = stack[-1][2]
+        if tag in record:
+            existing = record[tag]
+            if isinstance(existing, list):
+                existing.append(value)
+            else:
+                record[tag] = [existing, value]
+        else:
+            record[tag] = value
+
+    def _characters(self, data:str) -> None:
+        self._stack[-1][3].append(data)
+
+    def _get_fragment(self, frame:list) -> bytes:
+        buffer = self._buffer
+        end = self._parser.CurrentByteIndex
+        if not frame[4] and not frame[3] and buffer[end - 2:end] == b'/>':
+            return buffer[frame[5]:end] # expat reports the end of a self-closing element right after it
+        return buffer[frame[5]:buffer.index(b'>', end) + 1]
+
+    # ============== Side Filtering ================================
+    def _start_unit(self, unit_type:str) -> None:
+        units = self._records.units
+        if unit_type not in units:
+            units[unit_type] = []
+            self._unit_counts[unit_type] = 0
+        else:
+            self._unit_counts[unit_type] += 1
+
+    def _end_unit(self, unit_type:str, unit:dict | str | None) -> None:
+        # units of other sides never get here, units without a side are kept so that Features can report them
+        self._records.units[unit_type].append((self._unit_counts[unit_type], unit))
+
+    def _keep_unit(self, side_name:str | None) -> bool:
+        if self.sides is None:
+            return True
+        return isinstance(side_name, str) and side_name in self.sides
+
+    def _keep_contacts(self, side:dict) -> bool:
+        if self.sides is None:
+            return True
+        name = side.get("Name")
+        return name is None or name in self.sides
+
+    def _prune_side(self, side:dict | str | None) -> None:
+        if self.sides is None or not isinstance(side, dict):
+            return
+        if side.get("Name") not in self.sides:
+            side.pop("Contacts", None)
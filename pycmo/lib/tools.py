@@ -9,6 +9,10 @@ import os
 import numpy as np
 import subprocess
 import json
+import mmap
+import re
+from contextlib import contextmanager
+from typing import Iterator
 from time import sleep
 import win32gui
 
@@ -186,10 +190,165 @@ def cmo_steam_observation_file_to_xml(file_path:str) -> str or None:
     except FileNotFoundError:
         return None
     
+    return cmo_steam_observation_to_xml(observation_file_contents)
+
+def cmo_steam_observation_to_xml(observation_file_contents:str | bytes) -> str or None:
     try:
         observation_file_json = json.loads(observation_file_contents)
-    except json.decoder.JSONDecodeError:
+    except (json.decoder.JSONDecodeError, UnicodeDecodeError): # e.g. bytes that end inside a character while the game writes the file
         return None
     
     observation_xml = observation_file_json["Comments"]
     return observation_xml
+
+def find_json_string_value(contents:bytes | mmap.mmap, key:bytes) -> tuple[int, int] | None:
+    """
+    Description:
+        Find the raw (still escaped) value of a string field in a JSON document without parsing the document.
+
+    Keyword Arguments:
+        contents: the JSON document.
+        key: the quoted field name, e.g. b'"Comments"'.
+
+    Returns:
+        (tuple | None) the start and end offsets of the value between its quotes, or None if the field is not followed by a complete string.
+    """
+    whitespace = b' \t\r\n'
+    key_start = contents.find(key)
+    while key_start != -1:
+        position = key_start + len(key)
+        while contents[position:position + 1] and contents[position:position + 1] in whitespace:
+            position += 1
+        if contents[position:position + 1] == b':':
+            position += 1
+            while contents[position:position + 1] and contents[position:position + 1] in whitespace:
+                position += 1
+            if contents[position:position + 1] != b'"':
+                return None
+            start = position + 1
+            end = contents.find(b'"', start)
+            while end != -1:
+                backslashes = 0
+                while contents[end - backslashes - 1:end - backslashes] == b'\\':
+                    backslashes += 1
+                if backslashes % 2 == 0:
+                    return start, end
+                end = contents.find(b'"', end + 1)
+            return None
+        key_start = contents.find(key, key_start + 1) # the key was a value of another field
+    return None
+
+JSON_SIMPLE_ESCAPES = {b'"': b'"', b'\\': b'\\', b'/': b'/', b'b': b'\b', b'f': b'\f', b'n': b'\n', b'r': b'\r', b't': b'\t'}
+JSON_ESCAPE = re.compile(rb'\\(u[dD][89abAB][0-9a-fA-F]{2}\\u[dD][c-fC-F][0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|.?)', re.DOTALL)
+JSON_CONTROL_CHARACTER = re.compile(rb'[\x00-\x1f]')
+# whether observation files are memory-mapped while they are parsed. On Windows, the game cannot truncate or overwrite a
+# file that is mapped (ERROR_USER_MAPPED_FILE), so they are read into memory there instead.
+MMAP_OBSERVATIONS = os.name != "nt"
+
+def unescape_json_escape(match:re.Match) -> bytes:
+    escape = match.group(1)
+    if escape in JSON_SIMPLE_ESCAPES:
+        return JSON_SIMPLE_ESCAPES[escape]
+    if escape[:1] == b'u':
+        return json.loads(b'"\\' + escape + b'"').encode('utf-8', 'surrogatepass')
+    raise ValueError(f"Invalid JSON escape {escape!r}.")
+
+def cmo_steam_observation_to_xml_buffer(observation_file_contents:bytes | mmap.mmap) -> memoryview | bytes | str | None:
+    """
+    Description:
+        Extract the scenario xml from the contents of a Steam observation file (.inst) without copying it.
+        Only the fields around the xml are decoded as JSON, so partial or corrupt files are still detected.
+
+    Keyword Arguments:
+        observation_file_contents: the contents of the observation file, e.g. bytes or a memory-mapped file.
+
+    Returns:
+        (memoryview | bytes | str | None) a view of the xml inside the contents, a copy of the xml if it contains JSON escapes, the xml decoded with the rest of the document if the file has an unusual layout, or None if the file is partial or corrupt.
+    """
+    value = find_json_string_value(observation_file_contents, b'"Comments"')
+    if value is None: # unusual or truncated layout
+        return cmo_steam_observation_to_xml(bytes(observation_file_contents))
+    start, end = value
+    try:
+        observation_file_json = json.loads(observation_file_contents[:start] + observation_file_contents[end:])
+    except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if observation_file_json.get("Comments") != "": # found another field than the one json would read
+        return cmo_steam_observation_to_xml(bytes(observation_file_contents))
+    if JSON_CONTROL_CHARACTER.search(observation_file_contents, start, end):
+        return None
+    observation_xml = memoryview(observation_file_contents)[start:end]
+    if observation_file_contents.find(b'\\', start, end) != -1:
+        try:
+            return JSON_ESCAPE.sub(unescape_json_escape, observation_xml) # a single copy of the xml
+        except ValueError:
+            return None
+        finally:
+            observation_xml.release()
+    return observation_xml
+
+@contextmanager
+def open_cmo_steam_observation_xml(file_path:str, use_mmap:bool=MMAP_OBSERVATIONS) -> Iterator[memoryview | bytes | str | None]:
+    """
+    Description:
+        Memory-map a Steam observation file (.inst) and give access to the scenario xml inside it.
+        The xml is a view into the mapped file, so it is only valid inside the with block and must not be kept.
+        FeaturesFromSteam accepts it directly.
+        On Windows, the file is read into memory and closed before the xml is extracted instead, because the game
+        cannot write the next observation to the file while it is mapped (see MMAP_OBSERVATIONS).
+
+    Keyword Arguments:
+        file_path: the path to the observation file.
+        use_mmap: whether to memory-map the file, or to read it into memory. Defaults to MMAP_OBSERVATIONS.
+
+    Returns:
+        (Iterator[memoryview | bytes | str | None]) the xml, or None if the file is missing, partial or corrupt.
+    """
+    try:
+        f = open(file_path, 'rb')
+    except FileNotFoundError:
+        yield None
+        return
+    if not use_mmap:
+        with f:
+            contents = f.read()
+        observation_xml = cmo_steam_observation_to_xml_buffer(contents) if contents else None
+        try:
+            yield observation_xml
+        finally:
+            if isinstance(observation_xml, memoryview):
+                observation_xml.release()
+        return
+    with f:
+        try:
+            contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # empty file
+            yield None
+            return
+        observation_xml = None
+        try:
+            observation_xml = cmo_steam_observation_to_xml_buffer(contents)
+            yield observation_xml
+        finally:
+            if isinstance(observation_xml, memoryview):
+                observation_xml.release()
+            contents.close()
+
+def parse_api_call_report(report:str) -> tuple[str, dict[str, int]]:
+    """
+    Description:
+        Parse the report of the engine API calls made by an export of pycmo_lib.lua, which it writes to
+        "<scenario title>_api_calls.inst" when PycmoCountApiCalls is set.
+
+    Keyword Arguments:
+        report: the contents of the report, e.g. as given by `cmo_steam_observation_file_to_xml`.
+
+    Returns:
+        (tuple[str, dict[str, int]]) the name of the export and the number of calls to each API function.
+    """
+    lines = report.splitlines()
+    api_calls = {}
+    for line in lines[1:]:
+        function_name, calls = line.rsplit(' ', 1)
+        api_calls[function_name] = int(calls)
+    return lines[0], api_calls
@@ -0,0 +1,132 @@
+# Purpose: Benchmark driving many instances of the game at once with AsyncClient on one event loop against a thread per
+# instance with the blocking Client. Runs a stand-in for the game's Lua console with one TCP port per simulated instance
+# in a separate process, which takes a processing delay per command, and writes the time and CPU time of each case as JSON.
+#
+# Usage:
+#   python scripts/benchmarks/async_client_benchmark.py --instances 10 100 300 --steps 20 --command-delay 0.005
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import platform
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import perf_counter, process_time
+
+from pycmo.lib.protocol import AsyncClient, Client, BATCH_COMMAND, BATCH_FOOTER
+
+BATCH_COMMAND_START = BATCH_COMMAND.split("{}")[0].encode()
+
+async def serve_instances(instances:int, command_delay:float, ports) -> None:
+    # a stand-in Lua console per instance, which answers every batch of commands with a framed "ok" per command
+    async def handle(reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                script = await reader.readuntil(BATCH_FOOTER.encode())
+                command_count = script.count(BATCH_COMMAND_START)
+                await asyncio.sleep(command_count * command_delay)
+                writer.write(b"2\nok" * command_count)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    servers = [await asyncio.start_server(handle, "127.0.0.1", 0) for _ in range(instances)]
+    ports.send([server.sockets[0].getsockname()[1] for server in servers])
+    await asyncio.Event().wait() # until the process is terminated
+
+def run_servers(instances:int, command_delay:float, ports) -> None:
+    asyncio.run(serve_instances(instances, command_delay, ports))
+
+def run_threads(ports:list[int], steps:int, commands:list[str]) -> None:
+    def drive(port:int) -> None:
+        client = Client(host="127.0.0.1", port=port, framing="length")
+        client.connect()
+        for _ in range(steps):
+            client.send_batch(commands)
+        client.end_connection()
+    with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+        list(executor.map(drive, ports))
+
+def run_async(ports:list[int], steps:int, commands:list[str]) -> None:
+    async def drive(port:int) -> None:
+        client = AsyncClient(host="127.0.0.1", port=port, framing="length")
+        await client.connect()
+        for _ in range(steps):
+            await client.send_batch(commands)
+        await client.end_connection()
+    async def drive_all() -> None:
+        await asyncio.gather(*(drive(port) for port in ports))
+    asyncio.run(drive_all())
+
+CASES = {"threads": run_threads, "async": run_async}
+
+def run_case(case:str, ports:list[int], steps:int, commands:list[str]) -> dict:
+    peak_threads = threading.active_count()
+    start, start_cpu = perf_counter(), process_time()
+    stop = threading.Event()
+    def watch_threads() -> None:
+        nonlocal peak_threads
+        while not stop.wait(0.01):
+            peak_threads = max(peak_threads, threading.active_count())
+    watcher = threading.Thread(target=watch_threads, daemon=True)
+    watcher.start()
+    CASES[case](ports, steps, commands)
+    elapsed, cpu = perf_counter() - start, process_time() - start_cpu
+    stop.set()
+    watcher.join()
+    return {
+        "case": case,
+        "instances": len(ports),
+        "steps": steps,
+        "time_s": elapsed,
+        "cpu_s": cpu,
+        "steps_per_s": len(ports) * steps / elapsed,
+        "peak_threads": peak_threads - 1, # without the watcher
+    }
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Benchmark AsyncClient against a thread per instance with Client.")
+    arg_parser.add_argument("--instances", type=int, nargs="+", default=[10, 100, 300], help="the numbers of simulated instances of the game.")
+    arg_parser.add_argument("--steps", type=int, default=20, help="the number of steps that each instance runs.")
+    arg_parser.add_argument("--commands", type=int, default=3, help="the number of commands in the batch of each step.")
+    arg_parser.add_argument("--command-delay", type=float, default=0.005, help="the simulated time that an instance takes to run each command, in seconds.")
+    arg_parser.add_argument("--cases", nargs="+", default=list(CASES.keys()), choices=list(CASES.keys()))
+    arg_parser.add_argument("--output", default=None, help="the JSON file to write the results to. Defaults to stdout.")
+    args = arg_parser.parse_args()
+
+    commands = [f"return {command_idx}" for command_idx in range(args.commands)]
+    results = []
+    for instances in args.instances:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        server = multiprocessing.Process(target=run_servers, args=(instances, args.command_delay, sender), daemon=True)
+        server.start()
+        ports = receiver.recv()
+        for case in args.cases:
+            result = run_case(case, ports, args.steps, commands)
+            results.append(result)
+            print(f"{instances} instances, {case}: {result['time_s']:.3f}s, {result['cpu_s']:.3f}s CPU, {result['peak_threads']} threads", file=sys.stderr)
+        server.terminate()
+        server.join()
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "steps": args.steps,
+        "commands": args.commands,
+        "command_delay_s": args.command_delay,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
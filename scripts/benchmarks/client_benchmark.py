@@ -0,0 +1,74 @@
+# Purpose: Benchmark the latency of sending the commands of an environment step to the game one at a time and as a batch.
+# Runs the stand-in for the game's TCP server (see pycmo.lib.stand_in_server), which waits for a simulated network round
+# trip per message and for a processing delay per command, and writes the latency of each case as JSON.
+#
+# Usage:
+#   python scripts/benchmarks/client_benchmark.py --batch-sizes 1 3 5 10 --round-trip-delay 0.002 --command-delay 0.001
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+from datetime import datetime, timezone
+from time import perf_counter
+
+from pycmo.lib.protocol import Client
+from pycmo.lib.stand_in_server import StandInServer
+
+def run_case(port:int, batch_size:int, batched:bool, repeat:int) -> dict:
+    client = Client(port=port, framing="length")
+    client.connect()
+    commands = [f"return {command_idx}" for command_idx in range(batch_size)]
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        if batched:
+            client.send_batch(commands)
+        else:
+            for command in commands:
+                client.send_batch([command])
+        times.append(perf_counter() - start)
+    client.end_connection()
+    return {
+        "batch_size": batch_size,
+        "batched": batched,
+        "time_s": {"median": statistics.median(times), "min": min(times), "max": max(times)},
+    }
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Benchmark sending the commands of a step one at a time and as a batch.")
+    arg_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 3, 5, 10], help="the numbers of commands per step.")
+    arg_parser.add_argument("--round-trip-delay", type=float, default=0.002, help="the simulated network round trip of each message, in seconds.")
+    arg_parser.add_argument("--command-delay", type=float, default=0.001, help="the simulated time that the game takes to run each command, in seconds.")
+    arg_parser.add_argument("--repeat", type=int, default=20, help="the number of timed steps per case.")
+    arg_parser.add_argument("--output", default=None, help="the JSON file to write the results to. Defaults to stdout.")
+    args = arg_parser.parse_args()
+
+    server = StandInServer(round_trip_delay=args.round_trip_delay, command_delay=args.command_delay)
+    results = []
+    for batch_size in args.batch_sizes:
+        for batched in (False, True):
+            result = run_case(server.port, batch_size, batched, args.repeat)
+            results.append(result)
+            print(f"{batch_size} commands {'batched' if batched else 'one at a time'}: {result['time_s']['median'] * 1000:.2f}ms", file=sys.stderr)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "round_trip_delay_s": args.round_trip_delay,
+        "command_delay_s": args.command_delay,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
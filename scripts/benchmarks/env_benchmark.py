@@ -0,0 +1,108 @@
+# Purpose: Benchmark the step latency of CPEEnv against the stand-in for the game's TCP server (see
+# pycmo.lib.stand_in_server), with commands sent one at a time or in batches and observations returned through step
+# files or in the responses. The stand-in runs each step and exports each observation with configurable delays, and
+# the time of each step is written as JSON.
+#
+# Usage:
+#   python scripts/benchmarks/env_benchmark.py --files scen.xml --steps 20 --run-delay 0.05
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+from datetime import datetime, timezone
+from time import perf_counter, process_time
+
+from pycmo.env.cmo_env import CPEEnv
+from pycmo.lib.protocol import Client
+from pycmo.lib.stand_in_server import StandInScenario, StandInServer
+from pycmo.lib.tools import ticks_to_unix
+
+PYCMO_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+CASES = {
+    "file": dict(batch_commands=False, observation_transport="file"),
+    "batched-file": dict(batch_commands=True, observation_transport="file"),
+    "batched-socket": dict(batch_commands=True, observation_transport="socket"),
+}
+
+def run_case(case:str, xml_file:str, side:str, steps:int, parser:str, args:argparse.Namespace) -> dict:
+    scenario = StandInScenario(xml_file, run_delay=args.run_delay, export_delay=args.export_delay)
+    step_dest = tempfile.mkdtemp(prefix="pycmo-env-benchmark-")
+    with StandInServer(scenario, round_trip_delay=args.round_trip_delay, command_delay=args.command_delay) as server:
+        client = Client(port=server.port, framing="length" if CASES[case]["batch_commands"] else None)
+        client.connect()
+        env = CPEEnv(step_dest + os.sep, ["0", "1", "0"], side, os.path.join(step_dest, "scen_ended.txt"), parser=parser, client=client, **CASES[case])
+        timestep = env.reset()
+        times = []
+        start_cpu = process_time()
+        for step_id in range(1, steps + 1):
+            start = perf_counter()
+            timestep = env.step(ticks_to_unix(timestep.observation.meta.Time), step_id, action="--script \nTool_EmulateNoConsole(true)")
+            times.append(perf_counter() - start)
+        cpu = process_time() - start_cpu
+        env.close()
+        commands = len(server.commands)
+    shutil.rmtree(step_dest, ignore_errors=True)
+    return {
+        "case": case,
+        "file": os.path.basename(xml_file),
+        "size_bytes": os.path.getsize(xml_file),
+        "parser": parser,
+        "steps": steps,
+        "step_time_s": {"median": statistics.median(times), "min": min(times), "max": max(times)},
+        "cpu_s_per_step": cpu / steps,
+        "commands_per_step": commands / (steps + 1), # with the first observation
+    }
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Benchmark the steps of CPEEnv against the stand-in for the game's TCP server.")
+    arg_parser.add_argument("--files", nargs="+", default=["scen.xml"], help="the scenario xml files in xml/ to synthesize observations from.")
+    arg_parser.add_argument("--side", default=None, help="the player side. Defaults to the first side of each scenario.")
+    arg_parser.add_argument("--steps", type=int, default=20, help="the number of timed steps per case.")
+    arg_parser.add_argument("--parser", default="stream", choices=["xmltodict", "stream"])
+    arg_parser.add_argument("--run-delay", type=float, default=0.0, help="the simulated time that the game takes to run each step, in seconds.")
+    arg_parser.add_argument("--export-delay", type=float, default=0.0, help="the simulated time that the game takes to export each observation, in seconds.")
+    arg_parser.add_argument("--round-trip-delay", type=float, default=0.001, help="the simulated network round trip of each message, in seconds.")
+    arg_parser.add_argument("--command-delay", type=float, default=0.0, help="the simulated time that the game takes to run each command, in seconds.")
+    arg_parser.add_argument("--cases", nargs="+", default=list(CASES.keys()), choices=list(CASES.keys()))
+    arg_parser.add_argument("--output", default=None, help="the JSON file to write the results to. Defaults to stdout.")
+    args = arg_parser.parse_args()
+
+    results = []
+    for file_name in args.files:
+        xml_file = os.path.join(PYCMO_PATH, 'xml', file_name)
+        side = args.side
+        if side is None:
+            with open(xml_file, 'r', encoding='utf-8') as f:
+                xml = f.read()
+            sides = xml.index('<Sides>')
+            side = xml[xml.index('<Name>', sides) + len('<Name>'):xml.index('</Name>', sides)]
+        for case in args.cases:
+            result = run_case(case, xml_file, side, args.steps, args.parser, args)
+            results.append(result)
+            print(f"{file_name}, {case}: {result['step_time_s']['median'] * 1000:.1f}ms per step, {result['cpu_s_per_step'] * 1000:.1f}ms CPU", file=sys.stderr)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "run_delay_s": args.run_delay,
+        "export_delay_s": args.export_delay,
+        "round_trip_delay_s": args.round_trip_delay,
+        "command_delay_s": args.command_delay,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# Purpose: Benchmark the CPU time that idle CMOEnv environments use while they wait for the game, with the waits of
+# CMOEnv.step spinning as they used to or sleeping on a file watcher (see pycmo.lib.file_watcher). Each simulated
+# environment runs the wait of CMOEnv.step in a thread: it checks the scenario ended file through an ObservationCache and
+# a stand-in for the popup checks of SteamClient, which sleeps for the delays in SteamClientProps like the real checks
+# but never finds a popup, until the scenario ended file says that the scenario has ended. Writes the CPU time per
+# environment while they are idle, and how long they take to notice the ended file, as JSON.
+#
+# Usage:
+#   python scripts/benchmarks/idle_env_benchmark.py --envs 1 8 32 --duration 2
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone
+from time import perf_counter, process_time, sleep
+
+from pycmo.lib.file_watcher import create_file_watcher, inotify_available
+from pycmo.lib.observation_cache import ObservationCache
+from pycmo.lib.protocol import SteamClientProps
+from pycmo.lib.tools import cmo_steam_observation_to_xml
+
+WATCHERS = ["spin", "polling", "inotify"]
+SCEN_ENDED = '{{\n  "DB_ID": 0,\n  "Name": "",\n  "Comments": "{}",\n  "Template": false\n}}\n'
+
+def write_scen_ended(path:str, ended:bool) -> None:
+    with open(path, 'w') as f:
+        f.write(SCEN_ENDED.format("true" if ended else "false"))
+
+def create_window_exists(props:SteamClientProps):
+    # SteamClient.window_exists without the game: sleeps for the delay of the popup, and never finds it
+    delays = {
+        "Incoming message": props.check_window_delay_scenario_paused_popup,
+        "Scenario End": props.check_window_delay_scenario_end_popup,
+    }
+    def window_exists(window_name:str) -> bool:
+        sleep(delays[window_name])
+        return False
+    return window_exists
+
+def wait_for_game(scen_ended_path:str, observation_path:str, watcher:str, woken:list[float], env_idx:int) -> None:
+    # the wait of CMOEnv.step while the game runs a step, which only the scenario ended file ends here
+    file_watcher = create_file_watcher([observation_path, scen_ended_path], watcher) if watcher != "spin" else None
+    scen_ended_cache = ObservationCache(max_size=1)
+    props = SteamClientProps(scenario_name="idle_env_benchmark")
+    window_exists = create_window_exists(props)
+    check_game_ended = lambda: scen_ended_cache.get(scen_ended_path, cmo_steam_observation_to_xml) == "true" or window_exists("Scenario End")
+    while not (check_game_ended() or window_exists("Incoming message")):
+        if file_watcher is not None:
+            file_watcher.wait(timeout=props.check_window_delay_scenario_paused_popup)
+    woken[env_idx] = perf_counter()
+    if file_watcher is not None:
+        file_watcher.close()
+
+def run_case(watcher:str, envs:int, duration:float) -> dict:
+    folder = tempfile.mkdtemp(prefix="pycmo-idle-env-benchmark-")
+    scen_ended_paths = [os.path.join(folder, f"{env_idx}_scen_has_ended.inst") for env_idx in range(envs)]
+    for path in scen_ended_paths:
+        write_scen_ended(path, False)
+    woken = [0.0] * envs
+    threads = [threading.Thread(target=wait_for_game, args=(scen_ended_paths[env_idx], os.path.join(folder, f"{env_idx}_observation.inst"), watcher, woken, env_idx), daemon=True) for env_idx in range(envs)]
+    for thread in threads:
+        thread.start()
+    sleep(0.5) # let the watchers back off
+    start, start_cpu = perf_counter(), process_time()
+    sleep(duration)
+    cpu = process_time() - start_cpu
+    elapsed = perf_counter() - start
+    ended = perf_counter()
+    for path in scen_ended_paths:
+        write_scen_ended(path, True)
+    for thread in threads:
+        thread.join()
+    shutil.rmtree(folder, ignore_errors=True)
+    latencies = [wake - ended for wake in woken]
+    return {
+        "watcher": watcher,
+        "envs": envs,
+        "idle_time_s": elapsed,
+        "cpu_s": cpu,
+        "cpu_per_env": cpu / elapsed / envs, # the fraction of a core that each idle environment uses
+        "wake_latency_s": {"median": statistics.median(latencies), "max": max(latencies)},
+    }
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Benchmark the CPU time of idle environments waiting for the game.")
+    arg_parser.add_argument("--envs", type=int, nargs="+", default=[1, 8, 32], help="the numbers of idle environments.")
+    arg_parser.add_argument("--duration", type=float, default=2.0, help="how long the environments are idle for, in seconds.")
+    arg_parser.add_argument("--watchers", nargs="+", default=WATCHERS, choices=WATCHERS, help="how the environments wait: spinning, or on a file watcher.")
+    arg_parser.add_argument("--output", default=None, help="the JSON file to write the results to. Defaults to stdout.")
+    args = arg_parser.parse_args()
+
+    results = []
+    for envs in args.envs:
+        for watcher in args.watchers:
+            if watcher == "inotify" and not inotify_available():
+                print(f"Skipping {watcher}, which is not available on this platform.", file=sys.stderr)
+                continue
+            result = run_case(watcher, envs, args.duration)
+            results.append(result)
+            print(f"{envs} envs, {watcher}: {result['cpu_per_env'] * 100:.2f}% of a core per env, woken after {result['wake_latency_s']['median'] * 1000:.1f}ms", file=sys.stderr)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "duration_s": args.duration,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+# Purpose: Benchmark the construction of Features and FeaturesFromSteam over the scenario xml corpus.
+# Measures time, peak RSS and allocations per file, per player side and per parser, and the time and peak allocations of
+# each section (parse, meta, units, side, contacts), and writes the results as JSON so that runs from different commits
+# can be compared on time and memory.
+#
+# Usage:
+#   python scripts/benchmarks/parser_benchmark.py --output results.json
+#   python scripts/benchmarks/parser_benchmark.py --files shamal.xml --parsers stream --baseline results.json
+
+import argparse
+import fnmatch
+import gc
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from time import perf_counter
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from pycmo.lib.features import Features, FeaturesFromSteam, LazyFeatures, LazyFeaturesFromSteam, LazyList
+
+PYCMO_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+FEATURES_CLASSES = {
+    "Features": (Features, LazyFeatures),
+    "FeaturesFromSteam": (FeaturesFromSteam, LazyFeaturesFromSteam),
+}
+SECTIONS = ["parse", "meta", "units", "side", "contacts"]
+MEMORY_MEASURES = ["alloc_peak_bytes", "retained_bytes", "peak_rss_delta_bytes"] # compared with the baseline, like the time
+
+def get_sides(xml_file:str) -> list[str]:
+    sides = ET.parse(xml_file).getroot().find('Sides')
+    if sides is None:
+        return []
+    return [side.findtext('Name') for side in sides]
+
+def get_peak_rss() -> int | None:
+    """
+    Description:
+        Return the peak resident set size of the current process in bytes, or None if it cannot be measured.
+    """
+    if resource is not None:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+    if psutil is not None:
+        return getattr(psutil.Process().memory_info(), "peak_wset", None)
+    return None
+
+def get_current_rss() -> int | None:
+    """
+    Description:
+        Return the resident set size of the current process in bytes, or None if it cannot be measured.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def get_input(xml_file:str, class_name:str) -> str:
+    # Features reads the file itself, FeaturesFromSteam gets the xml that was exported into the observation file
+    if class_name == "FeaturesFromSteam":
+        with open(xml_file, 'r', encoding='utf-8') as f:
+            return f.read()
+    return xml_file
+
+def construct(features_class:type, xml_input:str, side:str, parser:str) -> str | None:
+    # returns the name of the error raised while building the features, if any
+    try:
+        features_class(xml_input, side, parser=parser)
+    except Exception as error: # the corpus has files that Features cannot parse
+        return type(error).__name__
+    return None
+
+def read_section(features:LazyFeatures, section:str) -> None:
+    section_value = getattr(features, section + "_" if section == "side" else section)
+    if section in ("units", "contacts"):
+        for entity in section_value: # materialize lazy mounts and weapons
+            for value in entity:
+                if isinstance(value, LazyList):
+                    value.materialize()
+
+def time_sections(xml_input:str, side:str, class_name:str, parser:str) -> tuple[dict[str, float], dict[str, str]]:
+    # LazyFeatures only parse on construction, so each section can be timed on its own
+    _, lazy_features_class = FEATURES_CLASSES[class_name]
+    times = {}
+    errors = {}
+    start = perf_counter()
+    features = lazy_features_class(xml_input, side, parser=parser)
+    times["parse"] = perf_counter() - start
+    for section in SECTIONS[1:]:
+        start = perf_counter()
+        try:
+            read_section(features, section)
+        except Exception as error:
+            errors[section] = type(error).__name__
+            continue
+        times[section] = perf_counter() - start
+    return times, errors
+
+def measure_time(xml_file:str, side:str, class_name:str, parser:str, repeat:int, error:str | None) -> dict:
+    features_class, _ = FEATURES_CLASSES[class_name]
+    xml_input = get_input(xml_file, class_name)
+    totals = []
+    sections = {section: [] for section in SECTIONS}
+    section_errors = {}
+    for _ in range(repeat):
+        if error is None:
+            gc.collect()
+            start = perf_counter()
+            features_class(xml_input, side, parser=parser)
+            totals.append(perf_counter() - start)
+        gc.collect()
+        section_times, section_errors = time_sections(xml_input, side, class_name, parser)
+        for section, section_time in section_times.items():
+            sections[section].append(section_time)
+    return {
+        "time_s": {"min": min(totals), "median": statistics.median(totals), "max": max(totals)} if totals else None,
+        "section_time_s": {section: statistics.median(section_times) if section_times else None for section, section_times in sections.items()},
+        "section_errors": section_errors,
+    }
+
+def measure_allocations(xml_file:str, side:str, class_name:str, parser:str) -> dict:
+    # the peak allocations of the whole construction, then of each section of LazyFeatures on its own, above what was
+    # allocated before the section
+    features_class, lazy_features_class = FEATURES_CLASSES[class_name]
+    xml_input = get_input(xml_file, class_name)
+    sections = {}
+    gc.collect()
+    tracemalloc.start()
+    try:
+        construct(features_class, xml_input, side, parser)
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        features = lazy_features_class(xml_input, side, parser=parser)
+        sections["parse"] = tracemalloc.get_traced_memory()[1] - start
+        for section in SECTIONS[1:]:
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0] # the sections already read stay allocated
+            try:
+                read_section(features, section)
+            except Exception: # reported in section_errors
+                continue
+            sections[section] = tracemalloc.get_traced_memory()[1] - start
+        del features
+    finally:
+        tracemalloc.stop()
+    return {
+        "alloc_peak_bytes": peak,
+        "section_alloc_peak_bytes": {section: sections.get(section) for section in SECTIONS},
+    }
+
+def measure_retained(xml_file:str, side:str, class_name:str, parser:str) -> dict:
+    # the memory held by the features once built
+    features_class, _ = FEATURES_CLASSES[class_name]
+    xml_input = get_input(xml_file, class_name)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        features = features_class(xml_input, side, parser=parser)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = [stat for stat in after.compare_to(before, 'filename') if stat.size_diff > 0]
+    del features
+    return {
+        "retained_bytes": sum(stat.size_diff for stat in retained),
+        "retained_blocks": sum(stat.count_diff for stat in retained),
+    }
+
+def measure_rss_in_process(xml_file:str, side:str, class_name:str, parser:str) -> dict:
+    # runs in a fresh process so that the peak only covers this construction
+    logging.disable(logging.WARNING)
+    features_class, _ = FEATURES_CLASSES[class_name]
+    xml_input = get_input(xml_file, class_name)
+    gc.collect()
+    rss_before = get_current_rss()
+    construct(features_class, xml_input, side, parser)
+    peak_rss = get_peak_rss()
+    return {
+        "rss_before_bytes": rss_before,
+        "peak_rss_bytes": peak_rss,
+        "peak_rss_delta_bytes": max(peak_rss - rss_before, 0) if peak_rss is not None and rss_before is not None else None,
+    }
+
+def measure_rss(xml_file:str, side:str, class_name:str, parser:str) -> dict:
+    with multiprocessing.get_context("spawn").Pool(processes=1, maxtasksperchild=1) as pool:
+        return pool.apply(measure_rss_in_process, (xml_file, side, class_name, parser))
+
+def run_case(xml_file:str, side:str, class_name:str, parser:str, repeat:int, rss:bool) -> dict:
+    """
+    Description:
+        Benchmark one combination of file, player side, Features class and parser.
+        Cases that fail to build are still timed section by section, so that the parse of every file is measured.
+
+    Keyword Arguments:
+        xml_file: the path to the scenario xml.
+        side: the player side.
+        class_name: "Features" or "FeaturesFromSteam".
+        parser: "xmltodict" or "stream".
+        repeat: the number of timed constructions.
+        rss: whether to measure the peak RSS in a separate process.
+
+    Returns:
+        (dict) the measurements.
+    """
+    features_class, _ = FEATURES_CLASSES[class_name]
+    result = {
+        "file": os.path.basename(xml_file),
+        "file_bytes": os.path.getsize(xml_file),
+        "side": side,
+        "class": class_name,
+        "parser": parser,
+        "error": None,
+    }
+    try:
+        features = features_class(get_input(xml_file, class_name), side, parser=parser)
+        result["units"] = len(features.units)
+        result["contacts"] = len(features.contacts)
+        del features
+    except Exception as error: # the corpus has files that Features cannot parse
+        result["error"] = type(error).__name__
+    result.update(measure_time(xml_file, side, class_name, parser, repeat, result["error"]))
+    result.update(measure_allocations(xml_file, side, class_name, parser))
+    if result["error"] is None:
+        result.update(measure_retained(xml_file, side, class_name, parser))
+    if rss:
+        result.update(measure_rss(xml_file, side, class_name, parser))
+    return result
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=PYCMO_PATH, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results:list[dict], baseline:list[dict], threshold:float) -> list[str]:
+    """
+    Description:
+        Compare the median construction times, the peak allocations, the retained memory and the peak RSS of two runs.
+
+    Keyword Arguments:
+        results: the results of the current run.
+        baseline: the results of the baseline run.
+        threshold: the ratio of current to baseline time or memory above which a case is reported as a regression.
+
+    Returns:
+        (list) one message per regression.
+    """
+    key = lambda result: (result["file"], result["side"], result["class"], result["parser"])
+    baseline_results = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        baseline_result = baseline_results.get(key(result))
+        if baseline_result is None:
+            continue
+        if baseline_result["error"] is None and result["error"] is not None:
+            regressions.append(f"{key(result)}: now fails with {result['error']}")
+            continue
+        if baseline_result["error"] is None:
+            measure, baseline_time, current_time = "construction", baseline_result["time_s"]["median"], result["time_s"]["median"]
+        else: # only the parse is comparable
+            measure, baseline_time, current_time = "parse", baseline_result["section_time_s"]["parse"], result["section_time_s"]["parse"]
+        ratio = current_time / baseline_time
+        if ratio > threshold:
+            regressions.append(f"{key(result)}: {measure} {ratio:.2f}x slower ({baseline_time:.4f}s -> {current_time:.4f}s)")
+        for memory in MEMORY_MEASURES:
+            baseline_bytes, current_bytes = baseline_result.get(memory), result.get(memory)
+            if not baseline_bytes or current_bytes is None: # not measured in one of the runs, e.g. with --no-rss
+                continue
+            ratio = current_bytes / baseline_bytes
+            if ratio > threshold:
+                regressions.append(f"{key(result)}: {memory} {ratio:.2f}x larger ({baseline_bytes} -> {current_bytes} bytes)")
+    return regressions
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Benchmark Features construction over the scenario xml corpus.")
+    arg_parser.add_argument("--xml-dir", default=os.path.join(PYCMO_PATH, "xml"), help="the folder containing the scenario xml files.")
+    arg_parser.add_argument("--files", nargs="+", default=["*.xml"], help="glob patterns of the files to benchmark.")
+    arg_parser.add_argument("--sides", nargs="+", default=None, help="the player sides to benchmark. Defaults to every side of each file.")
+    arg_parser.add_argument("--parsers", nargs="+", default=["xmltodict", "stream"], choices=["xmltodict", "stream"])
+    arg_parser.add_argument("--classes", nargs="+", default=list(FEATURES_CLASSES.keys()), choices=list(FEATURES_CLASSES.keys()))
+    arg_parser.add_argument("--repeat", type=int, default=3, help="the number of timed constructions per case.")
+    arg_parser.add_argument("--no-rss", action="store_true", help="skip the peak RSS measurement, which starts a process per case.")
+    arg_parser.add_argument("--output", default=None, help="the JSON file to write the results to. Defaults to stdout.")
+    arg_parser.add_argument("--baseline", default=None, help="a JSON file from a previous run to compare against.")
+    arg_parser.add_argument("--threshold", type=float, default=1.2, help="the slowdown ratio reported as a regression.")
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.WARNING) # the corpus has units that Features cannot parse
+    xml_files = sorted(xml_file for xml_file in glob.glob(os.path.join(args.xml_dir, "*.xml"))
+                       if any(fnmatch.fnmatch(os.path.basename(xml_file), pattern) for pattern in args.files))
+    results = []
+    for xml_file in xml_files:
+        sides = [side for side in get_sides(xml_file) if args.sides is None or side in args.sides]
+        for side in sides:
+            for class_name in args.classes:
+                for parser in args.parsers:
+                    result = run_case(xml_file, side, class_name, parser, args.repeat, not args.no_rss)
+                    results.append(result)
+                    if result["error"] is None:
+                        summary = f"{result['time_s']['median']:.4f}s"
+                    else:
+                        summary = f"{result['error']}, parse {result['section_time_s']['parse']:.4f}s"
+                    print(f"{result['file']} [{side}] {class_name} {parser}: {summary}", file=sys.stderr)
+
+    report = {
+        "commit": get_commit(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,18 +19,10 @@ class ScriptedAgent(BaseAgent):
         self.state = 0
 
     def get_unit_info_from_observation(self, features: FeaturesFromSteam, unit_name:str) -> Unit:
-        units = features.units
-        for unit in units:
-            if unit.Name == unit_name:
-                return unit
-        return None
+        return features.get_unit_by_name(unit_name)
             
     def get_contact_info_from_observation(self, features: FeaturesFromSteam, contact_name:str) -> Contact:
-        contacts = features.contacts
-        for contact in contacts:
-            if contact.Name == contact_name:
-                return contact
-        return None
+        return features.get_contact_by_name(contact_name)
 
     def action(self, features: FeaturesFromSteam, VALID_FUNCTIONS:AvailableFunctions) -> str:
         action = ""
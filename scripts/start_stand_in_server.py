@@ -0,0 +1,35 @@
+# Purpose: Start the stand-in for the game's TCP server (see pycmo.lib.stand_in_server), e.g. on the port that CPEEnv
+# and run_loop connect to by default, to run agents without the game.
+#
+# Usage:
+#   python scripts/start_stand_in_server.py --xml xml/scen.xml --port 7777 --run-delay 0.5
+
+import argparse
+import sys
+import threading
+
+from pycmo.lib.stand_in_server import StandInScenario, StandInServer
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Start the stand-in for the game's TCP server.")
+    arg_parser.add_argument("--xml", default=None, help="the scenario xml to synthesize observations from. Defaults to xml/scen.xml.")
+    arg_parser.add_argument("--replay", nargs="+", default=None, help="recorded observations to return in order instead.")
+    arg_parser.add_argument("--host", default="localhost")
+    arg_parser.add_argument("--port", type=int, default=7777)
+    arg_parser.add_argument("--run-delay", type=float, default=0.0, help="the time that the game takes to run each step, in seconds.")
+    arg_parser.add_argument("--export-delay", type=float, default=0.0, help="the time that the game takes to export each observation, in seconds.")
+    arg_parser.add_argument("--command-delay", type=float, default=0.0, help="the time that the game takes to run each command, in seconds.")
+    arg_parser.add_argument("--duration", type=int, default=None, help="the duration of the scenario in seconds. Defaults to the duration in the scenario xml.")
+    args = arg_parser.parse_args()
+
+    scenario = StandInScenario(args.xml, replay_files=args.replay, run_delay=args.run_delay, export_delay=args.export_delay, duration=args.duration)
+    server = StandInServer(scenario, host=args.host, port=args.port, command_delay=args.command_delay)
+    print(f"Stand-in server listening on {server.host}:{server.port}", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
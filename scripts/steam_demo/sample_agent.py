@@ -15,11 +15,7 @@ class RandomAgent(BaseAgent):
         self.ac_name = ac_name
 
     def get_unit_info_from_observation(self, features: FeaturesFromSteam, unit_name:str) -> Unit:
-        units = features.units
-        for unit in units:
-            if unit.Name == unit_name:
-                return unit
-        return None
+        return features.get_unit_by_name(unit_name)
 
     def action(self, features: FeaturesFromSteam, VALID_FUNCTIONS:AvailableFunctions) -> str:
         action = ""
@@ -0,0 +1,201 @@
+-- A stand-in for the parts of the Command Lua API (ScenEdit_*, VP_*) that pycmo_lib.lua uses, backed by a generated
+-- scenario, so that the exporter can run under a stock Lua interpreter. Exported files are kept in ExportedFiles and
+-- the number of calls to each API function in ApiCalls.
+
+ExportedFiles = {}
+ApiCalls = {}
+
+local scenario = nil
+local sides = {}
+local units_by_guid = {}
+local loadouts_by_unit_name = {}
+local contacts_by_side = {}
+
+local function count_call(name)
+    ApiCalls[name] = (ApiCalls[name] or 0) + 1
+end
+
+-- a Park-Miller generator, so that the scenario is the same under every Lua version
+local random_state = 1
+local function random(n)
+    random_state = (random_state * 16807) % 2147483647
+    return random_state % n
+end
+
+local function make_weapons(prefix, count)
+    local weapons = {}
+    for weapon_idx = 1, count do
+        local weapon = {wpn_guid = prefix .. '-w' .. weapon_idx, wpn_dbid = 100 + random(900)}
+        if random(4) > 0 then
+            weapon.wpn_maxcap = 1 + random(8)
+            weapon.wpn_current = random(weapon.wpn_maxcap + 1)
+        end
+        weapons[weapon_idx] = weapon
+    end
+    return weapons
+end
+
+local function make_unit(side, unit_idx)
+    local guid = side.guid .. '-u' .. unit_idx
+    local unit_types = {'Aircraft', 'Ship', 'Facility', 'Submarine', 'Aircraft'}
+    local unit = {
+        guid = guid,
+        dbid = 1000 + random(9000),
+        name = side.name .. ' unit #' .. unit_idx,
+        side = side.name,
+        type = unit_types[1 + random(#unit_types)],
+        classname = 'Class ' .. random(50),
+        proficiency = 'Regular',
+        latitude = (random(180000) - 90000) / 1000,
+        longitude = (random(360000) - 180000) / 1000,
+        altitude = random(12000),
+        heading = random(3600) / 10,
+        speed = random(600),
+        throttle = 'Cruise',
+        fuelstate = 'None',
+        weaponstate = 'None',
+    }
+    if unit.type == 'Aircraft' then
+        unit.loadoutdbid = 5000 + random(1000)
+        loadouts_by_unit_name[unit.name] = {dbid = unit.loadoutdbid, name = 'Loadout ' .. unit.loadoutdbid, weapons = make_weapons(guid .. '-l', random(4))}
+    else
+        unit.mounts = {}
+        for mount_idx = 1, random(4) do
+            local mount = {mount_guid = guid .. '-m' .. mount_idx, mount_dbid = 200 + random(800), mount_name = 'Mount ' .. mount_idx, mount_status = 'Operational'}
+            if random(3) > 0 then
+                mount.mount_weapons = make_weapons(mount.mount_guid, random(3))
+            end
+            unit.mounts[mount_idx] = mount
+        end
+    end
+    local fuel_kind = random(4)
+    if fuel_kind > 0 then
+        unit.fuel = {}
+        for fuel_idx = 1, fuel_kind - 1 do -- no fuel records at all for some units
+            local fuel_type = 2000 + fuel_idx
+            local max_fuel = 1000 + random(50000)
+            unit.fuel[fuel_type] = {type = fuel_type, current = random(max_fuel), max = max_fuel}
+        end
+    end
+    return unit
+end
+
+local function make_contact(side, contact_idx)
+    local contact = {guid = side.guid .. '-c' .. contact_idx, name = 'Contact #' .. contact_idx, type = 'Air'}
+    if random(3) > 0 then
+        contact.altitude = random(12000)
+        contact.speed = random(600)
+    end
+    if random(5) > 0 then
+        contact.latitude = (random(180000) - 90000) / 1000
+        contact.longitude = (random(360000) - 180000) / 1000
+    end
+    return contact
+end
+
+-- Generates a scenario with `units_per_side` units and half as many contacts for each of `side_count` sides
+function CreateScenario(units_per_side, side_count, seed)
+    random_state = seed or 1
+    scenario = {
+        Title = 'Stand-in scenario', FileName = 'stand_in.scen', CurrentTimeNum = 1519552951, StartTimeNum = 1519552800,
+        DurationNum = 21600, SaveVersion = 1147, CampaignScore = 0, HasStarted = true, Status = 'Running',
+        TimeCompression = 0, GameStatus = 'Running',
+    }
+    sides = {}
+    units_by_guid = {}
+    loadouts_by_unit_name = {}
+    contacts_by_side = {}
+    for side_idx = 1, side_count or 2 do
+        local side = {guid = 'side-' .. side_idx, name = 'Side ' .. side_idx, units = {}, unit_count = units_per_side, contact_count = 0}
+        for unit_idx = 1, units_per_side do
+            local unit = make_unit(side, unit_idx)
+            units_by_guid[unit.guid] = unit
+            side.units[unit_idx] = {guid = unit.guid, name = unit.name}
+        end
+        local contacts = {}
+        for contact_idx = 1, math.floor(units_per_side / 2) do
+            contacts[contact_idx] = make_contact(side, contact_idx)
+        end
+        contacts_by_side[side.name] = contacts
+        side.contact_count = #contacts
+        sides[side_idx] = side
+    end
+end
+
+-- Moves some units and contacts, uses some weapons, and adds, removes and reorders a few units and contacts, as
+-- happens between two exports
+function AdvanceScenario()
+    scenario.CurrentTimeNum = scenario.CurrentTimeNum + 60
+    for side_idx = 1, #sides do
+        local side = sides[side_idx]
+        for side_unit_idx = 1, #side.units do
+            local unit = units_by_guid[side.units[side_unit_idx].guid]
+            if random(10) == 0 then
+                unit.latitude = unit.latitude + random(100) / 1000
+                unit.heading = random(3600) / 10
+            end
+            if random(20) == 0 and unit.mounts ~= nil and #unit.mounts > 0 and unit.mounts[1].mount_weapons ~= nil and #unit.mounts[1].mount_weapons > 0 then
+                local weapon = unit.mounts[1].mount_weapons[1]
+                if weapon.wpn_current ~= nil and weapon.wpn_current > 0 then weapon.wpn_current = weapon.wpn_current - 1 end
+            end
+        end
+        if #side.units > 0 and random(3) == 0 then
+            table.remove(side.units, 1 + random(#side.units))
+        end
+        if random(3) == 0 then
+            side.unit_count = side.unit_count + 1
+            local unit = make_unit(side, side.unit_count)
+            units_by_guid[unit.guid] = unit
+            table.insert(side.units, 1 + random(#side.units + 1), {guid = unit.guid, name = unit.name})
+        end
+
+        local contacts = contacts_by_side[side.name]
+        for contact_idx = 1, #contacts do
+            if random(5) == 0 and contacts[contact_idx].latitude ~= nil then
+                contacts[contact_idx].latitude = contacts[contact_idx].latitude - random(100) / 1000
+            end
+        end
+        if #contacts > 0 and random(3) == 0 then
+            table.remove(contacts, 1 + random(#contacts))
+        end
+        if random(3) == 0 then
+            side.contact_count = side.contact_count + 1
+            contacts[#contacts + 1] = make_contact(side, side.contact_count)
+        end
+    end
+end
+
+function VP_GetScenario()
+    count_call('VP_GetScenario')
+    return scenario
+end
+
+function VP_GetSides()
+    count_call('VP_GetSides')
+    return sides
+end
+
+function ScenEdit_GetScore(side_name)
+    count_call('ScenEdit_GetScore')
+    return #side_name * 10
+end
+
+function ScenEdit_GetContacts(side_name)
+    count_call('ScenEdit_GetContacts')
+    return contacts_by_side[side_name] or {}
+end
+
+function ScenEdit_GetUnit(selector)
+    count_call('ScenEdit_GetUnit')
+    return units_by_guid[selector.guid]
+end
+
+function ScenEdit_GetLoadout(selector)
+    count_call('ScenEdit_GetLoadout')
+    return loadouts_by_unit_name[selector.unitname]
+end
+
+function ScenEdit_ExportInst(side_name, units, options)
+    count_call('ScenEdit_ExportInst')
+    ExportedFiles[options.filename] = options.comment
+end
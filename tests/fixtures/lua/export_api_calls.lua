@@ -0,0 +1,51 @@
+-- Runs each export of a generated scenario and writes the number of calls to each API function that it made to
+-- stdout, as "0 <export>.calls <length>\n<contents>" records of "<function> <calls>" lines. With a version of
+-- pycmo_lib.lua that can count its own calls, every export is then run again with PycmoCountApiCalls set, and its
+-- report is written as "<export>.report". Only ScenEdit_ExportScenarioToXML is run with versions that do not have the
+-- other exports.
+-- Usage: lua export_api_calls.lua <units per side> <seed> <pycmo_lib.lua>
+
+local fixtures_folder = arg[0]:match('^(.*[/\\])') or './'
+dofile(fixtures_folder .. 'command_api.lua')
+
+local units_per_side = tonumber(arg[1])
+local seed = tonumber(arg[2])
+dofile(arg[3])
+local can_count_calls = RunExport ~= nil
+
+local function write_file(filename, contents)
+    io.write(0, ' ', filename, ' ', #contents, '\n', contents)
+end
+
+local function format_calls(calls)
+    local names = {}
+    for name in pairs(calls) do names[#names + 1] = name end
+    table.sort(names)
+    local lines = {}
+    for _, name in ipairs(names) do lines[#lines + 1] = name .. ' ' .. calls[name] end
+    return table.concat(lines, '\n')
+end
+
+local function export(name, ...)
+    if _G[name] == nil then return end
+    CreateScenario(units_per_side, 3, seed)
+    PycmoDeltaExport = {session = 'test', sequence = 0} -- every delta export is a keyframe
+    ApiCalls = {}
+    _G[name](...)
+    write_file(name .. '.calls', format_calls(ApiCalls))
+
+    if can_count_calls then
+        CreateScenario(units_per_side, 3, seed)
+        PycmoDeltaExport = {session = 'test', sequence = 0} -- every delta export is a keyframe
+        PycmoCountApiCalls = true
+        ExportedFiles = {}
+        _G[name](...)
+        PycmoCountApiCalls = false
+        write_file(name .. '.report', ExportedFiles['Stand-in scenario_api_calls.inst'])
+    end
+end
+
+export('ScenEdit_ExportScenarioToXML')
+export('ScenEdit_ExportScenarioToCompact')
+export('ScenEdit_ExportScenarioToShards', 20000)
+export('ScenEdit_ExportScenarioDeltaToXML', 10)
@@ -0,0 +1,31 @@
+-- Exports a generated scenario both as XML and in the compact format and writes the exported files to stdout, as
+-- "0 <file name> <length>\n<contents>" records. The exports are written as "xml.inst" and "compact.inst".
+-- Usage: lua export_compact.lua <units per side> <seed> <pycmo_lib.lua>
+
+local fixtures_folder = arg[0]:match('^(.*[/\\])') or './'
+dofile(fixtures_folder .. 'command_api.lua')
+
+local units_per_side = tonumber(arg[1])
+local seed = tonumber(arg[2])
+dofile(arg[3])
+
+local function write_file(filename, contents)
+    io.write(0, ' ', filename, ' ', #contents, '\n', contents)
+end
+
+CreateScenario(units_per_side, 3, seed)
+
+ExportedFiles = {}
+ScenEdit_ExportScenarioToXML()
+for _, contents in pairs(ExportedFiles) do
+    write_file('xml.inst', contents)
+end
+
+ExportedFiles = {}
+ScenEdit_ExportScenarioToCompact()
+for _, contents in pairs(ExportedFiles) do
+    write_file('compact.inst', contents)
+end
+
+-- the escaping of values
+write_file('escaped', BufferToString(AppendCompact, 'a|b\\p\nc\rd'))
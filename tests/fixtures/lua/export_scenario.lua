@@ -0,0 +1,32 @@
+-- Exports a generated scenario with each of the given versions of pycmo_lib.lua and writes the exported files to
+-- stdout, as "<library index> <file name> <length>\n<contents>" records.
+-- Usage: lua export_scenario.lua <units per side> <seed> <pycmo_lib.lua> [<pycmo_lib.lua> ...]
+
+local fixtures_folder = arg[0]:match('^(.*[/\\])') or './'
+dofile(fixtures_folder .. 'command_api.lua')
+
+local units_per_side = tonumber(arg[1])
+local seed = tonumber(arg[2])
+
+local function write_file(lib_idx, filename, contents)
+    io.write(lib_idx, ' ', filename, ' ', #contents, '\n', contents)
+end
+
+for lib_idx = 3, #arg do
+    CreateScenario(units_per_side, 3, seed)
+    ExportedFiles = {}
+    dofile(arg[lib_idx])
+    ScenEdit_ExportScenarioToXML()
+    ScenarioHasEnded(false)
+
+    local filenames = {}
+    for filename in pairs(ExportedFiles) do filenames[#filenames + 1] = filename end
+    table.sort(filenames)
+    for _, filename in ipairs(filenames) do
+        write_file(lib_idx - 2, filename, ExportedFiles[filename])
+    end
+    -- the helpers that return parts of the document as strings
+    write_file(lib_idx - 2, 'ExportSidesToXML', ExportSidesToXML())
+    write_file(lib_idx - 2, 'ExportUnitsToXML', ExportUnitsToXML())
+    write_file(lib_idx - 2, 'ExportContactsToXML', ExportContactsToXML('Side 1'))
+end
@@ -0,0 +1,32 @@
+-- Exports a generated scenario in shards and writes the exported files to stdout, as "0 <file name> <length>\n<contents>"
+-- records. The XML export of the same scenario is written as "full.inst".
+-- Usage: lua export_shards.lua <units per side> <seed> <max shard length> <pycmo_lib.lua>
+
+local fixtures_folder = arg[0]:match('^(.*[/\\])') or './'
+dofile(fixtures_folder .. 'command_api.lua')
+
+local units_per_side = tonumber(arg[1])
+local seed = tonumber(arg[2])
+local max_shard_length = tonumber(arg[3])
+dofile(arg[4])
+
+local function write_file(filename, contents)
+    io.write(0, ' ', filename, ' ', #contents, '\n', contents)
+end
+
+CreateScenario(units_per_side, 3, seed)
+
+ExportedFiles = {}
+ScenEdit_ExportScenarioToShards(max_shard_length)
+local filenames = {}
+for filename in pairs(ExportedFiles) do filenames[#filenames + 1] = filename end
+table.sort(filenames)
+for _, filename in ipairs(filenames) do
+    write_file(filename, ExportedFiles[filename])
+end
+
+ExportedFiles = {}
+ScenEdit_ExportScenarioToXML()
+for _, contents in pairs(ExportedFiles) do
+    write_file('full.inst', contents)
+end
@@ -0,0 +1,33 @@
+-- Exports a generated scenario in full and scoped to some sides, and writes the exported files to stdout, as
+-- "0 <file name> <length>\n<contents>" records. The exports are written as "full.inst", "xml.inst" (scoped XML) and
+-- "compact.inst" (scoped compact), and the number of calls to ScenEdit_GetUnit of each export as "<export>.calls".
+-- Usage: lua export_sides.lua <units per side> <seed> <pycmo_lib.lua> <side> [<side> ...]
+
+local fixtures_folder = arg[0]:match('^(.*[/\\])') or './'
+dofile(fixtures_folder .. 'command_api.lua')
+
+local units_per_side = tonumber(arg[1])
+local seed = tonumber(arg[2])
+dofile(arg[3])
+local side_names = {}
+for arg_idx = 4, #arg do side_names[#side_names + 1] = arg[arg_idx] end
+if #side_names == 1 then side_names = side_names[1] end -- a single side is passed by name
+
+local function write_file(filename, contents)
+    io.write(0, ' ', filename, ' ', #contents, '\n', contents)
+end
+
+local function export(filename, export_function, ...)
+    ExportedFiles = {}
+    ApiCalls = {}
+    export_function(...)
+    for _, contents in pairs(ExportedFiles) do
+        write_file(filename, contents)
+    end
+    write_file(filename .. '.calls', tostring(ApiCalls['ScenEdit_GetUnit'] or 0))
+end
+
+CreateScenario(units_per_side, 3, seed)
+export('full.inst', ScenEdit_ExportScenarioToXML)
+export('xml.inst', ScenEdit_ExportScenarioToXML, side_names)
+export('compact.inst', ScenEdit_ExportScenarioToCompact, side_names)
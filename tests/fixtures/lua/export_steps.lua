@@ -0,0 +1,36 @@
+-- Advances a generated scenario step by step and, at each step, writes both the delta export and the full export to
+-- stdout, as "<step> <file name> <length>\n<contents>" records. The full export is written as "full.inst".
+-- Usage: lua export_steps.lua <units per side> <seed> <steps> <keyframe interval> <pycmo_lib.lua>
+
+local fixtures_folder = arg[0]:match('^(.*[/\\])') or './'
+dofile(fixtures_folder .. 'command_api.lua')
+
+local units_per_side = tonumber(arg[1])
+local seed = tonumber(arg[2])
+local steps = tonumber(arg[3])
+local keyframe_interval = tonumber(arg[4])
+dofile(arg[5])
+
+local function write_file(step, filename, contents)
+    io.write(step, ' ', filename, ' ', #contents, '\n', contents)
+end
+
+CreateScenario(units_per_side, 3, seed)
+for step = 1, steps do
+    if step > 1 then AdvanceScenario() end
+
+    ExportedFiles = {}
+    ScenEdit_ExportScenarioDeltaToXML(keyframe_interval)
+    local filenames = {}
+    for filename in pairs(ExportedFiles) do filenames[#filenames + 1] = filename end
+    table.sort(filenames)
+    for _, filename in ipairs(filenames) do
+        write_file(step, filename, ExportedFiles[filename])
+    end
+
+    ExportedFiles = {}
+    ScenEdit_ExportScenarioToXML()
+    for _, contents in pairs(ExportedFiles) do
+        write_file(step, 'full.inst', contents)
+    end
+end
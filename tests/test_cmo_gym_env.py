@@ -0,0 +1,30 @@
+import os
+from gymnasium import spaces
+
+from pycmo.configs.config import get_config
+from pycmo.env.cmo_gym_env import FloridistanPycmoGymEnv
+from pycmo.lib.features import FeaturesFromSteam
+from pycmo.lib.spaces import get_contact_space, get_unit_space
+from pycmo.lib.tools import cmo_steam_observation_file_to_xml
+
+config = get_config()
+
+observation_file_path = os.path.join(config['pycmo_path'], 'tests', "fixtures", 'test_steam_observation.inst')
+scenario_xml = cmo_steam_observation_file_to_xml(observation_file_path)
+
+def floridistan_env() -> FloridistanPycmoGymEnv:
+    # without connecting to the game, which the constructor needs
+    env = FloridistanPycmoGymEnv.__new__(FloridistanPycmoGymEnv)
+    env.observation_space = spaces.Dict({"Thunder #1": get_unit_space(), "BTR-82V": get_contact_space()})
+    env.last_entity_observations = {}
+    return env
+
+def test_floridistan_obs_with_missing_entities():
+    env = floridistan_env()
+    features = FeaturesFromSteam(xml=scenario_xml, player_side="Israel") # has neither Thunder #1 nor the BTR-82V
+    assert features.get_unit_by_name("Thunder #1") is None and features.get_contact_by_name("BTR-82V") is None
+    observation = env._get_obs(features)
+    assert env.observation_space.contains(observation)
+    # an entity keeps its last observation while it is missing
+    env.last_entity_observations["Thunder #1"]["Name"] = "Thunder #1"
+    assert env._get_obs(features)["Thunder #1"]["Name"] == "Thunder #1"
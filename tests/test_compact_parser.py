@@ -0,0 +1,92 @@
+import pytest
+
+from pycmo.lib.features import FeaturesFromSteam, MultiSideFeaturesFromSteam
+from pycmo.lib.compact_parser import CompactParser, CompactFormatError, is_compact_observation
+
+compact = "\n".join([
+    "pycmo-compact|1",
+    "S|Compact test|100|0|0|1000",
+    "D|s1|Blue|5",
+    "C|c1|Contact #1|1000|300|20.5|2.5",
+    "C|c2|||||",
+    "D|s2|Red|0",
+    "C|c3|Contact #3|0|0|1|1",
+    "U|Aircraft|a1|7|Eagle \\p1\\n\\\\|Blue|10.5|1.5|3000|90|300",
+    "F|2001|500|1000",
+    "L|42|42|Strike",
+    "W|w1|640|2|4",
+    "W|w2|641||",
+    "U|Aircraft|a2|8|Mig|Red|11|1|0|0|0",
+    "U|Facility|f1|9|Airbase|Blue|12|2|0||",
+    "M|m1|300|Gun",
+    "W|w3|700|100|200",
+    "M|m2|301|Radar",
+    "U|Aircraft|a3|7|Hawk|Blue|13|3|||",
+    "L|43|43|Empty",
+])
+
+xml = ("<?xml version='1.0' encoding='utf-8'?><Scenario><Title>Compact test</Title><Time>100</Time><StartTime>0</StartTime><ZeroHour>0</ZeroHour><Duration>1000</Duration><Sides>"
+       "<Side><ID>s1</ID><Name>Blue</Name><TotalScore>5</TotalScore><Contacts>"
+       "<Contact><ID>c1</ID><Name>Contact #1</Name><CA>1000</CA><CS>300</CS><Lat>20.5</Lat><Lon>2.5</Lon></Contact><Contact><ID>c2</ID></Contact></Contacts></Side>"
+       "<Side><ID>s2</ID><Name>Red</Name><TotalScore>0</TotalScore><Contacts><Contact><ID>c3</ID><Name>Contact #3</Name><CA>0</CA><CS>0</CS><Lat>1</Lat><Lon>1</Lon></Contact></Contacts></Side></Sides><ActiveUnits>"
+       "<Aircraft><ID>a1</ID><DBID>7</DBID><Name>Eagle |1\n\\</Name><Side>Blue</Side><Lat>10.5</Lat><Lon>1.5</Lon><CA>3000</CA><CH>90</CH><CS>300</CS>"
+       "<Loadout><Loadout><ID>42</ID><DBID>42</DBID><Name>Strike</Name><Weaps><WRec><ID>w1</ID><WeapID>640</WeapID><CL>2</CL><ML>4</ML></WRec><WRec><ID>w2</ID><WeapID>641</WeapID></WRec></Weaps></Loadout></Loadout>"
+       "<Fuel><FuelRec><FT>2001</FT><CQ>500</CQ><MQ>1000</MQ></FuelRec></Fuel></Aircraft>"
+       "<Aircraft><ID>a2</ID><DBID>8</DBID><Name>Mig</Name><Side>Red</Side><Lat>11</Lat><Lon>1</Lon><CA>0</CA><CH>0</CH><CS>0</CS></Aircraft>"
+       "<Facility><ID>f1</ID><DBID>9</DBID><Name>Airbase</Name><Side>Blue</Side><Lat>12</Lat><Lon>2</Lon><CA>0</CA><CH></CH><CS></CS>"
+       "<Mounts><Mount><ID>m1</ID><DBID>300</DBID><Name>Gun</Name><MW><WRec><ID>w3</ID><WeapID>700</WeapID><CL>100</CL><ML>200</ML></WRec></MW></Mount><Mount><ID>m2</ID><DBID>301</DBID><Name>Radar</Name></Mount></Mounts></Facility>"
+       "<Aircraft><ID>a3</ID><DBID>7</DBID><Name>Hawk</Name><Side>Blue</Side><Lat>13</Lat><Lon>3</Lon><CA></CA><CH></CH><CS></CS><Loadout><Loadout><ID>43</ID><DBID>43</DBID><Name>Empty</Name><Weaps></Weaps></Loadout></Loadout></Aircraft>"
+       "</ActiveUnits></Scenario>")
+
+def assert_same_observation(features, expected):
+    assert features.meta == expected.meta
+    assert features.side_ == expected.side_
+    assert features.units == expected.units
+    assert features.contacts == expected.contacts
+
+@pytest.mark.parametrize("side", ["Blue", "Red"])
+def test_compact_matches_xml(side):
+    features = FeaturesFromSteam(compact, side, parser="compact")
+    assert_same_observation(features, FeaturesFromSteam(xml, side, parser="stream"))
+    assert_same_observation(features, FeaturesFromSteam(xml, side, parser="xmltodict"))
+
+def test_compact_decodes_units():
+    features = FeaturesFromSteam(compact.encode(), "Blue", parser="compact")
+    assert [(unit.ID, unit.Type, unit.XML_ID) for unit in features.units] == [("a1", "Aircraft", 0), ("a3", "Aircraft", 2), ("f1", "Facility", 0)]
+    eagle = features.units[0]
+    assert eagle.Name == "Eagle |1\n\\"
+    assert (eagle.CurrentFuel, eagle.MaxFuel) == (500.0, 1000.0)
+    assert [(weapon.ID, weapon.QuantRemaining, weapon.MaxQuant) for weapon in eagle.Loadout.Weapons] == [("w1", 2, 4), ("w2", None, None)]
+    facility = features.units[2]
+    assert facility.CH is None and facility.Loadout is None
+    assert [(mount.ID, [weapon.ID for weapon in mount.Weapons]) for mount in facility.Mounts] == [("m1", ["w3"]), ("m2", [])]
+    assert features.units[1].Loadout.Weapons == []
+    assert features.contacts[1].Name is None and features.contacts[1].Lat is None
+
+def test_compact_projection():
+    projection = {"Unit": ["ID", "Lon", "Lat", "Mounts"], "Mount": ["ID"], "Contact": []}
+    features = FeaturesFromSteam(compact, "Blue", parser="compact", projection=projection)
+    assert_same_observation(features, FeaturesFromSteam(xml, "Blue", parser="stream", projection=projection))
+    assert features.contacts == []
+    records = CompactParser(sides=["Blue"], schema=features.create_stream_parser("Blue").schema).parse_string(compact)
+    assert records.units["Aircraft"][0][1] == {"ID": "a1", "Side": "Blue", "Lon": "1.5", "Lat": "10.5"}
+
+def test_compact_parser_falls_back_to_xml():
+    assert not is_compact_observation(xml)
+    assert is_compact_observation(memoryview(compact.encode()))
+    assert_same_observation(FeaturesFromSteam(xml, "Blue", parser="compact"), FeaturesFromSteam(xml, "Blue", parser="stream"))
+
+def test_compact_multi_side():
+    features = MultiSideFeaturesFromSteam(compact, parser="compact")
+    for side in ("Blue", "Red"):
+        assert_same_observation(features[side], FeaturesFromSteam(xml, side, parser="stream"))
+
+@pytest.mark.parametrize("observation", [
+    "pycmo-compact|2\nS|t|1|0|0|1",
+    "pycmo-compact|1\nS|t|1|0|0|1\nX|1",
+    "pycmo-compact|1\nS|t|1|0|0|1\nD|s1|Blue|\\q",
+    "pycmo-compact|1\nS|t|1|0|0|1\nD|s1",
+])
+def test_compact_format_errors(observation):
+    with pytest.raises(CompactFormatError):
+        CompactParser().parse_string(observation)
@@ -0,0 +1,103 @@
+import pytest
+import socket
+import threading
+
+from pycmo.lib.connection_pool import ConnectionPool, Endpoint, Lease
+from pycmo.lib.protocol import Client
+from pycmo.lib.stand_in_server import StandInServer
+
+def endpoint_of(instance:StandInServer) -> Endpoint:
+    return Endpoint(instance.host, instance.port)
+
+def framed_client(host:str, port:int) -> Client:
+    return Client(host, port, framing="length")
+
+def unused_port() -> int:
+    with socket.create_server(("localhost", 0)) as listener:
+        return listener.getsockname()[1]
+
+def test_pool_leases():
+    instances = [StandInServer() for _ in range(3)]
+    with ConnectionPool([endpoint_of(instance) for instance in instances], client_factory=framed_client) as pool:
+        assert all(stats.healthy for stats in pool.stats().values())
+        leases = [pool.acquire() for _ in range(3)]
+        assert {lease.endpoint for lease in leases} == {endpoint_of(instance) for instance in instances}
+        with pytest.raises(TimeoutError):
+            pool.acquire(timeout=0.05)
+        assert leases[0].send_batch(["return 1", "return 2"]) == ["1", "2"]
+        leases[0].release()
+        lease = pool.acquire(timeout=1)
+        assert lease.endpoint == leases[0].endpoint
+        # a released lease can no longer be used
+        with pytest.raises(ConnectionError):
+            leases[0].send_batch(["return 1"])
+        # a lease waits for another one to be released
+        released = threading.Timer(0.05, leases[1].end_connection)
+        released.start()
+        assert pool.acquire(timeout=5).endpoint == leases[1].endpoint
+        lease.release()
+        stats = pool.stats()[leases[0].endpoint]
+        assert stats.commands == 3 # the two commands of the batch, and the health check
+        assert stats.sends == 2 and stats.errors == 0 and stats.leases == 2
+        assert 0 < stats.max_latency_s and stats.mean_latency_s <= stats.max_latency_s
+    for instance in instances:
+        instance.stop()
+
+def test_pool_reconnects():
+    instance = StandInServer()
+    with ConnectionPool([endpoint_of(instance)], client_factory=framed_client, max_reconnects=2) as pool:
+        lease = pool.acquire()
+        instance.stop()
+        with pytest.raises(ConnectionError):
+            lease.send_batch(["return 1"])
+        lease.release() # the instance cannot be reconnected, so it is left out
+        stats = pool.stats()[endpoint_of(instance)]
+        assert not stats.healthy and stats.errors == 1
+        with pytest.raises(TimeoutError):
+            pool.acquire(timeout=0.05)
+        instance.start()
+        assert pool.check_health() == {endpoint_of(instance): True}
+        with pool.acquire(timeout=1) as lease:
+            assert lease.send_batch(["return 1"]) == ["1"]
+        assert pool.stats()[endpoint_of(instance)].reconnects == 1
+
+def test_pool_replaces_dead_endpoints():
+    dead = Endpoint("localhost", unused_port())
+    replacement = StandInServer()
+    replaced = []
+    def replace_endpoint(endpoint):
+        replaced.append(endpoint)
+        return endpoint_of(replacement)
+    with ConnectionPool([dead], client_factory=framed_client, replace_endpoint=replace_endpoint, max_reconnects=1) as pool:
+        assert replaced == [dead]
+        assert list(pool.stats().keys()) == [endpoint_of(replacement)]
+        with pool.acquire(timeout=1) as lease:
+            assert lease.send_batch(["return 1"]) == ["1"]
+    replacement.stop()
+
+def test_pool_health_checks_in_background():
+    instances = [StandInServer() for _ in range(2)]
+    with ConnectionPool([endpoint_of(instance) for instance in instances], client_factory=framed_client, max_reconnects=1) as pool:
+        pool.start_health_checks(0.01)
+        instances[0].stop()
+        for _ in range(500):
+            if not pool.stats()[endpoint_of(instances[0])].healthy:
+                break
+            threading.Event().wait(0.01)
+        assert not pool.stats()[endpoint_of(instances[0])].healthy
+        for _ in range(5): # only the healthy instance is leased
+            with pool.acquire(timeout=1) as lease:
+                assert lease.endpoint == endpoint_of(instances[1])
+    instances[1].stop()
+
+def test_lease_in_cpe_env(tmp_path):
+    from pycmo.env.cmo_env import CPEEnv
+    instance = StandInServer()
+    with ConnectionPool([endpoint_of(instance)], client_factory=framed_client) as pool:
+        lease = pool.acquire()
+        env = CPEEnv(str(tmp_path), ["0", "1", "0"], "Blue", str(tmp_path / "ended.txt"), batch_commands=True, client=lease)
+        assert env.send_commands(["return 1", "return 2"]) == ["1", "2"]
+        assert env.close()
+        assert lease.released
+        assert isinstance(pool.acquire(timeout=1), Lease)
+    instance.stop()
@@ -0,0 +1,105 @@
+import pytest
+import os
+import shutil
+import socket
+import subprocess
+import threading
+
+from pycmo.configs.config import get_config
+from pycmo.env.cmo_env import CPEEnv, StepType, SOCKET_OBSERVATION_FALLBACK
+from pycmo.lib.features import Features, FeaturesFromSteam
+from pycmo.lib.protocol import Client, BATCH_FOOTER
+
+config = get_config()
+
+lua = next((path for path in map(shutil.which, ("lua", "lua5.4", "lua5.3", "lua5.2", "lua5.1", "luajit")) if path), None)
+pytestmark = pytest.mark.skipif(lua is None, reason="requires a Lua interpreter")
+
+xml_file = os.path.join(config['pycmo_path'], 'xml', 'scen.xml')
+side = "North Korea"
+
+# the parts of the Command Lua API that CPEEnv uses, with a clock that the server moves forward
+command_api = """
+local xml_file = io.open(os.getenv('PYCMO_TEST_XML'), 'rb')
+local xml = xml_file:read('*a')
+xml_file:close()
+function ScenEdit_CurrentTime() return tonumber(os.getenv('PYCMO_TEST_TIME')) end
+function ScenEdit_ExportScenarioToXML() return xml end
+function VP_RunForTimeAndHalt(options) end
+function VP_GetScenario() return {CurrentTimeNum = 0, StartTimeNum = 0, DurationNum = 1} end
+"""
+
+class LuaInstance():
+    # a local TCP stand-in for the game that runs each batch of commands with a Lua interpreter, the clock reading
+    # `start_time` for the first `batches_before_step` batches and one step later afterwards
+    def __init__(self, tmp_path, start_time:int, step_seconds:int, batches_before_step:int) -> None:
+        self.script_path = str(tmp_path / "batch.lua")
+        self.env = dict(os.environ, PYCMO_TEST_XML=xml_file)
+        self.start_time = start_time
+        self.step_seconds = step_seconds
+        self.batches_before_step = batches_before_step
+        self.batches = []
+        self.listener = socket.create_server(("localhost", 0))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self) -> None:
+        connection, _ = self.listener.accept()
+        with connection:
+            script = b""
+            while data := connection.recv(65536):
+                script += data
+                if script.endswith(BATCH_FOOTER.encode()):
+                    connection.sendall(self.run(script.decode()))
+                    script = b""
+
+    def run(self, script:str) -> bytes:
+        self.batches.append(script)
+        with open(self.script_path, 'w') as f:
+            f.write(script)
+        now = self.start_time if len(self.batches) <= self.batches_before_step else self.start_time + self.step_seconds
+        self.env["PYCMO_TEST_TIME"] = str(now)
+        return subprocess.run([lua, '-e', command_api + f"io.write(dofile({self.script_path!r}))"], env=self.env, capture_output=True, check=True).stdout
+
+def create_env(tmp_path, instance:LuaInstance, **kwargs) -> CPEEnv:
+    step_dest = str(tmp_path / "steps") + os.sep
+    os.makedirs(step_dest, exist_ok=True)
+    client = Client(port=instance.port, framing="length")
+    client.connect()
+    return CPEEnv(step_dest, ["0", "1", "0"], side, str(tmp_path / "scen_ended.txt"), parser="stream", batch_commands=True, client=client, **kwargs)
+
+def test_socket_observations(tmp_path):
+    # the batches are the first observation, then the action with the command that runs the step, then a check of
+    # whether the scenario ended with a poll, which finds the step finished
+    instance = LuaInstance(tmp_path, 1000, 60, batches_before_step=2)
+    env = create_env(tmp_path, instance, observation_transport="socket")
+    expected = Features(xml_file, side, parser="stream")
+    first = env.reset()
+    assert isinstance(first.observation, FeaturesFromSteam)
+    timestep = env.step(1000, 1, action="x = 1")
+    assert timestep.step_type == StepType(1)
+    for observation in (first.observation, timestep.observation):
+        assert observation.meta == expected.meta
+        assert observation.units == expected.units
+        assert observation.contacts == expected.contacts
+    assert len(instance.batches) == 3
+    assert "VP_RunForTimeAndHalt" in instance.batches[1] and "ScenEdit_CurrentTime" not in instance.batches[1]
+    assert os.listdir(env.step_dest) == [] # nothing went through the disk
+    env.close()
+
+def test_socket_observations_fall_back_to_files(tmp_path):
+    instance = LuaInstance(tmp_path, 1000, 60, batches_before_step=2)
+    env = create_env(tmp_path, instance, observation_transport="socket", max_socket_observation_size=1000)
+    env.reset()
+    timestep = env.step(1000, 1)
+    assert type(timestep.observation) is Features
+    assert timestep.observation.units == Features(xml_file, side, parser="stream").units
+    assert sorted(os.listdir(env.step_dest)) == ["0.xml", "1.xml"]
+    assert SOCKET_OBSERVATION_FALLBACK in instance.batches[2]
+    env.close()
+
+def test_socket_observations_need_batches(tmp_path):
+    with pytest.raises(ValueError):
+        CPEEnv(str(tmp_path), ["0", "1", "0"], side, str(tmp_path / "scen_ended.txt"), observation_transport="socket", client=Client())
+    with pytest.raises(ValueError):
+        CPEEnv(str(tmp_path), ["0", "1", "0"], side, str(tmp_path / "scen_ended.txt"), observation_transport="pipe", client=Client())
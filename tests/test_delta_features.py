@@ -0,0 +1,102 @@
+import pytest
+
+from pycmo.lib.features import FeaturesFromSteam
+from pycmo.lib.delta_features import DeltaFeaturesFromSteam, DeltaState, KeyframeMismatchError, get_keyframe_path
+
+side = "Blue"
+
+def unit_xml(unit_type:str, unit_id:str, unit_side:str, lat:float) -> str:
+    return f"<{unit_type}><ID>{unit_id}</ID><DBID>7</DBID><Name>{unit_id}</Name><Side>{unit_side}</Side><Lat>{lat}</Lat><Lon>1.5</Lon><CS>300</CS></{unit_type}>"
+
+def contact_xml(contact_id:str, lat:float) -> str:
+    return f"<Contact><ID>{contact_id}</ID><Name>{contact_id}</Name><Lat>{lat}</Lat><Lon>2.5</Lon></Contact>"
+
+def observation_xml(units:list[str], contacts:list[str], delta:str="", extra_side:str="", extra_scenario:str="") -> str:
+    return ("<?xml version='1.0' encoding='utf-8'?><Scenario>" + delta +
+            "<Title>Delta test</Title><Time>100</Time><StartTime>0</StartTime><ZeroHour>0</ZeroHour><Duration>1000</Duration><Sides>"
+            "<Side><ID>s1</ID><Name>Blue</Name><TotalScore>5</TotalScore><Contacts>" + "".join(contacts) + "</Contacts>" + extra_side + "</Side>"
+            "<Side><ID>s2</ID><Name>Red</Name><TotalScore>0</TotalScore><Contacts></Contacts></Side>"
+            "</Sides><ActiveUnits>" + "".join(units) + "</ActiveUnits>" + extra_scenario + "</Scenario>")
+
+def delta_header(keyframe:str, sequence:int, is_keyframe:bool) -> str:
+    return f"<Delta><Keyframe>{keyframe}</Keyframe><Sequence>{sequence}</Sequence><IsKeyframe>{str(is_keyframe).lower()}</IsKeyframe></Delta>"
+
+keyframe_units = [unit_xml("Aircraft", "a1", "Blue", 10.0), unit_xml("Ship", "s1", "Red", 11.0), unit_xml("Aircraft", "a2", "Blue", 12.0), unit_xml("Aircraft", "a3", "Red", 13.0)]
+keyframe_contacts = [contact_xml("c1", 20.0), contact_xml("c2", 21.0)]
+keyframe = observation_xml(keyframe_units, keyframe_contacts, delta_header("k1", 1, True))
+
+def assert_same_observation(features, expected):
+    assert features.meta == expected.meta
+    assert features.side_ == expected.side_
+    assert features.units == expected.units
+    assert features.contacts == expected.contacts
+
+def test_delta_keyframe():
+    delta_state = DeltaState()
+    features = DeltaFeaturesFromSteam(keyframe, side, delta_state=delta_state)
+    assert delta_state.keyframe_id == "k1"
+    assert_same_observation(features, FeaturesFromSteam(observation_xml(keyframe_units, keyframe_contacts), side, parser="stream"))
+
+def test_delta_changed_new_and_removed():
+    delta_state = DeltaState()
+    DeltaFeaturesFromSteam(keyframe, side, delta_state=delta_state)
+    # a1 moved, a3 was removed, a4 is new, c1 was removed and c3 is new
+    delta = observation_xml([unit_xml("Aircraft", "a1", "Blue", 10.5), unit_xml("Aircraft", "a4", "Blue", 14.0)], [contact_xml("c3", 22.0)], delta_header("k1", 2, False),
+                            extra_side="<RemovedContacts><ID>c1</ID></RemovedContacts>", extra_scenario="<RemovedUnits><ID>a3</ID></RemovedUnits>")
+    features = DeltaFeaturesFromSteam(delta, side, delta_state=delta_state)
+    full = observation_xml([unit_xml("Aircraft", "a1", "Blue", 10.5), unit_xml("Ship", "s1", "Red", 11.0), unit_xml("Aircraft", "a2", "Blue", 12.0), unit_xml("Aircraft", "a4", "Blue", 14.0)],
+                           [contact_xml("c2", 21.0), contact_xml("c3", 22.0)])
+    assert_same_observation(features, FeaturesFromSteam(full, side, parser="stream"))
+    assert [unit.ID for unit in features.units] == ["a1", "a2", "a4"]
+    assert [unit.XML_ID for unit in features.units] == [0, 1, 2]
+
+def test_delta_order():
+    delta_state = DeltaState()
+    DeltaFeaturesFromSteam(keyframe, side, delta_state=delta_state)
+    delta = observation_xml([unit_xml("Aircraft", "a4", "Blue", 14.0)], [], delta_header("k1", 2, False),
+                            extra_side="<ContactOrder><ID>c2</ID><ID>c1</ID></ContactOrder>",
+                            extra_scenario="<UnitOrder><ID>a4</ID><ID>a3</ID><ID>s1</ID><ID>a2</ID><ID>a1</ID></UnitOrder>")
+    features = DeltaFeaturesFromSteam(delta, side, delta_state=delta_state)
+    full = observation_xml([unit_xml("Aircraft", "a4", "Blue", 14.0), unit_xml("Aircraft", "a3", "Red", 13.0), unit_xml("Ship", "s1", "Red", 11.0), unit_xml("Aircraft", "a2", "Blue", 12.0), unit_xml("Aircraft", "a1", "Blue", 10.0)],
+                           [contact_xml("c2", 21.0), contact_xml("c1", 20.0)])
+    assert_same_observation(features, FeaturesFromSteam(full, side, parser="stream"))
+    assert [unit.XML_ID for unit in features.units] == [0, 2, 3]
+
+def test_delta_reuses_unchanged_units():
+    delta_state = DeltaState()
+    first = DeltaFeaturesFromSteam(keyframe, side, delta_state=delta_state)
+    delta = observation_xml([unit_xml("Aircraft", "a1", "Blue", 10.5)], [], delta_header("k1", 2, False))
+    second = DeltaFeaturesFromSteam(delta, side, delta_state=delta_state)
+    assert second.units[0] != first.units[0]
+    assert second.units[1] is first.units[1]
+
+def test_delta_projection_without_id():
+    delta_state = DeltaState()
+    projection = {"Unit": ["Name", "Lat"]}
+    first = DeltaFeaturesFromSteam(keyframe, side, delta_state=delta_state, projection=projection)
+    delta = observation_xml([unit_xml("Aircraft", "a1", "Blue", 10.5)], [], delta_header("k1", 2, False))
+    second = DeltaFeaturesFromSteam(delta, side, delta_state=delta_state, projection=projection)
+    assert [unit.Lat for unit in second.units] == [10.5, 12.0]
+    assert second.units[1] is first.units[1] # matched with the keyframe by the ID that the projection leaves out
+    assert all(unit.ID is None for unit in second.units)
+
+def test_delta_keyframe_mismatch():
+    delta_state = DeltaState()
+    delta = observation_xml([], [], delta_header("k1", 2, False))
+    with pytest.raises(KeyframeMismatchError):
+        DeltaFeaturesFromSteam(delta, side, delta_state=delta_state)
+    DeltaFeaturesFromSteam(keyframe, side, delta_state=delta_state)
+    with pytest.raises(KeyframeMismatchError):
+        DeltaFeaturesFromSteam(observation_xml([], [], delta_header("k0", 3, False)), side, delta_state=delta_state)
+
+def test_delta_full_export():
+    # observations written by ScenEdit_ExportScenarioToXML are decoded as is and keep the keyframe
+    delta_state = DeltaState()
+    DeltaFeaturesFromSteam(keyframe, side, delta_state=delta_state)
+    full = observation_xml(keyframe_units[:2], keyframe_contacts[:1])
+    features = DeltaFeaturesFromSteam(full, side, delta_state=delta_state)
+    assert_same_observation(features, FeaturesFromSteam(full, side, parser="stream"))
+    assert delta_state.keyframe_id == "k1"
+
+def test_get_keyframe_path():
+    assert get_keyframe_path("/observations/Steam demo.inst") == "/observations/Steam demo_keyframe.inst"
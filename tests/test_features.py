@@ -1,10 +1,13 @@
 import pytest
 import os
 import math
+import pickle
+import numpy as np
 
 from pycmo.configs.config import get_config
-from pycmo.lib.features import FeaturesFromSteam, Game, Side, Weapon, Loadout, Mount, Unit, Contact
-from pycmo.lib.tools import cmo_steam_observation_file_to_xml
+from pycmo.lib.features import Features, FeaturesFromSteam, LazyFeaturesFromSteam, MultiSideFeatures, MultiSideFeaturesFromSteam, LazyList, Game, Side, Weapon, Loadout, Mount, Unit, Contact, UnitTable, ContactTable, get_unit_table, get_contact_table, index_by_id, index_by_name, Projection, FULL_PROJECTION, get_projection
+from pycmo.lib.tools import cmo_steam_observation_file_to_xml, open_cmo_steam_observation_xml
+from pycmo.lib.stream_parser import ScenarioStreamParser, get_scenario_schema
 
 config = get_config()
 
@@ -187,3 +190,197 @@ def test_features_from_steam_get_contact():
     assert math.isclose(contact.CA, 6.0)
     assert math.isclose(contact.Lon, -82.516819017376)
     assert math.isclose(contact.Lat, 27.852581555226)
+
+def test_lazy_list():
+    lazy_list = LazyList(lambda: [1, 2, 3])
+    assert not lazy_list.materialized
+    assert lazy_list == [1, 2, 3]
+    assert lazy_list.materialized
+    assert LazyList(lambda: [1]) == LazyList(lambda: [1])
+    assert LazyList(lambda: [1]) + LazyList(lambda: [2]) == [1, 2]
+    assert not LazyList(lambda: [])
+
+def test_lazy_list_operations():
+    # list reads the storage of list subclasses directly, so each of these must build the items first
+    assert [0] + LazyList(lambda: [1, 2]) == [0, 1, 2]
+    assert LazyList(lambda: [1, 2]) + [3] == [1, 2, 3]
+    assert [1, 2] == LazyList(lambda: [1, 2])
+    assert [1] < LazyList(lambda: [2])
+    assert 2 * LazyList(lambda: [1]) == [1, 1]
+    assert tuple(LazyList(lambda: [1, 2])) == (1, 2)
+    assert ",".join(LazyList(lambda: ["a", "b"])) == "a,b"
+    numbers = [0]
+    numbers.extend(LazyList(lambda: [1]))
+    numbers += LazyList(lambda: [2])
+    assert numbers == [0, 1, 2]
+    lazy_list = LazyList(lambda: [1, 2, 3])
+    lazy_list += [4]
+    lazy_list[0] = 0
+    del lazy_list[1]
+    assert lazy_list == [0, 3, 4] and lazy_list[1:] == [3, 4]
+    assert np.array_equal(np.array(LazyList(lambda: [1, 2])), np.array([1, 2]))
+    assert type(pickle.loads(pickle.dumps(LazyList(lambda: [1])))) is list
+
+def test_lazy_features_from_steam():
+    features = LazyFeaturesFromSteam(xml=scenario_xml, player_side=side)
+    assert isinstance(features, FeaturesFromSteam)
+    for section in ["meta", "units", "side_", "contacts"]:
+        assert section not in features.__dict__
+    sufa_aircraft = features.units[2]
+    assert "units" in features.__dict__
+    assert "contacts" not in features.__dict__
+    assert isinstance(sufa_aircraft.Mounts, LazyList)
+    assert not sufa_aircraft.Mounts.materialized
+    assert isinstance(sufa_aircraft.Mounts[0], Mount)
+    assert sufa_aircraft.Mounts.materialized
+
+@pytest.mark.parametrize("parser", ["xmltodict", "stream"])
+def test_lazy_features_from_steam_matches_features(parser):
+    features = LazyFeaturesFromSteam(xml=scenario_xml, player_side=side, parser=parser)
+    expected = FeaturesFromSteam(xml=scenario_xml, player_side=side)
+    assert features.transform_obs_into_arrays() == expected.transform_obs_into_arrays()
+
+def test_features_from_steam_unit_table():
+    features = FeaturesFromSteam(xml=scenario_xml, player_side=side)
+    unit_table = features.unit_table
+    assert isinstance(unit_table, UnitTable)
+    assert unit_table is features.unit_table
+    assert list(unit_table.ID) == [unit.ID for unit in features.units]
+    assert unit_table.DBID.dtype == np.int64 and unit_table.Lat.dtype == np.float64
+    row = unit_table.index[sufa_aircraft_ID]
+    unit = features.units[row]
+    assert unit.ID == sufa_aircraft_ID
+    assert unit_table.Lat[row] == unit.Lat and unit_table.Lon[row] == unit.Lon and unit_table.DBID[row] == unit.DBID
+    for column in ('CH', 'CS', 'CA', 'CurrentFuel', 'MaxFuel'):
+        for value, unit in zip(getattr(unit_table, column), features.units):
+            assert value == getattr(unit, column) or (math.isnan(value) and getattr(unit, column) is None)
+
+def test_features_from_steam_contact_table():
+    features = FeaturesFromSteam(xml=scenario_xml, player_side=side)
+    contact_table = features.contact_table
+    assert isinstance(contact_table, ContactTable)
+    assert len(contact_table.ID) == len(features.contacts)
+    for contact in features.contacts:
+        row = contact_table.index[contact.ID]
+        for column in ('Lon', 'Lat', 'CS', 'CA'):
+            value = getattr(contact_table, column)[row]
+            assert value == getattr(contact, column) or (math.isnan(value) and getattr(contact, column) is None)
+
+def test_empty_tables():
+    unit_table = get_unit_table([])
+    assert len(unit_table.ID) == 0 and unit_table.Lat.shape == (0,) and unit_table.index == {}
+    contact_table = get_contact_table([])
+    assert contact_table.CS.shape == (0,)
+    contact_table = get_contact_table([Contact(0, "a", None, None, None, 1.0, 2.0)])
+    assert math.isnan(contact_table.CS[0]) and contact_table.Lat[0] == 2.0
+
+def test_features_from_steam_indexes():
+    features = FeaturesFromSteam(xml=scenario_xml, player_side=side)
+    unit = features.get_unit_by_id(sufa_aircraft_ID)
+    assert unit.Name == sufa_aircraft_name
+    assert features.get_unit_by_name(sufa_aircraft_name) is unit
+    assert features.get_units_by_name(sufa_aircraft_name) == [unit]
+    assert features.get_unit_by_id("unknown") is None
+    assert features.get_unit_by_name("unknown") is None
+    assert features.get_units_by_name("unknown") == []
+    for contact in features.contacts:
+        assert features.get_contact_by_id(contact.ID) is contact
+        if contact.Name is not None:
+            assert contact in features.get_contacts_by_name(contact.Name)
+            assert features.get_contact_by_name(contact.Name) == [other for other in features.contacts if other.Name == contact.Name][0]
+    lazy_features = LazyFeaturesFromSteam(xml=scenario_xml, player_side=side)
+    assert lazy_features.get_unit_by_id(sufa_aircraft_ID) == unit
+    assert lazy_features.units_by_name == features.units_by_name
+
+def test_index_by_name_buckets():
+    contacts = [Contact(0, "a", "Target", None, None, None, None), Contact(1, "b", "Target", None, None, None, None), Contact(2, "c", None, None, None, None, None)]
+    assert index_by_name(contacts) == {"Target": contacts[:2]}
+    assert index_by_id(contacts + [Contact(3, "a", "Other", None, None, None, None)])["a"] is contacts[0]
+
+@pytest.mark.parametrize("parser", ["xmltodict", "stream"])
+def test_multi_side_features_from_steam(parser):
+    multi_side_features = MultiSideFeaturesFromSteam(xml=scenario_xml, parser=parser)
+    assert multi_side_features.sides == ["Israel", "Syria"]
+    for side_name in multi_side_features.sides:
+        view = multi_side_features[side_name]
+        expected = FeaturesFromSteam(xml=scenario_xml, player_side=side_name, parser=parser)
+        assert isinstance(view, FeaturesFromSteam)
+        assert view.scen_dic is multi_side_features.scen_dic
+        assert view.meta == expected.meta
+        assert view.units == expected.units
+        assert view.side_ == expected.side_
+        assert view.contacts == expected.contacts
+    lazy_multi_side_features = MultiSideFeaturesFromSteam(xml=scenario_xml, sides=["Syria"], parser=parser, lazy_features=True)
+    assert isinstance(lazy_multi_side_features["Syria"], LazyFeaturesFromSteam)
+    assert lazy_multi_side_features["Syria"].units == multi_side_features["Syria"].units
+    with pytest.raises(ValueError):
+        MultiSideFeaturesFromSteam(xml=scenario_xml, sides=["Unknown"], parser=parser)
+
+def test_multi_side_features():
+    xml_file = os.path.join(config['pycmo_path'], 'xml', 'scen.xml')
+    multi_side_features = MultiSideFeatures(xml=xml_file, parser="stream")
+    # a container of views rather than a Features of its own, so it cannot be passed where a Features is expected
+    assert not isinstance(multi_side_features, Features)
+    assert multi_side_features.get_sides() == Features(xml=xml_file, player_side="North Korea").get_sides()
+    assert multi_side_features.meta == multi_side_features["North Korea"].meta
+    for side_name in multi_side_features.sides:
+        assert multi_side_features[side_name].units == Features(xml=xml_file, player_side=side_name, parser="stream").units
+        assert multi_side_features[side_name].contacts == Features(xml=xml_file, player_side=side_name, parser="stream").contacts
+
+@pytest.mark.parametrize("parser", ["xmltodict", "stream"])
+def test_features_from_steam_memoryview(parser):
+    expected = FeaturesFromSteam(xml=scenario_xml, player_side=side, parser=parser)
+    with open_cmo_steam_observation_xml(observation_file_path) as observation_xml:
+        features = FeaturesFromSteam(xml=observation_xml, player_side=side, parser=parser)
+    assert features.units == expected.units
+    assert features.contacts == expected.contacts
+
+def test_get_projection():
+    assert get_projection(None) == FULL_PROJECTION
+    projection = get_projection({"Unit": ["ID", "Lon", "Lat"], "Contact": []})
+    assert isinstance(projection, Projection)
+    assert projection.Unit == {"ID", "Lon", "Lat"}
+    assert projection.Contact == frozenset()
+    assert projection.Mount == FULL_PROJECTION.Mount
+    assert get_projection(projection) is projection
+    with pytest.raises(ValueError):
+        get_projection({"Units": ["ID"]})
+    with pytest.raises(ValueError):
+        get_projection({"Unit": ["ID", "Altitude"]})
+    with pytest.raises(ValueError):
+        get_projection({"Unit": "ID"})
+
+@pytest.mark.parametrize("parser", ["xmltodict", "stream"])
+def test_features_projection(parser):
+    xml_file = os.path.join(config['pycmo_path'], 'xml', 'scen.xml')
+    full = Features(xml=xml_file, player_side="North Korea", parser=parser)
+    projection = {"Unit": ["ID", "Lon", "Lat", "Mounts"], "Mount": ["DBID", "Weapons"], "Weapon": ["WeaponID"], "Contact": ["ID"]}
+    features = Features(xml=xml_file, player_side="North Korea", parser=parser, projection=projection)
+    assert len(features.units) == len(full.units)
+    for unit, full_unit in zip(features.units, full.units):
+        assert (unit.XML_ID, unit.ID, unit.Side, unit.Type, unit.Lon, unit.Lat) == (full_unit.XML_ID, full_unit.ID, full_unit.Side, full_unit.Type, full_unit.Lon, full_unit.Lat)
+        assert unit.Name is None and unit.DBID is None and unit.CA is None and unit.CurrentFuel is None and unit.Loadout is None
+        assert [mount.DBID for mount in unit.Mounts or []] == [mount.DBID for mount in full_unit.Mounts or []]
+        for mount, full_mount in zip(unit.Mounts or [], full_unit.Mounts or []):
+            assert mount.ID is None
+            assert [weapon.WeaponID for weapon in mount.Weapons] == [weapon.WeaponID for weapon in full_mount.Weapons]
+            assert all(weapon.ID is None and weapon.QuantRemaining is None for weapon in mount.Weapons)
+    assert [contact.ID for contact in features.contacts] == [contact.ID for contact in full.contacts]
+    assert all(contact.Name is None and contact.Lon is None for contact in features.contacts)
+    assert np.all(features.unit_table.DBID == -1)
+
+@pytest.mark.parametrize("parser", ["xmltodict", "stream"])
+def test_features_from_steam_projection_drops_entities(parser):
+    features = FeaturesFromSteam(xml=scenario_xml, player_side=side, parser=parser, projection={"Unit": [], "Contact": []})
+    assert features.units == []
+    assert features.contacts == []
+    assert features.side_ == FeaturesFromSteam(xml=scenario_xml, player_side=side, parser=parser).side_
+
+def test_projection_schema_skips_elements():
+    projection = get_projection({"Unit": ["ID", "Lon", "Lat"], "Contact": []})
+    assert get_scenario_schema(FULL_PROJECTION) == get_scenario_schema(get_projection(None))
+    records = ScenarioStreamParser(sides=[side], schema=get_scenario_schema(projection)).parse_string(scenario_xml)
+    for active_units in records.units.values():
+        for _, unit in active_units:
+            assert set(unit.keys()) <= {"ID", "Lon", "Lat", "Side"}
+    assert all("Contacts" not in side_record for side_record in records.scen_dic["Scenario"]["Sides"]["Side"])
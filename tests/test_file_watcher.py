@@ -0,0 +1,74 @@
+import pytest
+import os
+import threading
+
+from pycmo.lib.file_watcher import FileWatcher, InotifyFileWatcher, PollingFileWatcher, create_file_watcher, inotify_available
+
+requires_inotify = pytest.mark.skipif(not inotify_available(), reason="requires inotify")
+
+def test_polling_watcher_reports_complete_files(tmp_path):
+    path = str(tmp_path / "observation.inst")
+    with PollingFileWatcher([path, str(tmp_path / "ended.inst")], min_interval=0.001, max_interval=0.01) as watcher:
+        assert watcher.wait() == set()
+        with open(path, 'w') as f:
+            f.write("<Scenario>")
+            f.flush()
+            assert watcher.poll() == set() # still being written
+            f.write("</Scenario>")
+        assert watcher.wait(timeout=1) == {path} # once its stat is the same twice
+        assert watcher.wait() == set()
+        os.remove(path)
+        assert watcher.wait() == set()
+
+def test_polling_watcher_backs_off(tmp_path):
+    path = str(tmp_path / "observation.inst")
+    with PollingFileWatcher([path], min_interval=0.001, max_interval=0.004) as watcher:
+        intervals = []
+        for _ in range(4):
+            watcher.wait()
+            intervals.append(watcher.interval)
+        assert intervals == [0.002, 0.004, 0.004, 0.004]
+        with open(path, 'w') as f:
+            f.write("True")
+        while not watcher.wait():
+            pass
+        assert watcher.interval == 0.001
+
+@requires_inotify
+def test_inotify_watcher_reports_closed_files(tmp_path):
+    path = str(tmp_path / "observation.inst")
+    with InotifyFileWatcher([path]) as watcher:
+        with open(path, 'w') as f:
+            f.write("<Scenario>")
+            f.flush()
+            assert watcher.wait(timeout=0.05) == set() # still open for writing
+            f.write("</Scenario>")
+        assert watcher.wait(timeout=1) == {path}
+        # an atomic replace, by another thread while the watcher waits
+        def replace():
+            with open(path + ".tmp", 'w') as f:
+                f.write("<Scenario />")
+            os.replace(path + ".tmp", path)
+        writer = threading.Timer(0.05, replace)
+        writer.start()
+        assert watcher.wait(timeout=5) == {path}
+        writer.join()
+        # files that are not watched do not wake the watcher
+        with open(str(tmp_path / "other.inst"), 'w') as f:
+            f.write("False")
+        assert watcher.wait(timeout=0.05) == set()
+
+def test_create_file_watcher(tmp_path):
+    paths = [str(tmp_path / "observation.inst")]
+    with create_file_watcher(paths) as watcher:
+        assert isinstance(watcher, InotifyFileWatcher if inotify_available() else PollingFileWatcher)
+    # the directory of the files must exist for inotify, so "auto" falls back to polling
+    with create_file_watcher([str(tmp_path / "missing" / "observation.inst")]) as watcher:
+        assert isinstance(watcher, PollingFileWatcher)
+    assert isinstance(create_file_watcher(paths, "polling"), FileWatcher)
+    with pytest.raises(ValueError):
+        create_file_watcher(paths, "kqueue")
+
+def test_file_watcher_is_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        FileWatcher([str(tmp_path / "observation.inst")])
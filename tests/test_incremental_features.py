@@ -0,0 +1,80 @@
+import os
+import re
+
+from pycmo.configs.config import get_config
+from pycmo.lib.features import Features, FeaturesFromSteam
+from pycmo.lib.incremental_features import IncrementalFeatures, IncrementalFeaturesFromSteam, UnitCache, DecodeStats
+from pycmo.lib.tools import cmo_steam_observation_file_to_xml
+
+config = get_config()
+
+side = "Israel"
+observation_file_path = os.path.join(config['pycmo_path'], 'tests', "fixtures", 'test_steam_observation.inst')
+scenario_xml = cmo_steam_observation_file_to_xml(observation_file_path)
+
+def test_incremental_features_matches_features():
+    unit_cache = UnitCache()
+    expected = FeaturesFromSteam(xml=scenario_xml, player_side=side)
+    for _ in range(2):
+        features = IncrementalFeaturesFromSteam(xml=scenario_xml, player_side=side, unit_cache=unit_cache)
+        assert features.meta == expected.meta
+        assert features.units == expected.units
+        assert features.side_ == expected.side_
+        assert features.contacts == expected.contacts
+
+def test_incremental_features_decode_stats():
+    unit_cache = UnitCache()
+    features = IncrementalFeaturesFromSteam(xml=scenario_xml, player_side=side, unit_cache=unit_cache)
+    n_units = len(features.units)
+    assert features.decode_stats == DecodeStats(0, 0, n_units)
+    features = IncrementalFeaturesFromSteam(xml=scenario_xml, player_side=side, unit_cache=unit_cache)
+    assert features.decode_stats == DecodeStats(n_units, 0, 0)
+    assert unit_cache.total_stats == DecodeStats(n_units, 0, n_units)
+    assert unit_cache.steps == 2
+
+def test_incremental_features_projection_without_id():
+    # the units are still keyed by their IDs in the cache, but the IDs are left out of the units
+    unit_cache = UnitCache()
+    projection = {"Unit": ["Name", "Lat"]}
+    expected = FeaturesFromSteam(xml=scenario_xml, player_side=side, parser="stream", projection=projection)
+    features = IncrementalFeaturesFromSteam(xml=scenario_xml, player_side=side, unit_cache=unit_cache, projection=projection)
+    n_units = len(features.units)
+    features = IncrementalFeaturesFromSteam(xml=scenario_xml, player_side=side, unit_cache=unit_cache, projection=projection)
+    assert features.decode_stats == DecodeStats(n_units, 0, 0)
+    assert features.units == expected.units
+    assert all(unit.ID is None for unit in features.units)
+
+def test_incremental_features_changed_unit():
+    unit_cache = UnitCache()
+    previous = IncrementalFeaturesFromSteam(xml=scenario_xml, player_side=side, unit_cache=unit_cache)
+    moved_unit = previous.units[0]
+    moved_xml = re.sub(f"(<ID>{moved_unit.ID}</ID>.*?<Lat>)[^<]*(</Lat>)", r"\g<1>1.5\g<2>", scenario_xml, count=1, flags=re.DOTALL)
+    features = IncrementalFeaturesFromSteam(xml=moved_xml, player_side=side, unit_cache=unit_cache)
+    assert features.units == FeaturesFromSteam(xml=moved_xml, player_side=side).units
+    assert features.units[0].Lat == 1.5
+    assert features.decode_stats.hits == len(features.units) - 1
+    assert features.decode_stats.partial_hits + features.decode_stats.misses == 1
+    for unit, previous_unit in zip(features.units[1:], previous.units[1:]):
+        assert unit is previous_unit
+
+def test_incremental_features_drops_missing_units():
+    unit_cache = UnitCache()
+    IncrementalFeaturesFromSteam(xml=scenario_xml, player_side=side, unit_cache=unit_cache)
+    IncrementalFeaturesFromSteam(xml=scenario_xml, player_side="Syria", unit_cache=unit_cache)
+    assert all(cached_unit.unit.Side == "Syria" for cached_unit in unit_cache.previous.values())
+
+def test_incremental_features_reuses_unchanged_mounts(tmp_path):
+    xml_file = os.path.join(config['pycmo_path'], 'xml', 'scen.xml')
+    unit_cache = UnitCache()
+    previous = IncrementalFeatures(xml_file, "North Korea", unit_cache=unit_cache)
+    moved_unit = [unit for unit in previous.units if unit.Mounts][0]
+    with open(xml_file, 'r', encoding='utf-8') as f:
+        moved_xml = re.sub(f"(<ID>{moved_unit.ID}</ID>.*?<Lat>)[^<]*(</Lat>)", r"\g<1>1.5\g<2>", f.read(), count=1, flags=re.DOTALL)
+    moved_xml_file = tmp_path / "scen.xml"
+    moved_xml_file.write_text(moved_xml, encoding='utf-8')
+    features = IncrementalFeatures(str(moved_xml_file), "North Korea", unit_cache=unit_cache)
+    assert features.units == Features(str(moved_xml_file), "North Korea", parser="stream").units
+    assert features.decode_stats == DecodeStats(len(features.units) - 1, 1, 0)
+    unit = [unit for unit in features.units if unit.ID == moved_unit.ID][0]
+    assert unit.Lat == 1.5
+    assert unit.Mounts is moved_unit.Mounts
@@ -0,0 +1,228 @@
+import pytest
+import os
+import shutil
+import subprocess
+import re
+import socket
+import xml.etree.ElementTree as ET
+
+from pycmo.configs.config import get_config
+from pycmo.lib.features import FeaturesFromSteam, MultiSideFeaturesFromSteam, Unit
+from pycmo.lib.delta_features import DeltaFeaturesFromSteam, DeltaState, KeyframeMismatchError
+from pycmo.lib.sharded_features import ShardedFeaturesFromSteam, get_shard_export_id
+from pycmo.lib.tools import parse_api_call_report
+from pycmo.lib.protocol import ResponseReader, format_batch
+
+config = get_config()
+
+lua = next((path for path in map(shutil.which, ("lua", "lua5.4", "lua5.3", "lua5.2", "lua5.1", "luajit")) if path), None)
+pytestmark = pytest.mark.skipif(lua is None, reason="requires a Lua interpreter")
+
+lua_fixtures_path = os.path.join(config['pycmo_path'], 'tests', 'fixtures', 'lua')
+pycmo_lib_path = os.path.join(config['pycmo_path'], 'lua', 'pycmo_lib.lua')
+reference_lib_path = os.path.join(lua_fixtures_path, 'pycmo_lib_reference.lua')
+
+# the stand-in units may have several fuel records, which Features cannot decode
+projection = {"Unit": [field for field in Unit._fields if field not in ("CurrentFuel", "MaxFuel")]}
+
+def run_lua(script:str, *args) -> list[tuple[int, str, bytes]]:
+    # runs a driver script and returns the (index, file name, contents) records that it writes
+    output = subprocess.run([lua, os.path.join(lua_fixtures_path, script)] + [str(arg) for arg in args], capture_output=True, check=True).stdout
+    records = []
+    position = 0
+    while position < len(output):
+        header_end = output.index(b'\n', position)
+        index, rest = output[position:header_end].split(b' ', 1)
+        filename, length = rest.rsplit(b' ', 1)
+        contents_end = header_end + 1 + int(length)
+        records.append((int(index), filename.decode(), output[header_end + 1:contents_end]))
+        position = contents_end
+    return records
+
+def export_scenario(lib_paths:list[str], units_per_side:int, seed:int=1) -> list[dict[str, bytes]]:
+    # runs the export of a generated scenario with each library and returns the files exported by each one
+    exports = [{} for _ in lib_paths]
+    for lib_idx, filename, contents in run_lua('export_scenario.lua', units_per_side, seed, *lib_paths):
+        exports[lib_idx - 1][filename] = contents
+    return exports
+
+def export_steps(units_per_side:int, seed:int, steps:int, keyframe_interval:int) -> list[dict[str, bytes]]:
+    # runs the delta and full exports of a generated scenario over several steps and returns the files of each step
+    exports = [{} for _ in range(steps)]
+    for step, filename, contents in run_lua('export_steps.lua', units_per_side, seed, steps, keyframe_interval, pycmo_lib_path):
+        exports[step - 1][filename] = contents
+    return exports
+
+@pytest.mark.parametrize("units_per_side, seed", [(0, 1), (1, 2), (30, 3), (400, 4)])
+def test_export_matches_reference(units_per_side, seed):
+    reference, export = export_scenario([reference_lib_path, pycmo_lib_path], units_per_side, seed)
+    assert set(export.keys()) == {'Stand-in scenario.inst', 'Stand-in scenario_scen_has_ended.inst', 'ExportSidesToXML', 'ExportUnitsToXML', 'ExportContactsToXML'}
+    for filename, contents in reference.items():
+        assert export[filename] == contents, filename
+
+def test_export_is_well_formed():
+    export, = export_scenario([pycmo_lib_path], 50)
+    scenario = ET.fromstring(export['Stand-in scenario.inst'])
+    assert [side.find('Name').text for side in scenario.find('Sides')] == ['Side 1', 'Side 2', 'Side 3']
+    unit_types = {unit.tag for unit in scenario.find('ActiveUnits')}
+    assert 'Facility' not in unit_types
+    assert unit_types <= {'Aircraft', 'Ship', 'Submarine'}
+    for unit in scenario.find('ActiveUnits'):
+        if unit.tag == 'Aircraft':
+            assert unit.find('Loadout/Loadout/Weaps') is not None
+
+def assert_same_observation(features, expected):
+    assert features.meta == expected.meta
+    assert features.side_ == expected.side_
+    assert features.units == expected.units
+    assert features.contacts == expected.contacts
+
+def test_delta_keyframe_is_full_export():
+    steps = export_steps(30, 5, 1, 10)
+    keyframe = steps[0]['Stand-in scenario.inst']
+    assert steps[0]['Stand-in scenario_keyframe.inst'] == keyframe
+    assert re.sub(rb'<Delta>.*?</Delta>', b'', keyframe) == steps[0]['full.inst']
+
+@pytest.mark.parametrize("keyframe_interval", [1, 4, 100])
+def test_delta_export_decodes_to_full_export(keyframe_interval):
+    steps = export_steps(40, 6, 12, keyframe_interval)
+    delta_state = DeltaState()
+    for files in steps:
+        expected = FeaturesFromSteam(files['full.inst'].decode(), "Side 1", parser="stream", projection=projection)
+        features = DeltaFeaturesFromSteam(files['Stand-in scenario.inst'].decode(), "Side 1", delta_state=delta_state, projection=projection)
+        assert_same_observation(features, expected)
+    if keyframe_interval > 1: # a delta right after a keyframe is much smaller than a full export
+        assert len(steps[1]['Stand-in scenario.inst']) < len(steps[1]['full.inst']) / 4
+
+def test_delta_export_catches_up_from_keyframe_file():
+    steps = export_steps(40, 7, 15, 4)
+    delta_state = DeltaState()
+    keyframe_file = None
+    for step, files in enumerate(steps):
+        keyframe_file = files.get('Stand-in scenario_keyframe.inst', keyframe_file)
+        if step % 3 != 2: # the reader misses two exports out of three, including keyframes
+            continue
+        expected = FeaturesFromSteam(files['full.inst'].decode(), "Side 1", parser="stream", projection=projection)
+        try:
+            features = DeltaFeaturesFromSteam(files['Stand-in scenario.inst'].decode(), "Side 1", delta_state=delta_state, projection=projection)
+        except KeyframeMismatchError:
+            DeltaFeaturesFromSteam(keyframe_file.decode(), "Side 1", delta_state=delta_state, projection=projection)
+            features = DeltaFeaturesFromSteam(files['Stand-in scenario.inst'].decode(), "Side 1", delta_state=delta_state, projection=projection)
+        assert_same_observation(features, expected)
+
+def export_compact(units_per_side:int, seed:int) -> dict[str, bytes]:
+    # runs the XML and compact exports of a generated scenario and returns the exported files
+    return {filename: contents for _, filename, contents in run_lua('export_compact.lua', units_per_side, seed, pycmo_lib_path)}
+
+@pytest.mark.parametrize("units_per_side, seed", [(5, 8), (60, 9)])
+def test_compact_export_decodes_to_xml_export(units_per_side, seed):
+    files = export_compact(units_per_side, seed)
+    for side in ("Side 1", "Side 3"):
+        expected = FeaturesFromSteam(files['xml.inst'].decode(), side, parser="stream", projection=projection)
+        features = FeaturesFromSteam(files['compact.inst'].decode(), side, parser="compact", projection=projection)
+        assert features.meta == expected.meta
+        assert features.side_ == expected.side_
+        assert features.contacts == expected.contacts
+        # the XML export skips Facilities, which the compact export keeps
+        assert [unit for unit in features.units if unit.Type != 'Facility'] == expected.units
+    if units_per_side > 5:
+        assert any(unit.Type == 'Facility' for unit in features.units)
+    assert len(files['compact.inst']) < len(files['xml.inst']) / 2
+    assert files['escaped'] == b'|a\\pb\\\\p\\nc\\rd'
+
+def export_shards(units_per_side:int, seed:int, max_shard_length:int) -> dict[str, bytes]:
+    # runs the sharded and XML exports of a generated scenario and returns the exported files
+    return {filename: contents for _, filename, contents in run_lua('export_shards.lua', units_per_side, seed, max_shard_length, pycmo_lib_path)}
+
+@pytest.mark.parametrize("units_per_side, max_shard_length", [(2, 3000), (60, 1000000), (60, 20000)])
+def test_shard_export_decodes_to_xml_export(units_per_side, max_shard_length):
+    files = export_shards(units_per_side, 10, max_shard_length)
+    manifest = ET.fromstring(files['Stand-in scenario_manifest.inst'])
+    shard_count = int(manifest.find('Shards').text)
+    shards = [files[f'Stand-in scenario_shard{shard_idx}.inst'] for shard_idx in range(1, shard_count + 1)]
+    assert len(files) == shard_count + 2
+    assert (shard_count > 1) == (units_per_side > 0 and max_shard_length < 100000)
+    for shard_idx, shard in enumerate(shards):
+        assert get_shard_export_id(shard) == manifest.find('Export').text
+        assert len(shard) <= max_shard_length or shard_idx == 0 # the first shard holds the sides whatever their length
+        ET.fromstring(shard)
+    for side in ("Side 1", "Side 2"):
+        expected = FeaturesFromSteam(files['full.inst'].decode(), side, parser="stream", projection=projection)
+        features = ShardedFeaturesFromSteam(shards, side, projection=projection)
+        assert features.meta == expected.meta
+        assert features.side_ == expected.side_
+        assert features.contacts == expected.contacts
+        # the XML export skips Facilities, which the shards keep
+        assert [unit for unit in features.units if unit.Type != 'Facility'] == expected.units
+        assert len(features.units) - len(expected.units) == sum(unit.Type == 'Facility' for unit in features.units)
+    if units_per_side > 2:
+        assert any(unit.Type == 'Facility' for unit in features.units)
+
+def export_sides(units_per_side:int, seed:int, side_names:list[str]) -> dict[str, bytes]:
+    # runs the full export and the exports scoped to some sides of a generated scenario and returns the exported files
+    return {filename: contents for _, filename, contents in run_lua('export_sides.lua', units_per_side, seed, pycmo_lib_path, *side_names)}
+
+@pytest.mark.parametrize("side_names", [["Side 2"], ["Side 1", "Side 3"]])
+def test_side_scoped_export(side_names):
+    files = export_sides(60, 11, side_names)
+    full = MultiSideFeaturesFromSteam(files['full.inst'].decode(), parser="stream", projection=projection)
+    for filename, parser in (('xml.inst', "stream"), ('compact.inst', "compact")):
+        scoped = MultiSideFeaturesFromSteam(files[filename].decode(), parser=parser, projection=projection)
+        # only the units of the selected sides are queried
+        assert int(files[filename + '.calls']) == 60 * len(side_names)
+        for side in side_names:
+            assert scoped[side].meta == full[side].meta
+            assert scoped[side].side_ == full[side].side_
+            assert scoped[side].contacts == full[side].contacts
+            # units are indexed and grouped by type within the export, which only holds the selected sides
+            units = [unit for unit in scoped[side].units if unit.Type != 'Facility']
+            assert sorted(unit._replace(XML_ID=0) for unit in units) == sorted(unit._replace(XML_ID=0) for unit in full[side].units)
+        for side in {"Side 1", "Side 2", "Side 3"} - set(side_names):
+            assert scoped[side].units == [] and scoped[side].contacts == []
+    assert int(files['full.inst.calls']) == 180
+    assert len(files['xml.inst']) < len(files['full.inst']) * (len(side_names) + 0.5) / 3
+
+def export_api_calls(lib_path:str, units_per_side:int, seed:int) -> dict[str, dict[str, int]]:
+    # runs each export of a generated scenario and returns the number of calls to each API function of each export, and
+    # the reports of the exports that count their own calls
+    exports = {}
+    for _, filename, contents in run_lua('export_api_calls.lua', units_per_side, seed, lib_path):
+        name, kind = filename.rsplit('.', 1)
+        if kind == 'calls':
+            exports[filename] = {line.rsplit(' ', 1)[0]: int(line.rsplit(' ', 1)[1]) for line in contents.decode().splitlines()}
+        else:
+            report_name, exports[filename] = parse_api_call_report(contents.decode())
+            assert report_name == name
+    return exports
+
+def test_export_queries_engine_once_per_object():
+    reference = export_api_calls(reference_lib_path, 40, 12)['ScenEdit_ExportScenarioToXML.calls']
+    exports = export_api_calls(pycmo_lib_path, 40, 12)
+    unit_count = 40 * 3
+    for name in ('ScenEdit_ExportScenarioToXML', 'ScenEdit_ExportScenarioToCompact', 'ScenEdit_ExportScenarioToShards', 'ScenEdit_ExportScenarioDeltaToXML'):
+        calls = exports[name + '.calls']
+        assert calls['VP_GetScenario'] == 1
+        assert calls['VP_GetSides'] == 1
+        assert calls['ScenEdit_GetScore'] == calls['ScenEdit_GetContacts'] == 3
+        assert calls['ScenEdit_GetUnit'] == unit_count
+        assert calls['ScenEdit_GetLoadout'] == reference['ScenEdit_GetLoadout'] / 2 # the reference queries each loadout twice
+        # the report of an export counts the same calls as the stand-in API
+        assert exports[name + '.report'] == calls
+    assert exports['ScenEdit_ExportScenarioToXML.calls']['VP_GetSides'] < reference['VP_GetSides']
+
+def test_frame_response():
+    # the response is framed with its length in bytes, which Client reads with framing="length"
+    script = f"dofile({pycmo_lib_path!r}) io.write(FrameResponse('caf\\195\\169'), FrameResponse(42))"
+    assert subprocess.run([lua, '-e', script], capture_output=True, check=True).stdout == "5\ncafé2\n42".encode()
+
+def test_batch_script(tmp_path):
+    # the batch script runs every command and returns their framed responses, in order
+    commands = ["return 1 + 1", "x = 3", "error('boom', 0)", "return 'caf\\195\\169\\nau lait' -- comment", "--script \nreturn x"]
+    script_path = tmp_path / "batch.lua"
+    script_path.write_text(format_batch(commands))
+    output = subprocess.run([lua, '-e', f"io.write(dofile({str(script_path)!r}))"], capture_output=True, check=True).stdout
+    left, right = socket.socketpair()
+    with left, right:
+        right.sendall(output)
+        reader = ResponseReader(left, framing="length")
+        assert [reader.read_response().decode() for _ in commands] == ["2", "", "boom", "café\nau lait", "3"]
@@ -0,0 +1,75 @@
+import os
+import pytest
+
+from pycmo.lib.observation_cache import ObservationCache, CacheStats
+
+def write(path, contents:bytes, mtime_ns:int) -> None:
+    with open(path, 'wb') as f:
+        f.write(contents)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+class Loader(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, contents:bytes):
+        self.calls += 1
+        return [contents]
+
+def test_observation_cache_hit(tmp_path):
+    path = str(tmp_path / "observation.inst")
+    write(path, b"first", 1_000_000_000)
+    cache = ObservationCache()
+    load = Loader()
+    value = cache.get(path, load)
+    assert value == [b"first"]
+    assert cache.get(path, load) is value
+    assert load.calls == 1
+    assert cache.stats == CacheStats(1, 1, 0, 1)
+
+def test_observation_cache_same_contents_rewritten(tmp_path):
+    path = str(tmp_path / "observation.inst")
+    write(path, b"first", 1_000_000_000)
+    cache = ObservationCache()
+    load = Loader()
+    value = cache.get(path, load)
+    write(path, b"first", 2_000_000_000)
+    assert cache.get(path, load) is value
+    assert cache.get(path, load) is value
+    assert load.calls == 1
+    assert cache.stats == CacheStats(2, 1, 0, 1)
+
+def test_observation_cache_changed_contents(tmp_path):
+    path = str(tmp_path / "observation.inst")
+    write(path, b"first", 1_000_000_000)
+    cache = ObservationCache()
+    load = Loader()
+    cache.get(path, load)
+    write(path, b"second", 2_000_000_000)
+    assert cache.get(path, load) == [b"second"]
+    assert load.calls == 2
+
+def test_observation_cache_eviction(tmp_path):
+    cache = ObservationCache(max_size=2)
+    load = Loader()
+    paths = [str(tmp_path / f"{idx}.inst") for idx in range(3)]
+    for idx, path in enumerate(paths):
+        write(path, str(idx).encode(), 1_000_000_000)
+        cache.get(path, load)
+    assert cache.stats == CacheStats(0, 3, 1, 2)
+    cache.get(paths[0], load)
+    assert load.calls == 4
+    with pytest.raises(ValueError):
+        ObservationCache(max_size=0)
+
+def test_observation_cache_load_error(tmp_path):
+    path = str(tmp_path / "observation.inst")
+    write(path, b"partial", 1_000_000_000)
+    cache = ObservationCache()
+    def load(contents:bytes):
+        raise TypeError()
+    with pytest.raises(TypeError):
+        cache.get(path, load)
+    assert cache.stats == CacheStats(0, 0, 0, 0)
+    with pytest.raises(FileNotFoundError):
+        cache.get(str(tmp_path / "missing.inst"), load)
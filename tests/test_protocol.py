@@ -1,8 +1,12 @@
 import pytest
+import asyncio
 import os
+import re
+import socket
+import threading
 
 from pycmo.configs.config import get_config
-from pycmo.lib.protocol import SteamClient, SteamClientProps
+from pycmo.lib.protocol import SteamClient, SteamClientProps, Client, AsyncClient, ResponseReader, FramingError, format_batch, BATCH_FOOTER
 
 config = get_config()
 
@@ -28,6 +32,170 @@ def test_steam_client_send():
     with open(agent_action_filename, 'r') as f:
         assert f.read() == action
 
+class StandInServer():
+    # a local TCP server that answers each command it receives with the next list of replies, each sent in chunks of
+    # `chunk_size` bytes, and closes the connection when it runs out of replies
+    def __init__(self, replies:list[list[bytes]], chunk_size:int=1000) -> None:
+        self.replies = replies
+        self.chunk_size = chunk_size
+        self.commands = []
+        self.listener = socket.create_server(("localhost", 0))
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self) -> None:
+        connection, _ = self.listener.accept()
+        with connection:
+            for replies in self.replies:
+                self.commands.append(connection.recv(65536))
+                data = b"".join(replies)
+                for position in range(0, len(data), self.chunk_size):
+                    connection.sendall(data[position:position + self.chunk_size])
+        self.listener.close()
+
+def connect_client(server:StandInServer, **kwargs) -> Client:
+    client = Client(port=server.port, **kwargs)
+    client.connect()
+    return client
+
+def frame(response:bytes) -> bytes:
+    return str(len(response)).encode() + b"\n" + response
+
+def test_client_reads_long_length_framed_responses():
+    observation = b"<Scenario>" + "\u00e9".encode() * 1000000 + b"</Scenario>"
+    server = StandInServer([[frame(observation)], [frame(b"")], [frame(b"ok")]], chunk_size=4096)
+    client = connect_client(server, framing="length", buffer_size=16)
+    assert client.send("return FrameResponse(ScenEdit_ExportScenarioToXML())") == observation.decode()
+    assert client.send("return FrameResponse('')") == ""
+    assert client.send("return FrameResponse('ok')") == "ok"
+    assert server.commands[0] == b"return FrameResponse(ScenEdit_ExportScenarioToXML())"
+    assert len(client.reader.buffer) >= len(observation)
+    client.end_connection()
+
+def test_client_reads_sentinel_framed_responses():
+    # the delimiter is split across chunks, and two responses arrive together
+    server = StandInServer([[b"first\r\n"], [b"second\r\nthird\r\n"], [b"x" * 5000 + b"\r\n"]], chunk_size=6)
+    client = connect_client(server, framing="sentinel", delimiter=b"\r\n", buffer_size=4)
+    assert client.send("a") == "first"
+    assert client.send("b") == "second"
+    assert client.reader.read_response() == b"third"
+    assert client.send("c") == "x" * 5000
+    client.end_connection()
+
+def test_response_reader_keeps_leftover_bytes():
+    left, right = socket.socketpair()
+    with left, right:
+        reader = ResponseReader(left, framing="length", buffer_size=8)
+        right.sendall(frame(b"abc") + frame(b"defghijkl") + b"3\nx")
+        assert reader.read_response() == b"abc"
+        assert reader.read_response() == b"defghijkl"
+        right.sendall(b"yz")
+        assert reader.read_response() == b"xyz"
+        assert reader.start == reader.end == 0
+
+def test_response_reader_errors():
+    with pytest.raises(ValueError):
+        ResponseReader(None, framing="json")
+    left, right = socket.socketpair()
+    with left, right:
+        right.sendall(b"not a length\n")
+        with pytest.raises(FramingError):
+            ResponseReader(left, framing="length").read_response()
+    left, right = socket.socketpair()
+    with left:
+        right.sendall(frame(b"abcdef")[:-2])
+        right.close()
+        with pytest.raises(ConnectionError):
+            ResponseReader(left, framing="length").read_response()
+
+def test_client_send_batch():
+    commands = ["return ScenEdit_CurrentTime()", "VP_RunForTimeAndHalt({Time='0:1:0'})", "return ScenEdit_ExportScenarioToXML()"]
+    observation = b"<Scenario>" + b"x" * 100000 + b"</Scenario>"
+    server = StandInServer([[frame(b"1000"), frame(b""), frame(observation)], [frame(b"ok")]], chunk_size=4096)
+    client = connect_client(server, framing="length")
+    assert client.send_batch(commands) == ["1000", "", observation.decode()]
+    assert client.send_batch([]) == []
+    assert client.send_batch(["return 'ok'"]) == ["ok"]
+    # each batch is a single script
+    assert server.commands == [format_batch(commands).encode(), format_batch(["return 'ok'"]).encode()]
+    client.end_connection()
+    with pytest.raises(ValueError):
+        Client(framing="sentinel").send_batch(commands)
+
+async def start_batch_server(delay:float=0.0):
+    # a local asyncio server that answers each batch of commands with the commands themselves, after `delay` seconds
+    async def handle(reader, writer):
+        try:
+            while True:
+                script = (await reader.readuntil(BATCH_FOOTER.encode())).decode()
+                commands = re.findall(r"frame\(pcall\(function\(\)\n(.*?)\nend\)\)\n", script, re.S)
+                await asyncio.sleep(delay)
+                writer.write(b"".join(frame(command.encode()) for command in commands))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+    server = await asyncio.start_server(handle, "localhost", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+def test_async_client_concurrent_commands():
+    async def run():
+        server, port = await start_batch_server(delay=0.01)
+        async with server:
+            clients = [AsyncClient(port=port, framing="length") for _ in range(20)]
+            assert all(await asyncio.gather(*(client.connect() for client in clients)))
+            # several batches in flight on every connection at once
+            batches = [(client, [f"return {client_idx}", f"return {batch_idx}"]) for client_idx, client in enumerate(clients) for batch_idx in range(5)]
+            responses = await asyncio.gather(*(client.send_batch(commands) for client, commands in batches))
+            assert responses == [commands for _, commands in batches]
+            assert await clients[0].restart()
+            assert await clients[0].send_batch(["return 'ok'"]) == ["return 'ok'"]
+            await asyncio.gather(*(client.end_connection() for client in clients))
+    asyncio.run(run())
+
+def test_async_client_send():
+    async def run():
+        observation = b"<Scenario>" + b"x" * 200000 + b"</Scenario>"
+        server = StandInServer([[frame(observation)], [frame(b"ok")]], chunk_size=4096)
+        client = AsyncClient(port=server.port, framing="length", buffer_size=1024)
+        await client.connect()
+        assert await client.send("return FrameResponse(ScenEdit_ExportScenarioToXML())") == observation.decode()
+        assert await client.send("return FrameResponse('ok')") == "ok"
+        await client.end_connection()
+
+        server = StandInServer([[b"x" * 5000 + b"\r\n"], [b"y\r\n"]], chunk_size=100)
+        client = AsyncClient(port=server.port, framing="sentinel", delimiter=b"\r\n", buffer_size=64)
+        await client.connect()
+        assert await client.send("a") == "x" * 5000
+        assert await client.send("b") == "y"
+        await client.end_connection()
+
+        server = StandInServer([[b"unframed"]])
+        client = AsyncClient(port=server.port)
+        await client.connect()
+        assert await client.send("a") == "unframed"
+        await client.end_connection()
+    asyncio.run(run())
+
+def test_async_client_errors():
+    async def run():
+        # the server closes the connection in the middle of a response
+        server = StandInServer([[frame(b"complete")[:-3]]])
+        client = AsyncClient(port=server.port, framing="length")
+        await client.connect()
+        with pytest.raises(ConnectionError):
+            await client.send("a")
+        with pytest.raises(ConnectionError):
+            await client.send("b")
+        await client.end_connection()
+        with pytest.raises(ValueError):
+            AsyncClient(framing="json")
+        with pytest.raises(ValueError):
+            await AsyncClient(framing="sentinel").send_batch(["a"])
+        with pytest.raises(ConnectionError):
+            await AsyncClient(port=server.port).connect()
+    asyncio.run(run())
+
 # these tests can only be run when Command is open
 # def test_steam_client_connect():
 #     assert client.connect() == True # have CMO running for this test to pass 
@@ -0,0 +1,92 @@
+import pytest
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from pycmo.lib.features import FeaturesFromSteam
+from pycmo.lib.sharded_features import ShardedFeaturesFromSteam, ShardManifest, read_shards, read_manifest, get_manifest_path, get_shard_path
+
+def unit_xml(unit_type:str, unit_id:str, unit_side:str) -> str:
+    return f"<{unit_type}><ID>{unit_id}</ID><DBID>7</DBID><Name>{unit_id}</Name><Side>{unit_side}</Side><Lat>1.5</Lat><Lon>2.5</Lon></{unit_type}>"
+
+head = ("<Title>Shard test</Title><Time>100</Time><StartTime>0</StartTime><ZeroHour>0</ZeroHour><Duration>1000</Duration><Sides>"
+        "<Side><ID>s1</ID><Name>Blue</Name><TotalScore>5</TotalScore><Contacts><Contact><ID>c1</ID><Lat>1</Lat><Lon>1</Lon></Contact><Contact><ID>c2</ID></Contact></Contacts></Side>"
+        "<Side><ID>s2</ID><Name>Red</Name><TotalScore>0</TotalScore><Contacts><Contact><ID>c3</ID></Contact></Contacts></Side></Sides>")
+
+shard_units = [
+    [unit_xml("Aircraft", "a1", "Blue"), unit_xml("Aircraft", "r1", "Red"), unit_xml("Ship", "s1", "Blue")],
+    [unit_xml("Aircraft", "r2", "Red"), unit_xml("Facility", "f1", "Blue")],
+    [unit_xml("Aircraft", "a2", "Blue"), unit_xml("Ship", "s2", "Red"), unit_xml("Facility", "f2", "Blue")],
+]
+
+def shard_xml(export_id:str, shard_idx:int) -> str:
+    return ("<?xml version='1.0' encoding='utf-8'?><Scenario><Export>" + export_id + "</Export>" + (head if shard_idx == 0 else "") +
+            "<ActiveUnits>" + "".join(shard_units[shard_idx]) + "</ActiveUnits></Scenario>")
+
+full_xml = "<?xml version='1.0' encoding='utf-8'?><Scenario>" + head + "<ActiveUnits>" + "".join(sum(shard_units, [])) + "</ActiveUnits></Scenario>"
+
+def write_inst(path, xml:str) -> None:
+    path.write_text(json.dumps({"Name": "Comments", "Comments": xml, "Template": False}))
+
+def write_export(observation_path, export_id:str, shards:tuple[int, ...] = (0, 1, 2), manifest:bool = True) -> None:
+    for shard_idx in shards:
+        write_inst(observation_path.parent / get_shard_path(observation_path.name, shard_idx + 1), shard_xml(export_id, shard_idx))
+    if manifest:
+        write_inst(observation_path.parent / get_manifest_path(observation_path.name), f"<Manifest><Export>{export_id}</Export><Shards>{len(shard_units)}</Shards></Manifest>")
+
+def assert_same_observation(features, expected):
+    assert features.meta == expected.meta
+    assert features.side_ == expected.side_
+    assert features.units == expected.units
+    assert features.contacts == expected.contacts
+
+def test_shard_paths():
+    assert get_manifest_path("/observations/Steam demo.inst") == "/observations/Steam demo_manifest.inst"
+    assert get_shard_path("/observations/Steam demo.inst", 2) == "/observations/Steam demo_shard2.inst"
+
+@pytest.mark.parametrize("side", ["Blue", "Red"])
+def test_sharded_features(side):
+    shards = [shard_xml("e1", shard_idx) for shard_idx in range(len(shard_units))]
+    features = ShardedFeaturesFromSteam(shards, side)
+    assert_same_observation(features, FeaturesFromSteam(full_xml, side, parser="stream"))
+
+def test_sharded_features_in_parallel():
+    shards = [shard_xml("e1", shard_idx).encode() for shard_idx in range(len(shard_units))]
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        features = ShardedFeaturesFromSteam(shards, "Blue", projection={"Unit": ["ID", "Lon", "Lat"]}, executor=executor)
+    assert_same_observation(features, FeaturesFromSteam(full_xml, "Blue", parser="stream", projection={"Unit": ["ID", "Lon", "Lat"]}))
+    assert [(unit.ID, unit.XML_ID) for unit in features.units] == [("a1", 0), ("a2", 3), ("s1", 0), ("f1", 0), ("f2", 1)]
+
+def test_read_shards(tmp_path):
+    observation_path = tmp_path / "Shard test.inst"
+    write_export(observation_path, "e1")
+    manifest, shards = read_shards(str(observation_path))
+    assert manifest == ShardManifest("e1", 3)
+    assert shards == [shard_xml("e1", shard_idx).encode() for shard_idx in range(len(shard_units))]
+
+def test_read_shards_waits_for_complete_set(tmp_path):
+    observation_path = tmp_path / "Shard test.inst"
+    with pytest.raises(TimeoutError):
+        read_shards(str(observation_path), timeout=0.05)
+    write_export(observation_path, "e1")
+    # the next export overwrote the first two shards, but not the last one nor the manifest yet
+    write_export(observation_path, "e2", shards=[0, 1], manifest=False)
+    with pytest.raises(TimeoutError):
+        read_shards(str(observation_path), timeout=0.05)
+    writer = threading.Timer(0.1, write_export, args=(observation_path, "e2", [2]))
+    writer.start()
+    try:
+        manifest, shards = read_shards(str(observation_path), timeout=5)
+    finally:
+        writer.join()
+    assert manifest.ExportID == "e2"
+    assert_same_observation(ShardedFeaturesFromSteam(shards, "Blue"), FeaturesFromSteam(full_xml, "Blue", parser="stream"))
+
+def test_read_manifest_partial(tmp_path):
+    manifest_path = tmp_path / "Shard test_manifest.inst"
+    manifest_path.write_text('{"Comments": "<Manifest><Exp')
+    assert read_manifest(str(manifest_path)) is None
+    write_inst(manifest_path, "<Manifest><Export>e1</Export></Manifest>")
+    assert read_manifest(str(manifest_path)) is None
+    manifest_path.write_bytes('{"Comments": "<Manifest><Export>\u00e9'.encode('utf-8')[:-1]) # ends inside a character
+    assert read_manifest(str(manifest_path)) is None
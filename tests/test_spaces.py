@@ -4,7 +4,7 @@ from gymnasium import spaces
 
 from pycmo.configs.config import get_config
 from pycmo.lib.features import FeaturesFromSteam, Weapon, Loadout, Mount, Unit, Contact
-from pycmo.lib.spaces import get_contact_space, get_weapon_space, get_loadout_space, get_mount_space, get_unit_space, add_loadout_space_to_unit_space, add_mount_space_to_unit_space
+from pycmo.lib.spaces import get_contact_space, get_weapon_space, get_loadout_space, get_mount_space, get_unit_space, add_loadout_space_to_unit_space, add_mount_space_to_unit_space, get_default_observation, get_entity_observation
 from pycmo.lib.tools import cmo_steam_observation_file_to_xml
 
 config = get_config()
@@ -107,3 +107,16 @@ def test_add_loadout_space_to_unit_space():
     assert len(test_space["Loadout"].keys()) == 4
     assert "Weapons" in test_space["Loadout"].keys()
     assert len(test_space["Loadout"]["Weapons"]) == 3
+
+def test_get_default_observation():
+    for space in [get_unit_space(), get_contact_space(), get_weapon_space(), spaces.Dict({"KEY1": spaces.Discrete(3, start=1), "KEY2": spaces.Tuple((get_mount_space(),))})]:
+        assert space.contains(get_default_observation(space))
+    assert get_default_observation(get_unit_space())["Lon"] == np.array((0.,), dtype=np.float64)
+
+def test_get_entity_observation():
+    features = FeaturesFromSteam(xml=scenario_xml, player_side=side)
+    sufa = [unit for unit in features.units if unit.Name == sufa_aircraft_name][0]
+    unit_space = get_unit_space()
+    unit_observation = get_entity_observation(sufa, unit_space)
+    assert unit_space.contains(unit_observation)
+    assert unit_observation["ID"] == sufa_aircraft_ID
@@ -0,0 +1,97 @@
+import pytest
+import os
+
+from pycmo.configs.config import get_config
+from pycmo.env.cmo_env import CPEEnv, StepType
+from pycmo.lib.actions import set_unit_course
+from pycmo.lib.features import Features
+from pycmo.lib.protocol import Client, format_batch
+from pycmo.lib.stand_in_server import StandInScenario, StandInServer, split_batch
+from pycmo.lib.tools import ticks_to_unix
+
+config = get_config()
+
+xml_file = os.path.join(config['pycmo_path'], 'xml', 'scen.xml')
+side = "North Korea"
+
+def create_env(tmp_path, server:StandInServer, batch_commands:bool=False, **kwargs) -> CPEEnv:
+    step_dest = str(tmp_path / "steps") + os.sep
+    os.makedirs(step_dest, exist_ok=True)
+    client = Client(port=server.port, framing="length" if batch_commands else None)
+    client.connect()
+    return CPEEnv(step_dest, ["0", "1", "0"], side, str(tmp_path / "scen_ended.txt"), parser="stream", batch_commands=batch_commands, client=client, **kwargs)
+
+def test_split_batch():
+    commands = ["return 1", "--script \nlocal x = 1\nreturn x", ""]
+    assert split_batch(format_batch(commands)) == commands
+    assert split_batch(format_batch([])) == []
+
+def test_stand_in_server_batches():
+    with StandInServer() as server:
+        client = Client(port=server.port, framing="length")
+        client.connect()
+        action = set_unit_course(side, "Unit", 1.5, 2.5)
+        assert client.send_batch(["return 'ok'", "return 2", action, "Foo()"])[:3] == ["ok", "2", ""]
+        assert server.scenario.actions == [action]
+        assert len(server.errors) == 1 and server.errors[0][0] == "Foo()"
+        client.end_connection()
+
+def test_stand_in_server_unbatched_commands():
+    with StandInServer(delimiter=b"\0") as server:
+        client = Client(port=server.port, framing="sentinel")
+        client.connect()
+        assert client.send("return 'ok'") == "ok"
+        assert client.send("--script \nTool_EmulateNoConsole(true)") == ""
+        assert server.scenario.actions == ["Tool_EmulateNoConsole(true)"]
+        client.end_connection()
+
+def test_stand_in_cpe_env_steps(tmp_path):
+    # the game takes a while to run the step, so the observation is polled for until it is exported
+    scenario = StandInScenario(xml_file, run_delay=0.25)
+    with StandInServer(scenario) as server:
+        env = create_env(tmp_path, server)
+        first = env.reset()
+        cur_time = ticks_to_unix(first.observation.meta.Time)
+        action = set_unit_course(side, "Unit", 1.5, 2.5)
+        timestep = env.step(cur_time, 1, action=action)
+        assert timestep.step_type == StepType(1)
+        assert ticks_to_unix(timestep.observation.meta.Time) == cur_time + 60
+        assert timestep.observation.units == Features(xml_file, side, parser="stream").units
+        assert scenario.actions == [action]
+        assert sum(1 for command in server.commands if "ScenEdit_CurrentTime" in command) > 1
+        assert server.errors == []
+        env.close()
+
+def test_stand_in_cpe_env_socket_observations(tmp_path):
+    with StandInServer(StandInScenario(xml_file)) as server:
+        env = create_env(tmp_path, server, batch_commands=True, observation_transport="socket")
+        first = env.reset()
+        timestep = env.step(ticks_to_unix(first.observation.meta.Time), 1)
+        assert timestep.step_type == StepType(1)
+        assert timestep.observation.meta.Time == first.observation.meta.Time + 60 * 10000000
+        assert os.listdir(env.step_dest) == []
+        assert server.errors == []
+        env.close()
+
+def test_stand_in_cpe_env_scenario_ends(tmp_path):
+    with StandInServer(StandInScenario(xml_file, duration=90)) as server:
+        env = create_env(tmp_path, server, batch_commands=True)
+        timestep = env.reset()
+        step_types = []
+        for step_id in range(1, 3):
+            timestep = env.step(ticks_to_unix(timestep.observation.meta.Time), step_id)
+            step_types.append(timestep.step_type)
+        assert step_types == [StepType(1), StepType(2)]
+        assert ticks_to_unix(timestep.observation.meta.Time) - ticks_to_unix(Features(xml_file, side).meta.Time) == 90
+        env.close()
+
+def test_stand_in_scenario_replay(tmp_path):
+    replay_files = [os.path.join(config['pycmo_path'], 'xml', name) for name in ("scen.xml", "wooden_leg.xml")]
+    scenario = StandInScenario(xml_file, replay_files=replay_files)
+    with open(replay_files[1], 'rb') as f:
+        second = f.read()
+    assert scenario.run_command("return ScenEdit_ExportScenarioToXML()") == scenario.xml
+    assert scenario.run_command("return ScenEdit_ExportScenarioToXML()") == second
+    assert scenario.run_command("return ScenEdit_ExportScenarioToXML()") == second
+    with pytest.raises(ValueError):
+        scenario.run_command("ScenEdit_DeleteUnit({name = 'Unit'})")
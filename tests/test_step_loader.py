@@ -0,0 +1,58 @@
+import os
+import shutil
+import pytest
+import numpy as np
+
+from pycmo.configs.config import get_config
+from pycmo.lib.features import Features, FeaturesFromSteam
+from pycmo.lib.step_loader import get_step_files, load_steps, decode_step, StepArrays
+from pycmo.lib.tools import cmo_steam_observation_file_to_xml
+
+config = get_config()
+
+xml_file = os.path.join(config['pycmo_path'], 'xml', 'scen.xml')
+observation_file_path = os.path.join(config['pycmo_path'], 'tests', "fixtures", 'test_steam_observation.inst')
+
+@pytest.fixture
+def steps_path(tmp_path):
+    for step_id in [0, 1, 2, 10]:
+        shutil.copy(xml_file, tmp_path / f"{step_id}.xml")
+    (tmp_path / "notes.txt").write_text("not a step")
+    return tmp_path
+
+def test_get_step_files(steps_path):
+    step_files = get_step_files(str(steps_path))
+    assert [os.path.basename(step_file) for step_file in step_files] == ["0.xml", "1.xml", "2.xml", "10.xml"]
+    assert get_step_files(str(steps_path / "1*.xml")) == [str(steps_path / "1.xml"), str(steps_path / "10.xml")]
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_load_steps(steps_path, processes):
+    expected = Features(xml_file, "North Korea", parser="stream")
+    decoded_steps = list(load_steps(str(steps_path), "North Korea", processes=processes))
+    assert [os.path.basename(decoded_step.path) for decoded_step in decoded_steps] == ["0.xml", "1.xml", "2.xml", "10.xml"]
+    for decoded_step in decoded_steps:
+        assert decoded_step.observation.units == expected.units
+        assert decoded_step.observation.contacts == expected.contacts
+
+def test_load_steps_arrays(steps_path):
+    expected = Features(xml_file, "North Korea")
+    for decoded_step in load_steps(str(steps_path), "North Korea", arrays=True, processes=2):
+        assert isinstance(decoded_step.observation, StepArrays)
+        assert decoded_step.observation.Time == expected.meta.Time
+        assert list(decoded_step.observation.units.ID) == [unit.ID for unit in expected.units]
+        assert np.array_equal(decoded_step.observation.units.Lat, expected.unit_table.Lat)
+
+def test_decode_step_inst():
+    observation = decode_step(observation_file_path, "Israel")
+    expected = FeaturesFromSteam(cmo_steam_observation_file_to_xml(observation_file_path), "Israel")
+    assert isinstance(observation, FeaturesFromSteam)
+    assert observation.units == expected.units
+
+def test_load_steps_errors(steps_path):
+    (steps_path / "3.inst").write_text('{"Comments": "<Scen')
+    with pytest.raises(ValueError, match="3.inst is missing, partial or corrupt"):
+        list(load_steps(str(steps_path), "North Korea", processes=2))
+    with pytest.raises(ValueError, match="3.inst is missing, partial or corrupt"):
+        list(load_steps(str(steps_path), "North Korea", processes=1))
+    decoded_steps = list(load_steps(str(steps_path), "North Korea", processes=2, skip_errors=True))
+    assert [decoded_step.observation is None for decoded_step in decoded_steps] == [False, False, False, True, False]
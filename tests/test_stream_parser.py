@@ -0,0 +1,68 @@
+import pytest
+import os
+import glob
+import xml.etree.ElementTree as ET
+
+from pycmo.configs.config import get_config
+from pycmo.lib.features import Features, FeaturesFromSteam
+from pycmo.lib.stream_parser import ScenarioStreamParser, ScenarioRecords
+from pycmo.lib.tools import cmo_steam_observation_file_to_xml
+
+config = get_config()
+
+side = "Israel"
+observation_file_path = os.path.join(config['pycmo_path'], 'tests', "fixtures", 'test_steam_observation.inst')
+scenario_xml = cmo_steam_observation_file_to_xml(observation_file_path)
+
+def get_corpus_sides() -> list:
+    corpus_sides = []
+    for xml_file in sorted(glob.glob(os.path.join(config['pycmo_path'], 'xml', '*.xml'))):
+        sides = ET.parse(xml_file).getroot().find('Sides')
+        for side_name in [side_xml.findtext('Name') for side_xml in sides]:
+            corpus_sides.append((xml_file, side_name))
+    return corpus_sides
+
+def features_or_error(features_class, xml, player_side, parser):
+    try:
+        features = features_class(xml, player_side, parser=parser)
+        return features.meta, features.units, features.side_, features.contacts
+    except Exception as error:
+        return type(error)
+
+def test_stream_parser_parse_string():
+    records = ScenarioStreamParser(sides=[side]).parse_string(scenario_xml)
+    assert isinstance(records, ScenarioRecords)
+    assert records.scen_dic['Scenario']['Title'] == 'Steam demo'
+    assert len(records.scen_dic['Scenario']['Sides']['Side']) == 2
+    assert "Contacts" not in records.scen_dic['Scenario']['Sides']['Side'][1].keys()
+    assert "ActiveUnits" not in records.scen_dic['Scenario'].keys()
+    assert all(unit["Side"] == side for active_units in records.units.values() for _, unit in active_units)
+
+def test_stream_parser_all_sides():
+    records = ScenarioStreamParser().parse_string(scenario_xml)
+    assert len(records.units['Aircraft']) == 8
+    assert [unit_idx for unit_idx, _ in records.units['Aircraft']] == list(range(8))
+
+def test_features_from_steam_stream_parser():
+    features = FeaturesFromSteam(xml=scenario_xml, player_side=side, parser="stream")
+    expected = FeaturesFromSteam(xml=scenario_xml, player_side=side)
+    assert features.meta == expected.meta
+    assert features.units == expected.units
+    assert features.side_ == expected.side_
+    assert features.contacts == expected.contacts
+
+def test_features_unknown_parser():
+    with pytest.raises(ValueError):
+        FeaturesFromSteam(xml=scenario_xml, player_side=side, parser="unknown")
+
+@pytest.mark.parametrize("xml_file, player_side", get_corpus_sides())
+def test_features_stream_parser_matches_xmltodict(xml_file, player_side):
+    assert features_or_error(Features, xml_file, player_side, "stream") == features_or_error(Features, xml_file, player_side, "xmltodict")
+
+def test_stream_parser_skips_other_side_units():
+    all_records = ScenarioStreamParser().parse_string(scenario_xml)
+    records = ScenarioStreamParser(sides=["Syria"]).parse_string(scenario_xml)
+    for unit_type, active_units in records.units.items():
+        expected = [(unit_idx, unit) for unit_idx, unit in all_records.units[unit_type] if unit["Side"] == "Syria"]
+        assert active_units == expected
+    assert list(records.units.keys()) == list(all_records.units.keys())
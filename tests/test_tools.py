@@ -1,6 +1,8 @@
 import pytest
 import datetime
 import os
+import json
+import shutil
 
 from pycmo.lib.tools import *
 from pycmo.configs.config import get_config
@@ -68,6 +70,73 @@ def test_cmo_steam_observation_file_to_xml():
     assert isinstance(xml_string, str)
     assert len(xml_string) > 1
 
+def test_cmo_steam_observation_to_xml():
+    observation_file_path = os.path.join(config['pycmo_path'], 'tests', "fixtures", 'test_steam_observation.inst')
+    with open(observation_file_path, 'rb') as f:
+        observation_file_contents = f.read()
+    assert cmo_steam_observation_to_xml(observation_file_contents) == cmo_steam_observation_file_to_xml(observation_file_path)
+    assert cmo_steam_observation_to_xml(observation_file_contents[:-10]) is None
+
+def test_open_cmo_steam_observation_xml(tmp_path):
+    observation_file_path = os.path.join(config['pycmo_path'], 'tests', "fixtures", 'test_steam_observation.inst')
+    with open_cmo_steam_observation_xml(observation_file_path) as observation_xml:
+        assert isinstance(observation_xml, memoryview)
+        assert bytes(observation_xml).decode('utf-8') == cmo_steam_observation_file_to_xml(observation_file_path)
+    with open(observation_file_path, 'rb') as f:
+        observation_file_contents = f.read()
+    for contents in [b"", observation_file_contents[:100], observation_file_contents[:-3]]:
+        partial_file_path = tmp_path / "partial.inst"
+        partial_file_path.write_bytes(contents)
+        with open_cmo_steam_observation_xml(str(partial_file_path)) as observation_xml:
+            assert observation_xml is None
+    with open_cmo_steam_observation_xml(str(tmp_path / "missing.inst")) as observation_xml:
+        assert observation_xml is None
+
+def test_open_cmo_steam_observation_xml_without_mmap(tmp_path):
+    # as on Windows, where the game cannot overwrite a mapped file
+    observation_file_path = tmp_path / "observation.inst"
+    shutil.copy(os.path.join(config['pycmo_path'], 'tests', "fixtures", 'test_steam_observation.inst'), observation_file_path)
+    expected = cmo_steam_observation_file_to_xml(str(observation_file_path))
+    with open_cmo_steam_observation_xml(str(observation_file_path), use_mmap=False) as observation_xml:
+        observation_file_path.write_bytes(b"") # the file is closed, so the game can write the next observation
+        assert bytes(observation_xml).decode('utf-8') == expected
+    for contents in [b"", b"{"]:
+        observation_file_path.write_bytes(contents)
+        with open_cmo_steam_observation_xml(str(observation_file_path), use_mmap=False) as observation_xml:
+            assert observation_xml is None
+
+def test_cmo_steam_observation_to_xml_buffer_escapes():
+    observation = {"Name": "Comments", "Comments": "<Scenario><Title>\"Steam\" demo \u00e9</Title></Scenario>", "Template": False}
+    observation_file_contents = json.dumps(observation).encode('utf-8')
+    assert cmo_steam_observation_to_xml_buffer(observation_file_contents) == observation["Comments"].encode('utf-8')
+    assert cmo_steam_observation_to_xml_buffer(observation_file_contents.replace(b'demo', b'\\x')) is None
+    assert cmo_steam_observation_to_xml_buffer(json.dumps({"Comments": "\U0001F600"}).encode('utf-8')) == "\U0001F600".encode('utf-8')
+    observation["Comments"] = "<Scenario><Title>Steam demo</Title></Scenario>"
+    observation_file_contents = json.dumps(observation, indent=2).encode('utf-8')
+    assert bytes(cmo_steam_observation_to_xml_buffer(observation_file_contents)) == observation["Comments"].encode('utf-8')
+
+def test_open_cmo_steam_observation_xml_truncated_character(tmp_path):
+    # the game is still writing the file, which ends inside a multi-byte character
+    observation = {"Name": "Comments", "Comments": "<Scenario><Title>Steam d\u00e9mo</Title></Scenario>", "Template": False}
+    observation_file_contents = json.dumps(observation, ensure_ascii=False).encode('utf-8')
+    truncated = observation_file_contents[:observation_file_contents.index("\u00e9".encode('utf-8')) + 1]
+    assert cmo_steam_observation_to_xml(truncated) is None
+    assert cmo_steam_observation_to_xml_buffer(truncated) is None
+    partial_file_path = tmp_path / "partial.inst"
+    partial_file_path.write_bytes(truncated)
+    for use_mmap in (True, False):
+        with open_cmo_steam_observation_xml(str(partial_file_path), use_mmap=use_mmap) as observation_xml:
+            assert observation_xml is None
+    # the xml is complete, but the file ends inside a character after it
+    truncated = json.dumps({"Comments": "<Scenario />", "Name": "d\u00e9mo"}, ensure_ascii=False).encode('utf-8')
+    truncated = truncated[:truncated.index("\u00e9".encode('utf-8')) + 1]
+    assert cmo_steam_observation_to_xml_buffer(truncated) is None
+
 def test_window_exists():
     window_name = "Side selection and br"
     assert window_exists(window_name=window_name, delay=None) == False
+
+def test_parse_api_call_report():
+    report = "ScenEdit_ExportScenarioToXML\nScenEdit_GetLoadout 29\nScenEdit_GetUnit 60\nVP_GetSides 1"
+    assert parse_api_call_report(report) == ("ScenEdit_ExportScenarioToXML", {"ScenEdit_GetLoadout": 29, "ScenEdit_GetUnit": 60, "VP_GetSides": 1})
+    assert parse_api_call_report("ScenEdit_ExportScenarioToXML") == ("ScenEdit_ExportScenarioToXML", {})